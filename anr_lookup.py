@@ -0,0 +1,84 @@
+import csv
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AnrLookup:
+    """In-memory salutation (ANR) table keyed by `NR`.
+
+    Loaded from the ANR CSV export and reloaded when the file's mtime changes.
+    Once the `anr` Abacus report has been fetched, its records take precedence
+    over the file.
+    """
+
+    def __init__(self, path: str = 'attached_assets/ANR.csv', check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.source = 'file'
+        self.version = 0  # bumped on every (re)load
+        self._entries: Dict[str, Tuple[str, str]] = {}
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, nr: Any) -> Optional[Tuple[str, str]]:
+        """Get (ANREDE, ANREDETEXT) for a salutation number."""
+        self._maybe_reload()
+        return self._entries.get(str(nr))
+
+    def load_records(self, records: Iterable[Dict[str, Any]], source: str = 'report') -> None:
+        """Replace the table with records from the `anr` Abacus report."""
+        entries = self._build_entries(records)
+        with self._lock:
+            self._entries = entries
+            self.source = source
+            self.version += 1
+        logger.info(f"Loaded {len(entries)} ANR entries from {source}")
+
+    def get_version(self) -> int:
+        """Get the current table version, reloading the file first if it changed."""
+        self._maybe_reload()
+        return self.version
+
+    def __len__(self) -> int:
+        self._maybe_reload()
+        return len(self._entries)
+
+    @staticmethod
+    def _build_entries(records: Iterable[Dict[str, Any]]) -> Dict[str, Tuple[str, str]]:
+        entries = {}
+        for row in records:
+            nr = row.get('NR')
+            if nr is not None and str(nr) not in entries:  # first match wins, as in a linear scan
+                entries[str(nr)] = (row.get('ANREDE'), row.get('ANREDETEXT'))
+        return entries
+
+    def _maybe_reload(self) -> None:
+        """Reload the CSV when it changed; stat() at most every `check_interval` seconds."""
+        if self.source != 'file':
+            return
+        now = time.monotonic()
+        if self._mtime is not None and now - self._last_check < self.check_interval:
+            return
+
+        with self._lock:
+            if self.source != 'file' or (self._mtime is not None and now - self._last_check < self.check_interval):
+                return
+            self._last_check = now
+            try:
+                mtime = os.path.getmtime(self.path)
+                if mtime == self._mtime:
+                    return
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = self._build_entries(csv.DictReader(f))
+                self._mtime = mtime
+                self.version += 1
+                logger.debug(f"Loaded {len(self._entries)} ANR entries from {self.path}")
+            except Exception as e:
+                self._mtime = self._mtime or 0.0
+                logger.error(f"Error reading ANR data: {e}")
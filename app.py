@@ -1,13 +1,15 @@
-from flask import Flask, jsonify, request, render_template, send_file, redirect, url_for
+from flask import Flask, jsonify, request, render_template, redirect, url_for, stream_with_context
 import os
 from config import Config
 from helpers import ReportManager
-from pipedrive_helper import PipedriveHelper
-from utils import RateLimiter
+from pipedrive_helper import get_pipedrive_helper, field_cache as pipedrive_field_cache
+from pipedrive_sync import SyncError, sync_batch, sync_record
+from utils import RateLimiter, gzip_chunks, iter_csv_chunks, iter_html_table
 import logging
 from datetime import datetime
-import csv
-import io
+import hashlib
+import itertools
+import json
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -24,7 +26,7 @@ def handle_error(error):
     return jsonify({'error': str(error)}), 500
 
 # Rate limiting
-limiter = RateLimiter()
+limiter = RateLimiter(Config.RATE_LIMIT_PER_MINUTE, Config.RATE_LIMIT_DB)
 @app.before_request
 def check_rate_limit():
     if not limiter.can_make_request(
@@ -33,11 +35,35 @@ def check_rate_limit():
     ):
         return jsonify({'error': 'Rate limit exceeded'}), 429
 
+# Columns of the CSV export, in order
+EXPORT_COLUMNS = [
+    # AKP columns
+    'AKP_INR', 'AKP_NR', 'AKP_NAME', 'AKP_VORNAME', 'AKP_FUNKTION', 'AKP_SUBJEKT_NR',
+    'AKP_ANR_NR', 'AKP_ANREDENAME', 'AKP_TEL', 'AKP_MAIL', 'AKP_WWW', 'AKP_TEL2',
+    'AKP_TEL3', 'AKP_TEL4', 'AKP_ABTEILUNG', 'AKP_ANR_GROUP',
+    # ANR columns
+    'ANR_ANREDE', 'ANR_ANREDETEXT',
+    # ADR columns
+    'ADR_INR', 'ADR_KURZNA', 'ADR_LAND', 'ADR_PLZ', 'ADR_NAME', 'ADR_VORNAME',
+    'ADR_ORT', 'ADR_EMAIL', 'ADR_STAAT', 'ADR_STREET', 'ADR_TEL', 'ADR_TEL2',
+    'ADR_TELEX', 'ADR_TELEFAX', 'ADR_SPRACHE', 'ADR_WWW', 'ADR_HOUSE_NUMBER',
+    'ADR_PostOfficeBoxText', 'ADR_PostOfficeBoxNumber', 'ADR_ANR_GROUP',
+    # NPO columns
+    'NPO_ProjNr', 'NPO_ProjName', 'NPO_Status', 'NPO_Status1', 'NPO_Status2',
+    'NPO_Status3', 'NPO_Status4', 'NPO_KDatum', 'NPO_KSumme', 'NPO_ADatum', 'NPO_ASumme'
+]
+
+# Paging of /combinedData
+COMBINED_PAGE_SIZE = 100
+COMBINED_MAX_PAGE_SIZE = 1000
+COMBINED_QUERY_ARGS = ('offset', 'limit', 'sort', 'order', 'q', 'hide_synced')
+
 # Initialize managers
 report_manager = ReportManager(app.config)
 
-# Simulate a key-value store (replace with a real database in production)
-db = {}
+# (ETag, serialized /combinedData body) of the current combined view, replaced as a whole
+combined_json_cache = (None, '')
+
 
 @app.route('/')
 def index():
@@ -60,7 +86,7 @@ def get_pipedrive_fields():
     """Get all available Pipedrive fields."""
     try:
         company_key = request.args.get('company', 'uniska')
-        pipedrive = PipedriveHelper(company_key)
+        pipedrive = get_pipedrive_helper(company_key)
 
         fields = {
             'organization': pipedrive.get_organization_fields(),
@@ -72,6 +98,15 @@ def get_pipedrive_fields():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/pipedrive-fields/invalidate', methods=['POST'])
+def invalidate_pipedrive_fields():
+    """Drop cached Pipedrive field definitions of a company (or all companies)."""
+    company_key = request.args.get('company') or (request.get_json(silent=True) or {}).get('company')
+    if company_key and company_key not in app.config['COMPANIES']:
+        return jsonify({'error': f'Unknown company {company_key}'}), 400
+    dropped = pipedrive_field_cache.invalidate(company_key)
+    return jsonify({'status': 'success', 'invalidated': dropped})
+
 @app.route('/pipedrive-config', methods=['GET', 'POST'])
 def pipedrive_config():
     """Handle Pipedrive field mapping configuration."""
@@ -87,52 +122,38 @@ def pipedrive_config():
 
 @app.route('/export', methods=['GET'])
 def export_data():
-    """Export combined data in CSV format with custom formatting."""
+    """Export combined data in CSV format with custom formatting.
+
+    Query parameters:
+        columns: comma-separated subset of EXPORT_COLUMNS (default: all)
+        gzip: set to 1 to gzip the response if the client accepts it
+        company, mandant: whose data to export (default: the most recently fetched)
+    """
     try:
-        data = report_manager.get_combined_data()
+        columns = EXPORT_COLUMNS
+        if request.args.get('columns'):
+            columns = [col.strip() for col in request.args['columns'].split(',') if col.strip()]
+            invalid = [col for col in columns if col not in EXPORT_COLUMNS]
+            if invalid or not columns:
+                return jsonify({'error': f'Invalid export columns: {invalid}', 'available_columns': EXPORT_COLUMNS}), 400
 
-        if not data:
+        data = report_manager.iter_combined_data(request.args.get('company'), request.args.get('mandant'))
+        first_row = next(data, None)
+
+        if first_row is None:
             return jsonify({'error': 'No data available to export'}), 404
 
-        # Define specific columns to export
-        columns = [
-            # AKP columns
-            'AKP_INR', 'AKP_NR', 'AKP_NAME', 'AKP_VORNAME', 'AKP_FUNKTION', 'AKP_SUBJEKT_NR',
-            'AKP_ANR_NR', 'AKP_ANREDENAME', 'AKP_TEL', 'AKP_MAIL', 'AKP_WWW', 'AKP_TEL2',
-            'AKP_TEL3', 'AKP_TEL4', 'AKP_ABTEILUNG', 'AKP_ANR_GROUP',
-            # ANR columns
-            'ANR_ANREDE', 'ANR_ANREDETEXT',
-            # ADR columns
-            'ADR_INR', 'ADR_KURZNA', 'ADR_LAND', 'ADR_PLZ', 'ADR_NAME', 'ADR_VORNAME',
-            'ADR_ORT', 'ADR_EMAIL', 'ADR_STAAT', 'ADR_STREET', 'ADR_TEL', 'ADR_TEL2',
-            'ADR_TELEX', 'ADR_TELEFAX', 'ADR_SPRACHE', 'ADR_WWW', 'ADR_HOUSE_NUMBER',
-            'ADR_PostOfficeBoxText', 'ADR_PostOfficeBoxNumber', 'ADR_ANR_GROUP',
-            # NPO columns
-            'NPO_ProjNr', 'NPO_ProjName', 'NPO_Status', 'NPO_Status1', 'NPO_Status2',
-            'NPO_Status3', 'NPO_Status4', 'NPO_KDatum', 'NPO_KSumme', 'NPO_ADatum', 'NPO_ASumme'
-        ]
-
-        # Create a temporary file-like object
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=columns)
-
-        # Write headers
-        writer.writeheader()
-
-        # Write data rows, only including specified columns
-        for row in data:
-            filtered_row = {col: row.get(col, '') for col in columns}
-            writer.writerow(filtered_row)
-
-        # Prepare the output
-        output.seek(0)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),  # Use UTF-8 with BOM for Excel compatibility
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'crm_sync_export_{timestamp}.csv'
-        )
+        # Stream rows as they come out of the combine step; UTF-8 with BOM for Excel compatibility
+        chunks = iter_csv_chunks(itertools.chain([first_row], data), columns, bom=True)
+        headers = {
+            'Content-Disposition': f'attachment; filename=crm_sync_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        }
+        if request.args.get('gzip') in ('1', 'true') and 'gzip' in request.accept_encodings:
+            chunks = gzip_chunks(chunks)
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+
+        return app.response_class(stream_with_context(chunks), mimetype='text/csv', headers=headers)
 
     except Exception as e:
         logger.error(f"Error exporting data: {e}")
@@ -140,7 +161,13 @@ def export_data():
 
 @app.route('/startAllReports', methods=['POST'])
 def start_all_reports():
-    """Start all reports for a given mandant and year."""
+    """Start all reports for the given companies and mandants and a year.
+
+    `company` and `mandant` may be 'all' to refresh every company or every mandant
+    of a company; `report_keys` optionally limits the reports. All reports are
+    submitted concurrently and their IDs returned per company and mandant.
+    Recently stored results are reused unless `refresh` is set.
+    """
     try:
         data = request.get_json()
         if not data:
@@ -148,39 +175,35 @@ def start_all_reports():
 
         mandant = data.get('mandant')
         year = data.get('year', 'none')
-        report_key = data.get('report_key')
-
-
-        # Get company from request
         company = data.get('company', 'uniska')
-        logger.debug(f"Received request for company: {company}")
-        company_config = app.config['COMPANIES'].get(company, {})
-        company_mandants = company_config.get('mandants', {})
-
-        logger.debug(f"Company: {company}")
-        logger.debug(f"Mandant: {mandant}")
-        logger.debug(f"Available mandants: {company_mandants}")
+        logger.debug(f"Received request for company {company}, mandant {mandant}")
 
         if not mandant:
             return jsonify({'error': 'No mandant provided'}), 400
-            
-        if mandant not in company_mandants:
-            return jsonify({'error': f'Invalid mandant {mandant}. Available mandants: {company_mandants}'}), 400
 
-        report_ids = {}
-        company_config = app.config['COMPANIES'][company]
-        report_keys = company_config.get('report_keys', {})
-
-        for report_key in report_keys.keys():
-            try:
-                logger.info(f"Starting report {report_key} for mandant {mandant}")
-                report_id = report_manager.start_report(mandant, report_key, year)
-                report_ids[report_key] = report_id
-                logger.info(f"Successfully started report {report_key} with ID {report_id}")
-            except Exception as e:
-                error_msg = f"Failed to start report {report_key} for mandant {mandant}: {str(e)}"
-                logger.error(error_msg)
-                return jsonify({'error': error_msg}), 500
+        companies = list(app.config['COMPANIES']) if company == 'all' else [company]
+        jobs = []
+        for company_key in companies:
+            company_config = app.config['COMPANIES'].get(company_key)
+            if not company_config:
+                return jsonify({'error': f'Unknown company {company_key}'}), 400
+            company_mandants = company_config.get('mandants', {})
+            mandants = list(company_mandants) if mandant == 'all' else [mandant]
+            if any(key not in company_mandants for key in mandants):
+                return jsonify({'error': f'Invalid mandant {mandant}. Available mandants: {company_mandants}'}), 400
+
+            report_keys = data.get('report_keys') or list(company_config.get('report_keys', {}))
+            invalid = [key for key in report_keys if key not in company_config.get('report_keys', {})]
+            if invalid:
+                return jsonify({'error': f'Unknown report keys {invalid} for {company_key}'}), 400
+            jobs.extend((company_key, mandant_key, report_key) for mandant_key in mandants for report_key in report_keys)
+
+        logger.info(f"Starting {len(jobs)} reports")
+        report_ids, errors = report_manager.start_reports(jobs, year, force=bool(data.get('refresh')))
+        if errors:
+            for error in errors:
+                logger.error(error)
+            return jsonify({'error': '; '.join(errors), 'report_ids': report_ids}), 500
 
         return jsonify({'report_ids': report_ids}), 200
 
@@ -190,14 +213,80 @@ def start_all_reports():
 
 @app.route('/reports', methods=['GET'])
 def get_reports():
-    """Get status of all reports."""
+    """Get status of all reports, or of one company's with ?company=."""
     try:
-        reports = report_manager.get_all_reports()
+        reports = report_manager.get_all_reports(request.args.get('company'))
         return jsonify({'reports': reports}), 200
     except Exception as e:
         logger.error(f"Error getting reports: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/reports/<report_id>/cancel', methods=['POST'])
+def cancel_report(report_id):
+    """Stop polling a running report."""
+    try:
+        if not report_manager.get_report_status(report_id):
+            return jsonify({'error': 'Report not found'}), 404
+        if not report_manager.cancel_report(report_id):
+            return jsonify({'error': 'Report is not running'}), 409
+        return jsonify({'status': 'Cancelled'}), 200
+    except Exception as e:
+        logger.error(f"Error cancelling report: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Get internal performance counters."""
+    return jsonify({
+        'abacus_token': report_manager.get_token_stats(),
+        'report_scheduler': report_manager.get_scheduler_stats(),
+        'pipedrive_field_cache': pipedrive_field_cache.get_stats(),
+        'pipedrive_index': {
+            company_key: get_pipedrive_helper(company_key).index.get_stats()
+            for company_key in app.config['COMPANIES']
+        },
+        'pipedrive_calls': {
+            company_key: get_pipedrive_helper(company_key).get_call_stats()
+            for company_key in app.config['COMPANIES']
+        },
+        'pipedrive_rate_limit': {
+            company_key: get_pipedrive_helper(company_key).session.budget.get_stats()
+            for company_key in app.config['COMPANIES']
+        }
+    }), 200
+
+
+def prepare_sync_record(data: dict, company_key: str) -> dict:
+    """Fill in values the client did not send."""
+    # Fill in the salutation if the client only sent its number
+    anr_nr = data.get('AKP_ANR_NR')
+    if anr_nr and not data.get('ANR_ANREDE'):
+        salutation = report_manager.lookup_anr(anr_nr, company_key, data.get('mandant'))
+        if salutation:
+            data['ANR_ANREDE'], data['ANR_ANREDETEXT'] = salutation
+    return data
+
+
+def journal_synced(company_key: str, view, records: list, entities: list) -> None:
+    """Record the synced entities of records in the sync journal.
+
+    The dashboard sends the displayed values; the journal stores the combined rows
+    they came from where they can be found, so their fingerprints match the dataset.
+    """
+    journal = report_manager.get_sync_journal(company_key)
+    rows = []
+    for data in records:
+        proj_nr = data.get('NPO_ProjNr') or data.get('ProjNr')
+        matching = []
+        if view and proj_nr:
+            candidates, _ = view.query(limit=len(view.rows), filters={'NPO_ProjNr': str(proj_nr)})
+            person = [str(data.get(column) or '').strip() for column in ('AKP_VORNAME', 'AKP_NAME')]
+            matching = [row for row in candidates
+                        if [str(row.get(column) or '').strip() for column in ('AKP_VORNAME', 'AKP_NAME')] == person]
+        rows.extend(matching or [data])
+    journal.record(rows, entities)
+
 
 @app.route('/sync-to-pipedrive', methods=['POST'])
 def sync_to_pipedrive():
@@ -207,77 +296,132 @@ def sync_to_pipedrive():
         if not data:
             return jsonify({'error': 'No data received'}), 400
 
-        proj_nr = data.get('ProjNr')
         company_key = data.pop('company_key', 'uniska')
+        prepare_sync_record(data, company_key)
 
-        # Save sync status
-        if proj_nr:
-            sync_key = f"{company_key}_synced_entries"
-            if sync_key not in db:
-                db[sync_key] = []
-            synced_entries = db[sync_key]
-            if proj_nr not in synced_entries:
-                synced_entries.append(proj_nr)
-                db[sync_key] = synced_entries
+        if not os.getenv(f'{company_key.upper()}_PIPEDRIVE_API_KEY'):
+            return jsonify({'error': 'Pipedrive API key not configured'}), 400
+
+        pipedrive = get_pipedrive_helper(company_key)
+        result = sync_record(pipedrive, data)
+        view = report_manager.get_combined_view(company_key, data.get('mandant'))
+        journal_synced(company_key, view, [data], result['synced_entities'])
+        return jsonify(result), 200
+
+    except SyncError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logger.error(f"Error syncing to Pipedrive: {e}")
+        return jsonify({'error': str(e)}), 500
 
+
+@app.route('/sync-to-pipedrive/batch', methods=['POST'])
+def sync_batch_to_pipedrive():
+    """Sync many records to Pipedrive in one request.
+
+    Expects {"company_key": ..., "records": [...]} and streams one JSON result per
+    line (index, ProjNr, success, message/error) as records finish.
+    """
+    try:
+        payload = request.get_json(silent=True) or {}
+        records = payload.get('records')
+        company_key = payload.get('company_key', 'uniska')
+        if not records or not isinstance(records, list):
+            return jsonify({'error': 'No records received'}), 400
+        if len(records) > app.config['PIPEDRIVE_SYNC_MAX_BATCH']:
+            return jsonify({'error': f"At most {app.config['PIPEDRIVE_SYNC_MAX_BATCH']} records per batch"}), 400
         if not os.getenv(f'{company_key.upper()}_PIPEDRIVE_API_KEY'):
             return jsonify({'error': 'Pipedrive API key not configured'}), 400
 
-        pipedrive = PipedriveHelper(company_key)
+        pipedrive = get_pipedrive_helper(company_key)
+        records = [prepare_sync_record(dict(record), company_key) for record in records]
+        view = report_manager.get_combined_view(company_key, payload.get('mandant'))
 
-        # Create or update organization
-        org_name = data.get('ADR_NAME')
-        if not org_name:
-            return jsonify({'error': 'Organization name (ADR_NAME) is required'}), 400
+        def on_synced(record: dict, result: dict) -> None:
+            journal_synced(company_key, view, [record], result['synced_entities'])
 
-        existing_org = pipedrive.find_organization_by_name(org_name)
-        if existing_org:
-            logger.info(f"Found existing organization: {existing_org['name']}")
-            org_id = existing_org['id']
-            org_result = pipedrive.update_organization(org_id, data)
-        else:
-            logger.info(f"Creating new organization: {org_name}")
-            org_result = pipedrive.create_organization(data)
-            if not org_result.get('success'):
-                logger.error(f"Failed to create organization: {org_result}")
-                return jsonify({'error': org_result.get('error', 'Failed to create organization')}), 500
-            org_id = org_result['data']['id']
-            logger.info(f"Created organization with ID: {org_id}")
-
-        # Create or update person with complete data
-        person_name = f"{data.get('AKP_VORNAME', '')} {data.get('AKP_NAME', '')}".strip()
-        if person_name:
-            logger.info(f"Processing person: {person_name}")
-            existing_person = pipedrive.find_person_by_name(person_name, org_id)
-            if existing_person:
-                logger.info(f"Found existing person: {existing_person['name']}")
-                person_result = pipedrive.update_person(existing_person['id'], data)
-            else:
-                logger.info(f"Creating new person: {person_name}")
-                person_result = pipedrive.create_person(data, org_id)
-                if not person_result.get('success'):
-                    logger.error(f"Failed to create person: {person_result}")
-                    return jsonify({'error': person_result.get('error', 'Failed to create person')}), 500
-                logger.info(f"Created person with ID: {person_result['data']['id']}")
-
-        # Create deal with all related data if it doesn't exist
-        logger.info("Creating deal...")
-        deal_result = pipedrive.create_deal(data, org_id)
-        if not deal_result.get('success'):
-            error_msg = deal_result.get('error', '')
-            if error_msg == 'Deal already exists':
-                return jsonify({'message': 'Deal already exists, skipping'}), 200
-            logger.error(f"Failed to create deal: {deal_result}")
-            return jsonify({'error': error_msg}), 500
-        logger.info(f"Created deal with ID: {deal_result['data']['id']}")
-
-        return jsonify({'success': True, 'message': 'Record synced successfully'}), 200
+        def generate():
+            results = sync_batch(pipedrive, records, app.config['PIPEDRIVE_SYNC_CONCURRENCY'], on_synced)
+            for result in results:
+                yield json.dumps(result) + '\n'
+
+        return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
 
     except Exception as e:
-        logger.error(f"Error syncing to Pipedrive: {e}")
+        logger.error(f"Error syncing batch to Pipedrive: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/sync-to-pipedrive/changes', methods=['POST'])
+def sync_changes_to_pipedrive():
+    """Sync the combined rows that are new or changed since they were last synced.
+
+    Expects {"company_key": ..., "mandant": ...}; without a mandant the most recently
+    fetched dataset of the company is used. Streams one JSON result per line like
+    /sync-to-pipedrive/batch, then a summary line with the synced, failed and
+    unchanged counts.
+    """
+    try:
+        payload = request.get_json(silent=True) or {}
+        company_key = payload.get('company_key', 'uniska')
+        if company_key not in app.config['COMPANIES']:
+            return jsonify({'error': f'Unknown company {company_key}'}), 400
+        if not os.getenv(f'{company_key.upper()}_PIPEDRIVE_API_KEY'):
+            return jsonify({'error': 'Pipedrive API key not configured'}), 400
+
+        view = report_manager.get_combined_view(company_key, payload.get('mandant'))
+        if not view:
+            return jsonify({'error': 'No data available to sync'}), 404
+        journal = report_manager.get_sync_journal(company_key)
+        records = [prepare_sync_record(dict(row), company_key) for row in journal.changed(view.rows)]
+        unchanged = len(view.rows) - len(records)
+        logger.info(f"Syncing {len(records)} new or changed rows of {company_key}, {unchanged} unchanged")
+        pipedrive = get_pipedrive_helper(company_key)
+
+        def on_synced(record: dict, result: dict) -> None:
+            journal.record([record], result['synced_entities'])
+
+        def generate():
+            synced = failed = 0
+            results = sync_batch(pipedrive, records, app.config['PIPEDRIVE_SYNC_CONCURRENCY'], on_synced)
+            for result in results:
+                if result['success']:
+                    synced += 1
+                else:
+                    failed += 1
+                yield json.dumps(result) + '\n'
+            yield json.dumps({'done': True, 'synced': synced, 'failed': failed, 'unchanged': unchanged}) + '\n'
+
+        return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    except Exception as e:
+        logger.error(f"Error syncing changes to Pipedrive: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/pipedrive/won-dates', methods=['GET', 'POST'])
+def won_dates_backfill():
+    """Start (POST) or get the progress of (GET) the won dates backfill of a company.
+
+    POST resumes an interrupted run unless "restart" is set.
+    """
+    payload = request.get_json(silent=True) or {}
+    company_key = request.args.get('company') or payload.get('company_key', 'uniska')
+    if company_key not in app.config['COMPANIES']:
+        return jsonify({'error': f'Unknown company {company_key}'}), 400
+    backfill = get_pipedrive_helper(company_key).won_dates
+
+    if request.method == 'GET':
+        return jsonify(backfill.get_progress()), 200
+
+    if not os.getenv(f'{company_key.upper()}_PIPEDRIVE_API_KEY'):
+        return jsonify({'error': 'Pipedrive API key not configured'}), 400
+    restart = str(request.args.get('restart', payload.get('restart', ''))).lower() in ('1', 'true', 'yes')
+    if not backfill.start(restart=restart):
+        return jsonify({'error': 'Backfill is already running', **backfill.get_progress()}), 409
+    return jsonify({'status': 'Started'}), 202
+
+
 @app.route('/reportData/<report_id>', methods=['GET'])
 def get_report_data(report_id):
     """Get data for a specific report."""
@@ -303,40 +447,96 @@ def get_report_data(report_id):
 def not_found_error(error):
     return jsonify({'error': 'Not found'}), 404
 
+def parse_combined_query(args, columns) -> dict:
+    """Parse paging, sorting and filtering parameters of /combinedData.
+
+    Raises ValueError for invalid values or unknown columns.
+    """
+    offset = int(args.get('offset', 0))
+    limit = int(args.get('limit', COMBINED_PAGE_SIZE))
+    if offset < 0 or not 0 < limit <= COMBINED_MAX_PAGE_SIZE:
+        raise ValueError(f'offset must be >= 0 and limit between 1 and {COMBINED_MAX_PAGE_SIZE}')
+
+    sort = args.get('sort') or None
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'")
+
+    filters = {key[len('filter_'):]: value for key, value in args.items() if key.startswith('filter_')}
+    unknown = [column for column in [sort, *filters] if column and column not in columns]
+    if unknown:
+        raise ValueError(f'Unknown columns: {unknown}')
+
+    return {
+        'offset': offset,
+        'limit': limit,
+        'sort': sort,
+        'descending': order == 'desc',
+        'search': args.get('q') or None,
+        'filters': filters,
+        'exclude': {'Status': 'synced'} if args.get('hide_synced') in ('1', 'true') else None
+    }
+
+
 @app.route('/combinedData', methods=['GET', 'POST'])
 def get_combined_data():
-    """Get combined and matched data from all reports."""
+    """Get combined and matched data from all reports.
+
+    Without paging parameters the whole dataset is returned. With any of offset,
+    limit, sort/order, q (ProjNr search), hide_synced or filter_<column> only the
+    requested page is returned, together with the total number of matching rows.
+    format=html streams the rows as an HTML table instead of JSON. company and
+    mandant select the dataset; by default the most recently fetched one is used.
+    """
+    global combined_json_cache
     try:
-        data = report_manager.get_combined_data()
+        view = report_manager.get_combined_view(request.args.get('company'), request.args.get('mandant'))
+        etag = view.etag if view else 'empty'
+        html = request.args.get('format') == 'html'
+        paged = any(key in COMBINED_QUERY_ARGS or key.startswith('filter_') for key in request.args)
+        if paged:
+            etag = f"{etag}-{hashlib.sha1(request.query_string).hexdigest()[:8]}"
+        elif html:
+            etag = f"{etag}-html"
+        if request.method == 'GET' and etag in request.if_none_match:
+            return '', 304, {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+
+        if paged:
+            try:
+                query = parse_combined_query(request.args, view.columns if view else ())
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            rows, total = view.query(**query) if view else ([], 0)
+        else:
+            rows = view.rows if view else []
+            total = len(rows)
 
         # Check if HTML format is requested
-        if request.args.get('format') == 'html':
-            if not data:
+        if html:
+            if not rows:
                 return '<p>No data available</p>'
-
-            # Start HTML table
-            html = '<table border="1" style="border-collapse: collapse; width: 100%;">'
-
-            # Headers
-            if data:
-                headers = list(data[0].keys())
-                html += '<tr>'
-                for header in headers:
-                    html += f'<th style="padding: 8px; text-align: left;">{header}</th>'
-                html += '</tr>'
-
-            # Data rows
-            for row in data:
-                html += '<tr>'
-                for header in headers:
-                    value = row.get(header, '')
-                    html += f'<td style="padding: 8px;">{value}</td>'
-                html += '</tr>'
-
-            html += '</table>'
-            return html
-
-        return jsonify({'combined_data': data}), 200
+            response = app.response_class(stream_with_context(iter_html_table(rows, view.columns)), mimetype='text/html')
+        elif paged:
+            next_offset = query['offset'] + len(rows)
+            response = jsonify({
+                'combined_data': rows,
+                'total': total,
+                'offset': query['offset'],
+                'limit': query['limit'],
+                'next_offset': next_offset if next_offset < total else None
+            })
+        else:
+            cached_etag, body = combined_json_cache
+            if cached_etag != etag:
+                # Serialize row by row so the row dicts never all exist at once
+                body = '{"combined_data": [' + ', '.join(app.json.dumps(row) for row in rows) + ']}'
+                combined_json_cache = (etag, body)
+            response = app.response_class(body, mimetype='application/json')
+
+        # Let the browser revalidate and skip downloading an unchanged dataset
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         logger.error(f"Error getting combined data: {e}")
         return jsonify({'error': str(e)}), 500
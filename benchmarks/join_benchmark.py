@@ -0,0 +1,116 @@
+"""Benchmark the NPO x ADR x AKP join at growing report sizes.
+
+Compares the old per-request dict rebuild with the precomputed ReportIndex join.
+Run from the repository root:
+
+    python benchmarks/join_benchmark.py [--sizes 10000 100000 1000000]
+
+The ANR salutation lookup is left out so only the join itself is measured.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from combine import ReportIndex, iter_joined_rows  # noqa: E402
+
+
+def generate_reports(rows: int):
+    """Generate NPO/ADR/AKP records shaped like the Abacus reports, `rows` AKP contacts in total."""
+    customers = max(rows // 2, 1)
+    adr = [
+        {'INR': str(i), 'KURZNA': f'ORG{i}', 'NAME': f'Organisation {i}', 'LAND': 'CH', 'PLZ': '4000',
+         'ORT': 'Basel', 'STREET': 'Hauptstrasse', 'HOUSE_NUMBER': str(i % 200), 'TEL': '' if i % 3 else '061 000 00 00',
+         'TEL2': '061 111 11 11', 'EMAIL': f'info{i}@example.ch'}
+        for i in range(customers)
+    ]
+    npo = [
+        {'ProjNr': f'P{i}', 'ProjName': f'Projekt {i}', 'KdINR': str(i), 'Person1': '0', 'Status': '1',
+         'KDatum': '2024-01-01 00:00:00', 'KSumme': '1000', 'ADatum': '', 'ASumme': ''}
+        for i in range(customers)
+    ]
+    akp = [
+        {'INR': str(i), 'ADR_INR': str(i % customers), 'NR': str(i), 'NAME': f'Name{i}', 'VORNAME': 'Vorname',
+         'FUNKTION': 'CEO', 'TEL': '', 'TEL2': '', 'TEL3': '079 000 00 00', 'MAIL': f'p{i}@example.ch', 'ANR_NR': ''}
+        for i in range(rows)
+    ]
+    return npo, adr, akp
+
+
+def legacy_join(npo_data, adr_data, akp_data):
+    """The previous get_combined_data join: dicts rebuilt and fields re-prefixed on every call."""
+    npo_dict = {}
+    for npo in npo_data:
+        if not npo.get('ProjNr'):
+            continue
+        key = str(npo.get('KdINR', '')) if npo.get('Person1') == '0' else str(npo.get('Person1', ''))
+        if key:
+            npo_dict[key] = npo
+    adr_dict = {str(adr.get('INR', '')): adr for adr in adr_data if adr.get('INR')}
+    akp_dict = {}
+    for akp in akp_data:
+        adr_inr = str(akp.get('ADR_INR', ''))
+        if adr_inr:
+            akp_dict.setdefault(adr_inr, []).append(akp)
+
+    combined = []
+    for inr, npo in npo_dict.items():
+        adr = adr_dict.get(inr)
+        if not adr:
+            continue
+        base_record = {f'NPO_{k}': v for k, v in npo.items()}
+        adr_with_phone = {**adr, 'TEL': adr.get('TEL') or adr.get('TEL2') or ''}
+        base_record.update({f'ADR_{k}': v for k, v in adr_with_phone.items()})
+        base_record['Status'] = 'new'
+        akp_entries = akp_dict.get(inr, [])
+        if not akp_entries:
+            combined.append(base_record)
+            continue
+        for akp_record in akp_entries:
+            current_record = base_record.copy()
+            akp_phone = akp_record.get('TEL') or akp_record.get('TEL2') or akp_record.get('TEL3') or ''
+            current_record.update({f'AKP_{k}': v for k, v in {**akp_record, 'TEL': akp_phone}.items()})
+            combined.append(current_record)
+    return combined
+
+
+def build_indexes(npo, adr, akp):
+    indexes = {}
+    for key, records in (('npo', npo), ('adr', adr), ('akp', akp)):
+        indexes[key] = ReportIndex(key)
+        indexes[key].add_page(records)
+    return indexes
+
+
+def run(rows: int) -> None:
+    npo, adr, akp = generate_reports(rows)
+
+    started = time.perf_counter()
+    legacy_rows = legacy_join(npo, adr, akp)
+    legacy_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexes = build_indexes(npo, adr, akp)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    joined_rows = list(iter_joined_rows(indexes['npo'], indexes['adr'], indexes['akp']))
+    join_time = time.perf_counter() - started
+
+    assert joined_rows == legacy_rows, "indexed join differs from legacy join"
+    print(f"{rows:>9} rows | legacy join {legacy_time:7.3f}s | index build (once) {build_time:7.3f}s | "
+          f"indexed join {join_time:7.3f}s | speedup per request {legacy_time / join_time:5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    for rows in args.sizes:
+        run(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Measure memory held by fetched report rows and the combined dataset.
+
+Compares the old list-of-dicts storage (every report row and every combined row
+a dict with its own keys) with the columnar ReportIndex tables and the
+reference-based CombinedView. Run from the repository root:
+
+    python benchmarks/memory_benchmark.py [--sizes 10000 100000]
+
+Sizes are numbers of AKP contacts; memory is measured with tracemalloc.
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from combine import CombinedView, ReportIndex  # noqa: E402
+from join_benchmark import generate_reports, legacy_join  # noqa: E402
+
+PAGE_SIZE = 1000
+
+
+def measure(build):
+    """Run `build` and return (its result, MB still allocated, peak MB)."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / 2 ** 20, peak / 2 ** 20
+
+
+def build_legacy(rows: int):
+    """Keep every report as a list of dicts and materialize the combined rows as dicts."""
+    npo, adr, akp = generate_reports(rows)
+    return (npo, adr, akp), legacy_join(npo, adr, akp)
+
+
+def build_columnar(rows: int):
+    """Index the reports page by page, as ReportManager does, and keep only the tables and view."""
+    reports = dict(zip(('npo', 'adr', 'akp'), generate_reports(rows)))
+    indexes = {}
+    for key in list(reports):
+        records = reports.pop(key)
+        indexes[key] = ReportIndex(key)
+        for start in range(0, len(records), PAGE_SIZE):
+            indexes[key].add_page(records[start:start + PAGE_SIZE])
+        del records
+    view = CombinedView(indexes['npo'], indexes['adr'], indexes['akp'], None, ('benchmark',))
+    view.refs  # materialize the row references
+    return indexes, view
+
+
+def run(rows: int) -> None:
+    (_, legacy_rows), legacy_mb, legacy_peak = measure(lambda: build_legacy(rows))
+    (_, view), columnar_mb, columnar_peak = measure(lambda: build_columnar(rows))
+    assert len(view.rows) == len(legacy_rows), "row counts differ"
+    assert view.rows[len(legacy_rows) // 2] == legacy_rows[len(legacy_rows) // 2], "rows differ"
+    print(f"{rows:>9} rows | list of dicts {legacy_mb:8.1f} MB (peak {legacy_peak:8.1f}) | "
+          f"columnar {columnar_mb:8.1f} MB (peak {columnar_peak:8.1f}) | {legacy_mb / columnar_mb:5.1f}x smaller")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+    for rows in args.sizes:
+        run(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+import hashlib
+import sys
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Placeholder for keys a record does not have (only in reports with ragged rows) and for absent columns
+MISSING = object()
+
+# Report keys that take part in the combined NPO x ADR x AKP dataset
+JOIN_REPORT_KEYS = ('npo', 'adr', 'akp')
+
+# Phone columns tried in order to fill an empty TEL
+PHONE_FALLBACKS = {
+    'adr': ('TEL', 'TEL2'),
+    'akp': ('TEL', 'TEL2', 'TEL3')
+}
+
+
+class ReportTable:
+    """Compact storage for the records of one report.
+
+    Records are kept as value tuples ordered by a shared column list, so each key
+    string is stored once per report instead of once per record.
+    """
+
+    def __init__(self, prefix: str, phone_fallbacks: Tuple[str, ...] = ()):
+        self.prefix = prefix
+        self.phone_fallbacks = phone_fallbacks
+        self.columns: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.uniform = True  # every record has exactly the same keys
+        self.row_count = 0
+        self._headers: Optional[Tuple[str, ...]] = None
+
+    def _add_column(self, key: str) -> None:
+        self.positions[key] = len(self.columns)
+        self.columns.append(sys.intern(key))
+        self._headers = None
+
+    def add(self, record: Dict[str, Any]) -> Tuple[Any, ...]:
+        """Store a record and return its value tuple."""
+        for key in record:
+            if key not in self.positions:
+                if self.row_count:
+                    self.uniform = False
+                self._add_column(key)
+        # The TEL fallback column is appended when the report has no TEL of its own
+        has_extra_tel = bool(self.phone_fallbacks) and 'TEL' not in record
+        if has_extra_tel and 'TEL' not in self.positions:
+            self._add_column('TEL')
+        if len(record) + has_extra_tel != len(self.columns):
+            self.uniform = False
+
+        values = [record.get(column, MISSING) for column in self.columns]
+        if self.phone_fallbacks:
+            values[self.positions['TEL']] = next(
+                (record[key] for key in self.phone_fallbacks if record.get(key)), ''
+            )
+        self.row_count += 1
+        return tuple(values)
+
+    @property
+    def headers(self) -> Tuple[str, ...]:
+        """Prefixed output column names, e.g. `ADR_NAME`."""
+        if self._headers is None:
+            self._headers = tuple(f"{self.prefix}{column}" for column in self.columns)
+        return self._headers
+
+    def values(self, row: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        """Get a row's values aligned to the current columns."""
+        missing = len(self.columns) - len(row)
+        return row + (MISSING,) * missing if missing else row
+
+
+class ReportIndex:
+    """Join index over one finished NPO, ADR or AKP report.
+
+    NPO rows are keyed by customer/person INR, ADR rows by INR and AKP rows are
+    grouped by ADR_INR. The index is built page by page while a report downloads.
+    """
+
+    def __init__(self, report_key: str):
+        self.report_key = report_key
+        self.table = ReportTable(f"{report_key.upper()}_", PHONE_FALLBACKS.get(report_key, ()))
+        self.by_key: Dict[str, Any] = {}
+        self._add = getattr(self, f"_add_{report_key}")
+
+    def add_page(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            self._add(record)
+
+    def _add_npo(self, record: Dict[str, Any]) -> None:
+        if not record.get('ProjNr'):  # Skip if no project number
+            return
+        key = str(record.get('KdINR', '')) if record.get('Person1') == '0' else str(record.get('Person1', ''))
+        if key:
+            self.by_key[key] = self.table.add(record)
+
+    def _add_adr(self, record: Dict[str, Any]) -> None:
+        if record.get('INR'):
+            self.by_key[str(record.get('INR', ''))] = self.table.add(record)
+
+    def _add_akp(self, record: Dict[str, Any]) -> None:
+        adr_inr = str(record.get('ADR_INR', ''))
+        if adr_inr:
+            self.by_key.setdefault(adr_inr, []).append(self.table.add(record))
+
+
+class JoinLayout:
+    """Precomputed output column layout for one NPO x ADR x AKP combination.
+
+    Combined rows are kept as `JoinedRef` tuples pointing at the source rows; the
+    prefixed output dict of a row is only built when it is accessed.
+    """
+
+    ANR_HEADERS = ('ANR_ANREDE', 'ANR_ANREDETEXT')
+
+    def __init__(self, npo: ReportIndex, adr: ReportIndex, akp: Optional[ReportIndex] = None,
+                 anr_lookup: Optional[Callable[[Any], Optional[Tuple[str, str]]]] = None):
+        self.npo, self.adr, self.akp = npo, adr, akp
+        self.anr_lookup = anr_lookup
+        self.npo_table, self.adr_table = npo.table, adr.table
+        self.akp_table = akp.table if akp else None
+        self.uniform = self.npo_table.uniform and self.adr_table.uniform and (
+            self.akp_table is None or self.akp_table.uniform
+        )
+        self.base_headers = self.npo_table.headers + self.adr_table.headers + ('Status',)
+        self.akp_headers = self.base_headers + self.akp_table.headers if self.akp_table else self.base_headers
+        # Rows without AKP, or without a salutation, use a prefix of these columns
+        self.columns = self.akp_headers + (self.ANR_HEADERS if self.akp_table else ())
+        self.anr_position = self.akp_table.positions.get('ANR_NR') if self.akp_table else None
+        self.akp_groups = akp.by_key if akp else {}
+        # Sync status of a row; every row is 'new' unless a view sets a status source
+        self.status_of: Callable[['JoinedRef'], str] = lambda ref: 'new'
+
+    def values(self, ref: 'JoinedRef') -> Tuple[Any, ...]:
+        """Get the output values of a combined row, aligned to a prefix of `columns`."""
+        npo_row, adr_row, akp_row, salutation = ref
+        values = self.npo_table.values(npo_row) + self.adr_table.values(adr_row) + (self.status_of(ref),)
+        if akp_row is not None:
+            values += self.akp_table.values(akp_row)
+            if salutation:
+                values += tuple(salutation)
+        return values
+
+    def make_row(self, ref: 'JoinedRef') -> Dict[str, Any]:
+        """Build the output dict of a combined row."""
+        if self.uniform:
+            return dict(zip(self.columns, self.values(ref)))
+        return {h: v for h, v in zip(self.columns, self.values(ref)) if v is not MISSING}
+
+    def getter(self, column: str) -> Callable[['JoinedRef'], Any]:
+        """Get a function reading one output column of a combined row (MISSING if absent)."""
+        for part, table in ((0, self.npo_table), (1, self.adr_table), (2, self.akp_table)):
+            if table is not None and column.startswith(table.prefix) and column[len(table.prefix):] in table.positions:
+                position = table.positions[column[len(table.prefix):]]
+                return lambda ref: (
+                    ref[part][position] if ref[part] is not None and position < len(ref[part]) else MISSING
+                )
+        if column == 'Status':
+            return lambda ref: self.status_of(ref)
+        if column in self.ANR_HEADERS and self.akp_table:
+            position = self.ANR_HEADERS.index(column)
+            return lambda ref: ref[3][position] if ref[3] else MISSING
+        return lambda ref: MISSING
+
+    def build_group(self, inr: str, npo_row: Tuple[Any, ...]) -> List['JoinedRef']:
+        """Build the combined rows of one NPO record."""
+        adr_row = self.adr.by_key.get(inr)
+        if adr_row is None:
+            return []
+
+        akp_rows = self.akp_groups.get(inr)
+        if not akp_rows:  # If no AKP entries, add base record
+            return [(npo_row, adr_row, None, None)]
+
+        # Create a record for each AKP entry
+        rows = []
+        for akp_row in akp_rows:
+            # Add ANR fields based on AKP_ANR_NR
+            salutation = None
+            anr_nr = akp_row[self.anr_position] if self.anr_position is not None and self.anr_position < len(akp_row) else None
+            if anr_nr and anr_nr is not MISSING and self.anr_lookup:
+                salutation = self.anr_lookup(anr_nr)
+            rows.append((npo_row, adr_row, akp_row, salutation))
+        return rows
+
+
+# (NPO row, ADR row, AKP row or None, (ANREDE, ANREDETEXT) or None)
+JoinedRef = Tuple[Tuple[Any, ...], Tuple[Any, ...], Optional[Tuple[Any, ...]], Optional[Tuple[str, str]]]
+
+
+def iter_joined_rows(npo: ReportIndex, adr: ReportIndex, akp: Optional[ReportIndex] = None,
+                     anr_lookup: Optional[Callable[[Any], Optional[Tuple[str, str]]]] = None
+                     ) -> Iterator[Dict[str, Any]]:
+    """Hash-join NPO x ADR x AKP indexes into combined output rows."""
+    layout = JoinLayout(npo, adr, akp, anr_lookup)
+    for inr, npo_row in npo.by_key.items():
+        for ref in layout.build_group(inr, npo_row):
+            yield layout.make_row(ref)
+
+
+class RowList(Sequence):
+    """Read-only list of combined rows whose dicts are built on access."""
+
+    def __init__(self, layout: JoinLayout, refs: List[JoinedRef]):
+        self.layout = layout
+        self.refs = refs
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.layout.make_row(ref) for ref in self.refs[i]]
+        return self.layout.make_row(self.refs[i])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        make_row = self.layout.make_row
+        for ref in self.refs:
+            yield make_row(ref)
+
+
+class CombinedView:
+    """Materialized combined dataset, versioned by the reports it was built from.
+
+    Rows are grouped per NPO key so a new ADR or AKP report only rebuilds the
+    groups whose joined records actually changed. Each row is a small tuple of
+    references to its source rows; see JoinLayout.
+    """
+
+    def __init__(self, npo: ReportIndex, adr: ReportIndex, akp: Optional[ReportIndex],
+                 anr_lookup: Optional[Callable[[Any], Optional[Tuple[str, str]]]], version: Tuple):
+        self.version = version
+        self.layout = JoinLayout(npo, adr, akp, anr_lookup)
+        self._status_source: Optional[Callable[[JoinLayout], Callable[[JoinedRef], str]]] = None
+        self.status_version: Any = None
+        self._groups: Dict[str, List[JoinedRef]] = {
+            inr: self.layout.build_group(inr, npo_row) for inr, npo_row in npo.by_key.items()
+        }
+        self._reset_caches()
+
+    def _reset_caches(self) -> None:
+        self._refs: Optional[List[JoinedRef]] = None
+        self._sort_indexes: Dict[str, List[int]] = {}
+        self._value_indexes: Dict[str, Dict[str, List[int]]] = {}
+        self._search_keys: Optional[List[str]] = None
+
+    @property
+    def etag(self) -> str:
+        return hashlib.sha1(repr((self.version, self.status_version)).encode()).hexdigest()[:20]
+
+    def set_status(self, source: Callable[[JoinLayout], Callable[[JoinedRef], str]], version: Any) -> None:
+        """Compute the Status column with `source(layout)`; `version` changes whenever its results do."""
+        if version == self.status_version and source == self._status_source:
+            return
+        self._status_source = source
+        self.status_version = version
+        self.layout.status_of = source(self.layout)
+        self._sort_indexes.pop('Status', None)
+        self._value_indexes.pop('Status', None)
+
+    @property
+    def refs(self) -> List[JoinedRef]:
+        """References of all combined rows in NPO order."""
+        if self._refs is None:
+            self._refs = [ref for group in self._groups.values() for ref in group]
+        return self._refs
+
+    @property
+    def rows(self) -> RowList:
+        """All combined rows in NPO order; row dicts are built on access."""
+        return RowList(self.layout, self.refs)
+
+    def patch(self, report_key: str, index: Optional[ReportIndex], version: Tuple) -> int:
+        """Swap in a newer ADR or AKP index, rebuilding only the affected groups.
+
+        Returns the number of rebuilt groups, or -1 if the column layout changed and
+        the whole view was rebuilt.
+        """
+        layout = self.layout
+        old = getattr(layout, report_key)
+        npo = layout.npo
+        new_layout = JoinLayout(
+            npo,
+            index if report_key == 'adr' else layout.adr,
+            index if report_key == 'akp' else layout.akp,
+            layout.anr_lookup
+        )
+
+        self.version = version
+        self.layout = new_layout
+        if self._status_source:
+            new_layout.status_of = self._status_source(new_layout)
+        self._reset_caches()
+
+        same_columns = old is not None and index is not None and old.table.columns == index.table.columns
+        if not same_columns or new_layout.uniform != layout.uniform:
+            self._groups = {inr: new_layout.build_group(inr, npo_row) for inr, npo_row in npo.by_key.items()}
+            return -1
+
+        changed = [inr for inr in npo.by_key if old.by_key.get(inr) != index.by_key.get(inr)]
+        for inr in changed:
+            self._groups[inr] = new_layout.build_group(inr, npo.by_key[inr])
+        return len(changed)
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        """Columns rows can be sorted and filtered by."""
+        return self.layout.columns
+
+    @staticmethod
+    def _sort_key(value: Any) -> str:
+        return str(value or '').casefold()
+
+    def _sort_index(self, column: str) -> List[int]:
+        """Row positions ordered by a column, built once per column and version."""
+        index = self._sort_indexes.get(column)
+        if index is None:
+            get = self.layout.getter(column)
+            keys = [self._sort_key(None if value is MISSING else value) for value in map(get, self.refs)]
+            index = sorted(range(len(keys)), key=keys.__getitem__)
+            self._sort_indexes[column] = index
+        return index
+
+    def _value_index(self, column: str) -> Dict[str, List[int]]:
+        """Row positions grouped by a column's value, built once per column and version."""
+        index = self._value_indexes.get(column)
+        if index is None:
+            index = {}
+            for i, value in enumerate(map(self.layout.getter(column), self.refs)):
+                index.setdefault('' if value is MISSING else str(value), []).append(i)
+            self._value_indexes[column] = index
+        return index
+
+    def query(self, offset: int = 0, limit: int = 100, sort: Optional[str] = None, descending: bool = False,
+              search: Optional[str] = None, filters: Optional[Dict[str, str]] = None,
+              exclude: Optional[Dict[str, str]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Get one page of rows and the total number of matching rows.
+
+        `search` is a case-insensitive substring of NPO_ProjNr, `filters` are exact
+        column matches and `exclude` drops rows whose column has the given value.
+        """
+        rows = self.rows
+        if sort:
+            order = self._sort_index(sort)
+            order = order[::-1] if descending else order
+        else:
+            order = range(len(rows))
+
+        allowed: Optional[set] = None
+        for column, value in (filters or {}).items():
+            matches = set(self._value_index(column).get(value, ()))
+            allowed = matches if allowed is None else allowed & matches
+        if search:
+            if self._search_keys is None:
+                get = self.layout.getter('NPO_ProjNr')
+                self._search_keys = [
+                    '' if value is MISSING else str(value or '').lower() for value in map(get, self.refs)
+                ]
+            term = search.lower()
+            matches = {i for i, key in enumerate(self._search_keys) if term in key}
+            allowed = matches if allowed is None else allowed & matches
+        for column, value in (exclude or {}).items():
+            excluded = set(self._value_index(column).get(value, ()))
+            if excluded:
+                allowed = (set(range(len(rows))) if allowed is None else allowed) - excluded
+
+        if allowed is None:
+            return [rows[i] for i in order[offset:offset + limit]], len(rows)
+
+        page = []
+        total = 0
+        for i in order:
+            if i in allowed:
+                if offset <= total < offset + limit:
+                    page.append(rows[i])
+                total += 1
+        return page, total
@@ -16,6 +16,59 @@ class Config:
     TOKEN_URL = 'https://abacus.indutrade.ch/oauth/oauth2/v1/token'
     BASE_URL = os.getenv('BASE_URL', 'https://abacus.indutrade.ch')
     PAGE_SIZE = int(os.getenv('PAGE_SIZE', '1000'))
+    # Number of report output pages downloaded in parallel
+    FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '4'))
+    PAGE_FETCH_RETRIES = int(os.getenv('PAGE_FETCH_RETRIES', '3'))
+    # Seconds an Abacus API request may take before it is abandoned
+    ABACUS_REQUEST_TIMEOUT = float(os.getenv('ABACUS_REQUEST_TIMEOUT', '60'))
+    # Finished reports whose data is downloaded at the same time, off the polling workers
+    REPORT_DOWNLOAD_CONCURRENCY = int(os.getenv('REPORT_DOWNLOAD_CONCURRENCY', '2'))
+    # Reports submitted to Abacus at the same time across all companies and mandants
+    REPORT_START_CONCURRENCY = int(os.getenv('REPORT_START_CONCURRENCY', '8'))
+    # Background refreshes of stale cached reports run at the same time, on their own pool
+    REPORT_REFRESH_CONCURRENCY = int(os.getenv('REPORT_REFRESH_CONCURRENCY', '2'))
+    # Report status polling: shared worker pool, adaptive interval and timeout (seconds)
+    SCHEDULER_WORKERS = int(os.getenv('SCHEDULER_WORKERS', '4'))
+    POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', '1'))
+    POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', '30'))
+    POLL_BACKOFF_FACTOR = float(os.getenv('POLL_BACKOFF_FACTOR', '1.5'))
+    REPORT_TIMEOUT = float(os.getenv('REPORT_TIMEOUT', '3600'))
+    # Seconds without a status change after which an unfinished report is considered abandoned
+    REPORT_STALE_AFTER = float(os.getenv('REPORT_STALE_AFTER', '300'))
+    # Directory report rows are streamed to while pages arrive
+    REPORT_DATA_DIR = os.getenv('REPORT_DATA_DIR', 'report_data')
+    # Database for report status and sync state, shared by all workers
+    STORAGE_URL = os.getenv('STORAGE_URL', f'sqlite:///{REPORT_DATA_DIR}/app.db')
+    # Seconds a stored report result is reused instead of running the report again, and up to which
+    # an older result is still served while a fresh run is started in the background
+    REPORT_CACHE_TTL = float(os.getenv('REPORT_CACHE_TTL', '3600'))
+    REPORT_CACHE_STALE_TTL = float(os.getenv('REPORT_CACHE_STALE_TTL', '86400'))
+    # Salutation table used until the 'anr' report has been fetched
+    ANR_CSV_PATH = os.getenv('ANR_CSV_PATH', 'attached_assets/ANR.csv')
+    # Seconds before `expires_in` at which a cached access token is refreshed
+    TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', '60'))
+    # Requests per minute per user and endpoint; set RATE_LIMIT_DB to a SQLite file to share the limit across workers
+    RATE_LIMIT_PER_MINUTE = int(os.getenv('RATE_LIMIT_PER_MINUTE', '60'))
+    RATE_LIMIT_DB = os.getenv('RATE_LIMIT_DB') or None
+
+    # Seconds Pipedrive field definitions are cached per company
+    PIPEDRIVE_FIELD_CACHE_TTL = int(os.getenv('PIPEDRIVE_FIELD_CACHE_TTL', '3600'))
+    # Connections kept alive per company to the Pipedrive API
+    PIPEDRIVE_POOL_SIZE = int(os.getenv('PIPEDRIVE_POOL_SIZE', '10'))
+    # Requests per window allowed per API key until the X-RateLimit headers say otherwise
+    PIPEDRIVE_RATE_LIMIT = int(os.getenv('PIPEDRIVE_RATE_LIMIT', '80'))
+    PIPEDRIVE_RATE_WINDOW = float(os.getenv('PIPEDRIVE_RATE_WINDOW', '2'))
+    # Retries of throttled (429) and failed (5xx) Pipedrive calls, and the base backoff in seconds
+    PIPEDRIVE_MAX_RETRIES = int(os.getenv('PIPEDRIVE_MAX_RETRIES', '5'))
+    PIPEDRIVE_RETRY_BACKOFF = float(os.getenv('PIPEDRIVE_RETRY_BACKOFF', '1'))
+    # Records synced in parallel by /sync-to-pipedrive/batch, and the batch size limit
+    PIPEDRIVE_SYNC_CONCURRENCY = int(os.getenv('PIPEDRIVE_SYNC_CONCURRENCY', '4'))
+    PIPEDRIVE_SYNC_MAX_BATCH = int(os.getenv('PIPEDRIVE_SYNC_MAX_BATCH', '1000'))
+    # Seconds between /recents refreshes of the local org/person/deal index, and between full reloads
+    PIPEDRIVE_INDEX_REFRESH_INTERVAL = float(os.getenv('PIPEDRIVE_INDEX_REFRESH_INTERVAL', '60'))
+    PIPEDRIVE_INDEX_RELOAD_INTERVAL = float(os.getenv('PIPEDRIVE_INDEX_RELOAD_INTERVAL', '21600'))
+    # Directory the won dates backfill saves its resume checkpoint to
+    WON_DATES_CHECKPOINT_DIR = os.getenv('WON_DATES_CHECKPOINT_DIR', 'backfill')
 
     # Company configurations
     COMPANIES = {
@@ -1,28 +1,79 @@
+import json
 import logging
+import os
+import random
 import re
 import time
 import uuid
 import threading
 import requests
 import base64
-from typing import Dict, List, Any, Optional
-from replit import db
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+from anr_lookup import AnrLookup
+from combine import JOIN_REPORT_KEYS, CombinedView, ReportIndex
+from scheduler import JobScheduler
+from storage import FINAL_STATUSES, Storage
+from sync_journal import SyncJournal
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-class ReportManager:
-    def __init__(self, config):
-        self.config = config
-        self.report_status_store: Dict[str, Dict[str, Any]] = {}
-        self.report_data_store: Dict[str, List[Dict[str, Any]]] = {}
-        self.report_keys = config['COMPANIES']['uniska']['report_keys']
-        self.session = requests.Session()
-        self.cache = {}
-        self.cache_timeout = 300  # 5 minutes
+# Reports are kept apart per (company, mandant)
+Namespace = Tuple[str, str]
+
+class TokenProvider:
+    """Thread-safe, expiry-aware cache for the Abacus client-credentials token."""
+
+    DEFAULT_EXPIRES_IN = 300
 
-    def get_access_token(self) -> str:
-        """Get access token from Abacus ERP."""
+    def __init__(self, config, session: Optional[requests.Session] = None):
+        self.config = config
+        self.session = session or requests.Session()
+        self.refresh_margin = config.get('TOKEN_REFRESH_MARGIN', 60)
+        # (token, expires_at), replaced as a whole so readers never see half an update
+        self._cached: Tuple[Optional[str], float] = (None, 0.0)
+        self._lock = threading.Lock()
+        self._stats = {'cache_hits': 0, 'refreshes': 0, 'invalidations': 0}
+
+    def _valid_token(self) -> Optional[str]:
+        token, expires_at = self._cached
+        return token if token is not None and time.time() < expires_at else None
+
+    def get_token(self, force_refresh: bool = False) -> str:
+        """Return the cached token, fetching a new one only when it is about to expire."""
+        token = None if force_refresh else self._valid_token()
+        if token:
+            with self._lock:
+                self._stats['cache_hits'] += 1
+            return token
+
+        # Single-flight: only one thread refreshes, the others wait and reuse its token
+        with self._lock:
+            token = None if force_refresh else self._valid_token()
+            if token:
+                self._stats['cache_hits'] += 1
+                return token
+            token, expires_in = self._request_token()
+            self._cached = (token, time.time() + max(expires_in - self.refresh_margin, 0))
+            self._stats['refreshes'] += 1
+            return token
+
+    def invalidate(self, token: Optional[str]) -> None:
+        """Drop the cached token if it is still `token`, the one that was rejected."""
+        with self._lock:
+            if token and token == self._cached[0]:
+                self._cached = (None, 0.0)
+                self._stats['invalidations'] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get token cache counters."""
+        with self._lock:
+            return dict(self._stats)
+
+    def _request_token(self) -> Tuple[str, int]:
+        """Request a new access token from Abacus ERP."""
         max_retries = 3
         timeout = 30
 
@@ -46,9 +97,13 @@ class ReportManager:
                     timeout=timeout
                 )
                 response.raise_for_status()
-                access_token = response.json().get('access_token')
-                logger.debug("Access token obtained successfully")
-                return access_token
+                payload = response.json()
+                access_token = payload.get('access_token')
+                if not access_token:
+                    raise ValueError("Token response did not contain an access token")
+                expires_in = int(payload.get('expires_in') or self.DEFAULT_EXPIRES_IN)
+                logger.debug(f"Access token obtained successfully, expires in {expires_in}s")
+                return access_token, expires_in
             except requests.exceptions.RequestException as e:
                 if attempt == max_retries - 1:
                     logger.error(f"Error obtaining access token after {max_retries} attempts: {e}")
@@ -56,22 +111,217 @@ class ReportManager:
                 logger.warning(f"Attempt {attempt + 1} failed, retrying: {e}")
                 time.sleep(2 ** attempt)  # Exponential backoff
 
-    def start_report(self, mandant: str, report_key: str, year: str) -> str:
-        """Start a report and return the report ID."""
+
+class ReportManager:
+    FINAL_STATUSES = FINAL_STATUSES
+    # Seconds between checks for reports abandoned by stopped workers
+    RECONCILE_INTERVAL = 60.0
+
+    def __init__(self, config, storage: Optional[Storage] = None):
+        self.config = config
+        # Durable report status and data locations, shared with other workers
+        self.storage = storage or Storage(config.get('STORAGE_URL', 'sqlite:///report_data/app.db'))
+        # Statuses of the reports this worker started and polls
+        self.report_status_store: Dict[str, Dict[str, Any]] = {}
+        self.session = requests.Session()
+        self.token_provider = TokenProvider(config, self.session)
+        # Shared pools: thread count stays constant however many reports are running
+        self.start_executor = ThreadPoolExecutor(
+            max_workers=config.get('REPORT_START_CONCURRENCY', 8), thread_name_prefix='report-start'
+        )
+        # Separate pool so a start waiting on a queued background refresh cannot starve it
+        self.refresh_executor = ThreadPoolExecutor(
+            max_workers=config.get('REPORT_REFRESH_CONCURRENCY', 2), thread_name_prefix='report-refresh'
+        )
+        self.fetch_executor = ThreadPoolExecutor(
+            max_workers=config.get('FETCH_CONCURRENCY', 4), thread_name_prefix='report-fetch'
+        )
+        # Downloads of finished reports wait on their page fetches, so they get a pool of their own
+        self.download_executor = ThreadPoolExecutor(
+            max_workers=config.get('REPORT_DOWNLOAD_CONCURRENCY', 2), thread_name_prefix='report-download'
+        )
+        self.request_timeout = config.get('ABACUS_REQUEST_TIMEOUT', 60.0)
+        self.scheduler = JobScheduler(
+            self._poll_report,
+            max_workers=config.get('SCHEDULER_WORKERS', 4),
+            min_interval=config.get('POLL_MIN_INTERVAL', 1.0),
+            max_interval=config.get('POLL_MAX_INTERVAL', 30.0),
+            backoff_factor=config.get('POLL_BACKOFF_FACTOR', 1.5),
+            timeout=config.get('REPORT_TIMEOUT', 3600.0),
+            on_timeout=self._on_report_timeout,
+            name='report-scheduler'
+        )
+        # Stored results younger than the TTL are reused; up to the stale TTL they are reused while refreshing
+        self.cache_ttl = config.get('REPORT_CACHE_TTL', 3600.0)
+        self.cache_stale_ttl = max(config.get('REPORT_CACHE_STALE_TTL', 86400.0), self.cache_ttl)
+        # Unfinished reports without a status change for this long belong to a stopped worker
+        self.stale_after = max(config.get('REPORT_STALE_AFTER', 300.0), 2 * self.scheduler.max_interval)
+        self._reconciled_at = 0.0
+        # Runs in progress per (company, mandant, report_key, params); later callers attach to them
+        self._in_flight: Dict[Tuple[str, str, str, str], Future] = {}
+        self._in_flight_lock = threading.Lock()
+        # Join indexes of the latest finished report per namespace and report key, built once per report
+        self.report_indexes: Dict[str, ReportIndex] = {}
+        self.latest_reports: Dict[Namespace, Dict[str, str]] = {}
+        self.published_at: Dict[Namespace, float] = {}
+        self._index_lock = threading.Lock()
+        self.combined_views: Dict[Namespace, CombinedView] = {}
+        self.anr_lookups: Dict[Namespace, AnrLookup] = {}
+        self.sync_journals: Dict[str, SyncJournal] = {}
+        self._load_lock = threading.Lock()
+        try:
+            self._reconcile_reports()
+            self._load_latest_reports()
+        except Exception as e:
+            logger.error(f"Error loading stored reports: {e}")
+
+    def get_access_token(self, force_refresh: bool = False) -> str:
+        """Get a (cached) access token from Abacus ERP."""
+        return self.token_provider.get_token(force_refresh=force_refresh)
+
+    def get_token_stats(self) -> Dict[str, int]:
+        """Get cache hit/refresh counters of the token provider."""
+        return self.token_provider.get_stats()
+
+    def _api_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """Send an authorized request to the Abacus API, refreshing the token once on 401."""
+        kwargs.setdefault('timeout', self.request_timeout)
         access_token = self.get_access_token()
+        for attempt in range(2):
+            response = self.session.request(
+                method,
+                f"{self.config['BASE_URL']}{endpoint}",
+                headers={
+                    'Authorization': f'Bearer {access_token}',
+                    'Content-Type': 'application/json'
+                },
+                **kwargs
+            )
+            if response.status_code != 401 or attempt == 1:
+                return response
+            logger.warning(f"Access token rejected for {endpoint}, refreshing")
+            self.token_provider.invalidate(access_token)
+            access_token = self.get_access_token()
+        return response
+
+    def start_reports(self, jobs: Iterable[Tuple[str, str, str]], year: str,
+                      force: bool = False) -> Tuple[Dict[str, Any], List[str]]:
+        """Start (company, mandant, report_key) reports concurrently.
+
+        At most REPORT_START_CONCURRENCY reports are submitted at a time; once
+        submitted, they are polled and fetched by the shared pools. Returns the report
+        IDs as {company: {mandant: {report_key: report_id}}} and the errors of the
+        reports that could not be started.
+        """
+        jobs = list(jobs)
+        futures = [self.start_executor.submit(self.start_report, *job, year, force) for job in jobs]
+        report_ids: Dict[str, Any] = {}
+        errors = []
+        for (company, mandant, report_key), future in zip(jobs, futures):
+            try:
+                report_ids.setdefault(company, {}).setdefault(mandant, {})[report_key] = future.result()
+            except Exception as e:
+                errors.append(f"Failed to start report {report_key} for {company} mandant {mandant}: {e}")
+        return report_ids, errors
+
+    def start_report(self, company: str, mandant: str, report_key: str, year: str, force: bool = False) -> str:
+        """Start a report and return the report ID.
+
+        Unless `force` is set, a stored result of the same report and parameters is
+        returned instead while it is younger than the cache TTL. Up to the stale TTL
+        it is returned as well and a new run is started in the background. If the
+        same report is already running, its ID is returned instead of starting it twice.
+        """
+        params = self._report_params(report_key, year)
+        if not force:
+            cached_id = self._cached_report(company, mandant, report_key, params)
+            if cached_id:
+                return cached_id
+        return self._single_flight(company, mandant, report_key, params).result()
+
+    @staticmethod
+    def _report_params(report_key: str, year: str) -> Dict[str, str]:
+        """Get the Abacus parameters of a report run."""
+        # Add date parameters for dko report
+        if report_key == "dko" and year != "none":
+            return {
+                "AUF_DATUM_VON": f"{year}-01-01",
+                "AUF_DATUM_BIS": f"{year}-12-31"
+            }
+        return {}
+
+    def _cached_report(self, company: str, mandant: str, report_key: str, params: Dict[str, str]) -> Optional[str]:
+        """Get the ID of a reusable stored result, starting a background refresh if it is stale."""
+        params_key = json.dumps(params, sort_keys=True)
+        stored = self.storage.find_cached_report(company, mandant, report_key, params_key, self.cache_stale_ttl)
+        if not stored or not stored['data_path'] or not os.path.exists(stored['data_path']):
+            return None
+
+        age = time.time() - stored['finished_at']
+        if age >= self.cache_ttl:
+            self._single_flight(company, mandant, report_key, params, background=True)
+        logger.info(f"Using cached report '{report_key.upper()}' {stored['report_id']} for {company} "
+                    f"mandant {mandant} ({age:.0f}s old{', refreshing' if age >= self.cache_ttl else ''})")
+        return stored['report_id']
+
+    def _single_flight(self, company: str, mandant: str, report_key: str, params: Dict[str, str],
+                       background: bool = False) -> Future:
+        """Get the run of a report that is in progress, or start one.
+
+        The returned future resolves to the report ID. A new run is submitted in the
+        calling thread, or on the refresh pool if `background` is set.
+        """
+        key = (company, mandant, report_key, json.dumps(params, sort_keys=True))
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            if future and (not future.done() or (not future.exception() and self._is_in_flight(future.result()))):
+                logger.info(f"Report {report_key} for {company} mandant {mandant} is already running")
+                return future
+            future = self._in_flight[key] = Future()
+
+        def submit():
+            try:
+                future.set_result(self._submit_report(company, mandant, report_key, params))
+            except Exception as e:
+                future.set_exception(e)
+
+        if background:
+            self.refresh_executor.submit(submit)
+        else:
+            submit()
+        return future
+
+    def _is_in_flight(self, report_id: str) -> bool:
+        """Check whether a report started by this worker is still running or storing its data."""
+        status = self.report_status_store.get(report_id)
+        if not status:
+            return False
+        return status['status'] not in self.FINAL_STATUSES or (
+            status['status'] == 'FinishedSuccess' and not status.get('finished_at')
+        )
+
+    def _submit_report(self, company: str, mandant: str, report_key: str, params: Dict[str, str]) -> str:
+        """Submit a report job to Abacus and return the new report ID."""
+        report_path = self.config['COMPANIES'][company]['report_keys'][report_key]
         report_id = str(uuid.uuid4())
-        logger.info(f"Starting report {report_key} for mandant {mandant}")
-
-        self.report_status_store[report_id] = {
+        status = {
+            'company': company,
             'mandant': mandant,
             'report_key': report_key,
+            'params': json.dumps(params, sort_keys=True),
             'api_report_id': None,
             'status': 'Running',
             'message': 'Report started.',
             'total_pages': 1
         }
+        # Another worker may be running the same report already
+        running_id = self.storage.create_report_unless_running(report_id, time.time() - self.stale_after, **status)
+        if running_id:
+            logger.info(f"Report {report_key} for {company} mandant {mandant} is already running as {running_id}")
+            return running_id
+        self.report_status_store[report_id] = status
+        logger.info(f"Starting report {report_key} for {company} mandant {mandant}")
 
-        report_path = self.report_keys[report_key]
         # Format mandant ID with leading zeros if needed
         formatted_mandant = f"{int(mandant):02d}"
         endpoint = f"/api/abareport/v1/report/{formatted_mandant}/{report_path}"
@@ -82,253 +332,422 @@ class ReportManager:
             "paging": self.config['PAGE_SIZE']
         }
 
-        # Add date parameters for dko report
-        if report_key == "dko" and year != "none":
-            body["parameters"] = {
-                "AUF_DATUM_VON": f"{year}-01-01",
-                "AUF_DATUM_BIS": f"{year}-12-31"
-            }
+        if params:
+            body["parameters"] = params
 
         try:
-            response = self.session.post(
-                f"{self.config['BASE_URL']}{endpoint}",
-                json=body,
-                headers={
-                    'Authorization': f'Bearer {access_token}',
-                    'Content-Type': 'application/json'
-                }
-            )
+            response = self._api_request('POST', endpoint, json=body)
             response.raise_for_status()
             api_report_id = response.json().get('id') or response.json().get('reportId')
 
             if not api_report_id:
                 raise ValueError("API did not return a report ID")
 
-            self.report_status_store[report_id]['api_report_id'] = api_report_id
+            self._set_status(report_id, api_report_id=api_report_id)
             logger.info(f"Report '{report_key.upper()}' started with ID: {report_id}")
 
             # Start polling in background
-            self._start_polling(report_id, api_report_id, report_key)
+            self._start_polling(report_id)
 
             return report_id
         except Exception as e:
-            self.report_status_store[report_id]['status'] = 'FinishedError'
-            self.report_status_store[report_id]['message'] = str(e)
+            self._set_status(report_id, status='FinishedError', message=str(e))
             logger.error(f"Error starting report '{report_key.upper()}': {e}")
             raise
 
-    def _start_polling(self, report_id: str, api_report_id: str, report_key: str) -> None:
-        """Start polling for report status in a background thread."""
-        def poll():
-            while True:
-                try:
-                    access_token = self.get_access_token()
-                    status_endpoint = f"/api/abareport/v1/jobs/{api_report_id}"
-
-                    response = self.session.get(
-                        f"{self.config['BASE_URL']}{status_endpoint}",
-                        headers={
-                            'Authorization': f'Bearer {access_token}',
-                            'Content-Type': 'application/json'
-                        }
-                    )
-                    response.raise_for_status()
-                    data = response.json()
-
-                    state = data.get('state')
-                    message = data.get('message', '')
-
-                    # Calculate total pages from rows
-                    rows_match = re.search(r'rows=(\d+)', message, re.IGNORECASE)
-                    total_pages = (int(rows_match.group(1)) + self.config['PAGE_SIZE'] - 1) // self.config['PAGE_SIZE'] if rows_match else 1
-
-                    self.report_status_store[report_id].update({
-                        'status': state,
-                        'message': message,
-                        'total_pages': total_pages
-                    })
-
-                    logger.debug(f"Report '{report_key.upper()}' status: {state}")
-
-                    if state == "FinishedSuccess":
-                        data = self._fetch_report_data(api_report_id, report_key, total_pages)
-                        self.report_data_store[report_id] = data
-                        logger.info(f"Report '{report_key.upper()}' completed successfully")
-                        break
-                    elif state == "FinishedError":
-                        logger.error(f"Report '{report_key.upper()}' failed: {message}")
-                        break
-
-                    time.sleep(5)
-                except Exception as e:
-                    self.report_status_store[report_id]['status'] = 'FinishedError'
-                    self.report_status_store[report_id]['message'] = str(e)
-                    logger.error(f"Error polling report '{report_key.upper()}': {e}")
-                    break
+    def _set_status(self, report_id: str, **fields: Any) -> None:
+        """Update a report's status here and in the shared storage."""
+        if report_id in self.report_status_store:
+            self.report_status_store[report_id].update(fields)
+        self.storage.update_report(report_id, **fields)
+
+    def _start_polling(self, report_id: str) -> None:
+        """Hand the report over to the shared job scheduler for status polling."""
+        self.scheduler.submit(report_id)
+
+    def _poll_report(self, report_id: str) -> bool:
+        """Poll the Abacus job of a report once. Returns True when polling can stop."""
+        status = self.report_status_store[report_id]
+        api_report_id = status['api_report_id']
+        report_key = status['report_key']
+        try:
+            status_endpoint = f"/api/abareport/v1/jobs/{api_report_id}"
+            response = self._api_request('GET', status_endpoint)
+            response.raise_for_status()
+            data = response.json()
 
-        thread = threading.Thread(target=poll)
-        thread.daemon = True
-        thread.start()
+            state = data.get('state')
+            message = data.get('message', '')
 
-    def _fetch_report_data(self, api_report_id: str, report_key: str, total_pages: int) -> List[Dict[str, Any]]:
-        """Fetch report data from all pages."""
-        cache_key = f"{api_report_id}-{report_key}"
-        if cache_key in self.cache and time.time() - self.cache[cache_key]['timestamp'] < self.cache_timeout:
-            logger.debug(f"Using cached data for report '{report_key.upper()}'")
-            return self.cache[cache_key]['data']
+            # Calculate total pages from rows
+            rows_match = re.search(r'rows=(\d+)', message, re.IGNORECASE)
+            total_pages = (int(rows_match.group(1)) + self.config['PAGE_SIZE'] - 1) // self.config['PAGE_SIZE'] if rows_match else 1
 
-        access_token = self.get_access_token()
-        output_endpoint = f"/api/abareport/v1/jobs/{api_report_id}/output"
-        all_data = []
+            # The report may have been cancelled here or by another worker
+            stored = self.storage.get_report(report_id)
+            if status['status'] == 'Cancelled' or (stored and stored['status'] == 'Cancelled'):
+                status['status'] = 'Cancelled'
+                return True
 
+            self._set_status(report_id, status=state, message=message, total_pages=total_pages)
+
+            logger.debug(f"Report '{report_key.upper()}' status: {state}")
+
+            if state == "FinishedSuccess":
+                namespace = (status['company'], status['mandant'])
+                # Downloading can take long; don't hold up polling of the other reports
+                self.download_executor.submit(
+                    self._download_report, report_id, api_report_id, namespace, report_key, total_pages
+                )
+                return True
+            elif state == "FinishedError":
+                logger.error(f"Report '{report_key.upper()}' failed: {message}")
+                return True
+            return False
+        except Exception as e:
+            self._set_status(report_id, status='FinishedError', message=str(e))
+            logger.error(f"Error polling report '{report_key.upper()}': {e}")
+            return True
+
+    def _download_report(self, report_id: str, api_report_id: str, namespace: Namespace,
+                         report_key: str, total_pages: int) -> None:
+        """Store the data of a finished report, marking the report failed if that fails."""
         try:
-            for page in range(1, total_pages + 1):
+            self._store_report_data(report_id, api_report_id, namespace, report_key, total_pages)
+            logger.info(f"Report '{report_key.upper()}' completed successfully")
+        except Exception as e:
+            self._set_status(report_id, status='FinishedError', message=str(e))
+            logger.error(f"Error downloading report '{report_key.upper()}': {e}")
+
+    def _on_report_timeout(self, report_id: str) -> None:
+        """Mark a report as failed once the scheduler gives up on it."""
+        self._set_status(
+            report_id, status='FinishedError', message=f"Report timed out after {self.scheduler.timeout:.0f}s"
+        )
+
+    def cancel_report(self, report_id: str) -> bool:
+        """Stop polling a running report. Returns False if it is not running.
+
+        Reports polled by another worker are marked cancelled in the shared storage;
+        that worker stops at its next poll.
+        """
+        if not self.scheduler.cancel(report_id):
+            stored = self.storage.get_report(report_id)
+            if not stored or report_id in self.report_status_store or stored['status'] in self.FINAL_STATUSES:
+                return False
+        self._set_status(report_id, status='Cancelled', message='Report cancelled.')
+        logger.info(f"Report {report_id} cancelled")
+        return True
+
+    def get_scheduler_stats(self) -> Dict[str, Any]:
+        """Get queue depth and per-job latency of the polling scheduler."""
+        return self.scheduler.get_stats()
+
+    def _fetch_page(self, output_endpoint: str, page: int, report_key: str) -> Optional[List[Dict[str, Any]]]:
+        """Fetch a single output page, retrying transient failures. Returns None on 404."""
+        max_retries = self.config.get('PAGE_FETCH_RETRIES', 3)
+
+        for attempt in range(max_retries):
+            try:
                 logger.debug(f"Fetching page {page} for report '{report_key.upper()}'")
-                response = self.session.get(
-                    f"{self.config['BASE_URL']}{output_endpoint}/{page}",
-                    headers={
-                        'Authorization': f'Bearer {access_token}',
-                        'Content-Type': 'application/json'
-                    }
-                )
+                response = self._api_request('GET', f"{output_endpoint}/{page}")
 
                 if response.status_code == 404:
-                    logger.warning(f"Page {page} not found for report '{report_key.upper()}'")
-                    break
+                    return None
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise requests.exceptions.HTTPError(
+                        f"{response.status_code} fetching page {page}", response=response
+                    )
 
                 response.raise_for_status()
-                data = response.json()
+                return response.json()
+            except requests.exceptions.RequestException as e:
+                if attempt == max_retries - 1:
+                    raise
+                backoff = 0.5 * 2 ** attempt + random.uniform(0, 0.25)
+                logger.warning(f"Page {page} of report '{report_key.upper()}' failed (attempt {attempt + 1}), retrying in {backoff:.2f}s: {e}")
+                time.sleep(backoff)
 
-                if isinstance(data, list) and data:
-                    all_data.extend(data)
-                    logger.debug(f"Added {len(data)} records from page {page}")
-                else:
+    def _iter_report_pages(self, api_report_id: str, report_key: str, total_pages: int,
+                           report_id: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Yield report output pages in order as they arrive.
+
+        Up to FETCH_CONCURRENCY pages are downloaded ahead of the consumer, so at most
+        that many pages are held in memory at any time.
+        """
+        output_endpoint = f"/api/abareport/v1/jobs/{api_report_id}/output"
+        fetched_pages = 0
+        total_records = 0
+        started = time.monotonic()
+        window = max(1, min(self.config.get('FETCH_CONCURRENCY', 4), total_pages))
+        pending = deque()
+        next_page = 1
+
+        def submit_next():
+            nonlocal next_page
+            if next_page <= total_pages:
+                pending.append((next_page, self.fetch_executor.submit(self._fetch_page, output_endpoint, next_page, report_key)))
+                next_page += 1
+
+        try:
+            for _ in range(window):
+                submit_next()
+
+            while pending:
+                page, future = pending.popleft()
+                data = future.result()
+                submit_next()
+
+                if data is None:
+                    logger.warning(f"Page {page} not found for report '{report_key.upper()}'")
+                    break
+                if not isinstance(data, list) or not data:
                     logger.warning(f"No data on page {page} for report '{report_key.upper()}'")
                     break
 
-            logger.info(f"Fetched total {len(all_data)} records for report '{report_key.upper()}'")
-            self.cache[cache_key] = {'data': all_data, 'timestamp': time.time()}
-            return all_data
+                fetched_pages += 1
+                total_records += len(data)
+                if report_id:  # also shows other workers that the report is still being fetched
+                    self._set_status(report_id, fetched_pages=fetched_pages)
+                logger.debug(f"Received {len(data)} records from page {page}")
+                yield data
+
+            elapsed = time.monotonic() - started
+            pages_per_sec = round(fetched_pages / elapsed, 2) if elapsed > 0 else float(fetched_pages)
+            logger.info(f"Fetched total {total_records} records for report '{report_key.upper()}' "
+                        f"({fetched_pages} pages, {pages_per_sec} pages/s)")
+            if report_id:
+                self._set_status(report_id, fetched_pages=fetched_pages, pages_per_sec=pages_per_sec, rows=total_records)
+        finally:
+            # Drop pages still queued after a 404/empty page, an error or an early close
+            for _, future in pending:
+                future.cancel()
+
+    def _spill_path(self, report_id: str) -> str:
+        """Get the path of the file a report's rows are spilled to."""
+        return os.path.join(self.config.get('REPORT_DATA_DIR', 'report_data'), f"{report_id}.jsonl")
+
+    def _store_report_data(self, report_id: str, api_report_id: str, namespace: Namespace,
+                           report_key: str, total_pages: int) -> None:
+        """Stream report pages to disk as they arrive, one JSON record per line.
+
+        Reports that take part in the combined dataset are indexed page by page on the way.
+        """
+        index = ReportIndex(report_key) if report_key in JOIN_REPORT_KEYS else None
+        path = self._spill_path(report_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for page in self._iter_report_pages(api_report_id, report_key, total_pages, report_id):
+                    f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in page)
+                    if index:
+                        index.add_page(page)
+            os.replace(tmp_path, path)
         except Exception as e:
             logger.error(f"Error fetching report data: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             raise
 
+        self._set_status(report_id, data_path=path)
+        self._publish_report(report_id, namespace, report_key, index)
+        # Other workers pick the report up once it is marked finished
+        self._set_status(report_id, finished_at=time.time())
+        self._delete_superseded(report_id)
+
+    def _delete_superseded(self, report_id: str) -> None:
+        """Delete earlier runs of the same report and parameters along with their spill files."""
+        try:
+            paths = self.storage.delete_superseded_reports(report_id)
+        except Exception as e:
+            logger.error(f"Error deleting reports superseded by {report_id}: {e}")
+            return
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not delete superseded report data {path}: {e}")
+        if paths:
+            logger.info(f"Deleted {len(paths)} reports superseded by {report_id}")
+
+    def _publish_report(self, report_id: str, namespace: Namespace, report_key: str,
+                        index: Optional[ReportIndex]) -> None:
+        """Make a finished report the latest one of its type in its namespace for all readers."""
+        if report_key == 'anr':
+            self._anr_lookup(namespace).load_records(self.iter_report_data(report_id), source=f"report {report_id}")
+
+        with self._index_lock:
+            latest = self.latest_reports.setdefault(namespace, {})
+            previous_id = latest.get(report_key)
+            latest[report_key] = report_id
+            self.published_at[namespace] = time.time()
+            if index:
+                self.report_indexes[report_id] = index
+            if previous_id and previous_id != report_id:
+                self.report_indexes.pop(previous_id, None)
+
+    def iter_report_data(self, report_id: str) -> Iterator[Dict[str, Any]]:
+        """Iterate over the records of a completed report without loading them all."""
+        path = self._data_path(report_id)
+        if not path:
+            return
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _data_path(self, report_id: str) -> Optional[str]:
+        """Get the spill file of a report whose data has been stored."""
+        stored = self.storage.get_report(report_id)
+        return stored['data_path'] if stored else None
+
     def get_report_status(self, report_id: str) -> Optional[Dict[str, Any]]:
         """Get status of a specific report."""
-        return self.report_status_store.get(report_id)
+        stored = self.storage.get_report(report_id)
+        if not stored:
+            return None
+        return {key: value for key, value in stored.items()
+                if key not in ('report_id', 'params', 'data_path', 'created_at', 'updated_at', 'finished_at')}
 
     def get_report_data(self, report_id: str) -> Optional[List[Dict[str, Any]]]:
         """Get data of a completed report."""
-        return self.report_data_store.get(report_id)
+        if not self._data_path(report_id):
+            return None
+        return list(self.iter_report_data(report_id))
 
-    def get_combined_data(self) -> List[Dict[str, Any]]:
+    def get_combined_data(self, company: Optional[str] = None, mandant: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get combined and matched data from NPO, ADR, and AKP reports."""
-        combined_data = []
-
-        # Get the latest report data for each type
-        npo_data = None
-        adr_data = None
-        akp_data = None
-
-        for report_id, status in self.report_status_store.items():
-            if status['status'] == 'FinishedSuccess':
-                if status['report_key'] == 'npo':
-                    npo_data = self.report_data_store.get(report_id)
-                elif status['report_key'] == 'adr':
-                    adr_data = self.report_data_store.get(report_id)
-                elif status['report_key'] == 'akp':
-                    akp_data = self.report_data_store.get(report_id)
-
-        if not all([npo_data, adr_data]):
-            return []  # Return empty if required data is missing
-
-        # Create lookup dictionaries
-        npo_dict = {}
-        for npo in npo_data:
-            if not npo.get('ProjNr'):  # Skip if no project number
-                continue
-            key = str(npo.get('KdINR', '')) if npo.get('Person1') == '0' else str(npo.get('Person1', ''))
-            if key:
-                npo_dict[key] = npo
-
-        adr_dict = {str(adr.get('INR', '')): adr for adr in adr_data if adr.get('INR')}
-
-        # Create lookup dictionaries for AKP
-        akp_dict = {}
-        if akp_data:
-            for akp in akp_data:
-                adr_inr = str(akp.get('ADR_INR', ''))
-                if adr_inr:
-                    if adr_inr not in akp_dict:
-                        akp_dict[adr_inr] = []
-                    akp_dict[adr_inr].append(akp)
-
-        # Process NPO records
-        for inr, npo in npo_dict.items():
-            adr = adr_dict.get(inr)
-            if not adr:
-                continue
-
-            # Create base record with NPO data
-            base_record = {f'NPO_{k}': v for k, v in npo.items()}
-
-            # Handle ADR phone fallback
-            adr_phone = adr.get('TEL') or adr.get('TEL2') or ''
-            adr_with_phone = {**adr, 'TEL': adr_phone}
-
-            # Add ADR fields with prefix
-            adr_fields = {f'ADR_{k}': v for k, v in adr_with_phone.items()}
-            base_record.update(adr_fields)
-
-            # Add status field
-            base_record['Status'] = 'new'
-
-            # Get all AKP entries for this ADR
-            akp_entries = akp_dict.get(inr, [])
-            
-            if not akp_entries:  # If no AKP entries, add base record
-                combined_data.append(base_record)
+        return list(self.iter_combined_data(company, mandant))
+
+    def iter_combined_data(self, company: Optional[str] = None, mandant: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield combined and matched records from NPO, ADR, and AKP reports."""
+        view = self.get_combined_view(company, mandant)
+        if view:
+            yield from view.rows
+
+    def resolve_namespace(self, company: Optional[str] = None, mandant: Optional[str] = None) -> Optional[Namespace]:
+        """Get the namespace to read from; without a mandant (or company), the most recently updated one."""
+        if company and mandant:
+            return company, str(mandant)
+        candidates = [namespace for namespace in self.published_at if not company or namespace[0] == company]
+        return max(candidates, key=self.published_at.get) if candidates else None
+
+    def get_combined_view(self, company: Optional[str] = None, mandant: Optional[str] = None) -> Optional[CombinedView]:
+        """Get the materialized combined dataset for the latest reports of a company and mandant.
+
+        The view is reused while its source reports are unchanged; a new ADR or AKP
+        report patches it in place, anything else rebuilds it.
+        """
+        self._load_latest_reports()
+        namespace = self.resolve_namespace(company, mandant)
+        if not namespace:
+            return None
+        anr_lookup = self._anr_lookup(namespace)
+        anr_version = anr_lookup.get_version()
+        journal = self.get_sync_journal(namespace[0])
+        journal_version = journal.get_version()
+        with self._index_lock:
+            latest = {key: self.latest_reports.get(namespace, {}).get(key) for key in JOIN_REPORT_KEYS}
+            indexes = {key: self.report_indexes.get(report_id) for key, report_id in latest.items()}
+            version = (('namespace', namespace),) + tuple(latest.items()) + (('anr', anr_version),)
+
+            if not indexes['npo'] or not indexes['adr']:
+                self.combined_views.pop(namespace, None)
+                return None  # Nothing to combine if required data is missing
+
+            view = self.combined_views.get(namespace)
+            if view and view.version == version:
+                view.set_status(journal.row_status, journal_version)
+                return view
+
+            previous = dict(view.version) if view else {}
+            changed = [key for key, value in version if previous.get(key) != value]
+            if view and all(key in ('adr', 'akp') for key in changed):
+                for key in changed:
+                    patched = view.patch(key, indexes[key], version)
+                    logger.debug(f"Patched combined view with new {key.upper()} report ({patched} groups rebuilt)")
+            else:
+                view = CombinedView(indexes['npo'], indexes['adr'], indexes['akp'], anr_lookup.get, version)
+                logger.debug(f"Built combined view {view.etag} for {namespace}")
+            view.set_status(journal.row_status, journal_version)
+            self.combined_views[namespace] = view
+            return view
+
+    def _load_latest_reports(self) -> None:
+        """Pick up reports finished by another worker or before a restart.
+
+        The newest stored report per key is indexed from its spill file and published
+        if it is newer than the one this worker has.
+        """
+        report_keys = JOIN_REPORT_KEYS + ('anr',)
+        stored_reports = self.storage.latest_finished_reports(report_keys)
+        # Oldest first, so the most recently finished namespace ends up as the default one
+        for (company, mandant, report_key), stored in sorted(stored_reports.items(), key=lambda item: item[1]['finished_at']):
+            namespace = (company, mandant)
+            report_id = stored['report_id']
+            if self.latest_reports.get(namespace, {}).get(report_key) == report_id:
                 continue
-
-            # Create a record for each AKP entry
-            for akp_record in akp_entries:
-                current_record = base_record.copy()
-
-                # Handle AKP phone fallback
-                akp_phone = akp_record.get('TEL') or akp_record.get('TEL2') or akp_record.get('TEL3') or ''
-                akp_with_phone = {**akp_record, 'TEL': akp_phone}
-
-                # Add AKP fields with prefix
-                akp_fields = {f'AKP_{k}': v for k, v in akp_with_phone.items()}
-                current_record.update(akp_fields)
-
-                # Add ANR fields based on AKP_ANR_NR
-                anr_nr = akp_record.get('ANR_NR')
-                if anr_nr:
-                    try:
-                        import csv
-                        with open('attached_assets/ANR.csv', 'r') as f:
-                            anr_reader = csv.DictReader(f)
-                            for row in anr_reader:
-                                if row['NR'] == str(anr_nr):
-                                    current_record['ANR_ANREDE'] = row['ANREDE']
-                                    current_record['ANR_ANREDETEXT'] = row['ANREDETEXT']
-                                    break
-                    except Exception as e:
-                        logger.error(f"Error reading ANR data: {e}")
-
-                combined_data.append(current_record)
-
-        return combined_data
-
-    def get_all_reports(self) -> List[Dict[str, Any]]:
-        """Get status of all reports."""
+            with self._load_lock:
+                if self.latest_reports.get(namespace, {}).get(report_key) == report_id or not os.path.exists(stored['data_path']):
+                    continue
+                index = ReportIndex(report_key) if report_key in JOIN_REPORT_KEYS else None
+                if index:
+                    index.add_page(self.iter_report_data(report_id))
+                self._publish_report(report_id, namespace, report_key, index)
+                logger.info(f"Loaded stored report '{report_key.upper()}' {report_id} for {namespace}")
+
+    def _anr_lookup(self, namespace: Namespace) -> AnrLookup:
+        """Get the salutation table of a namespace; the ANR CSV until its `anr` report is fetched."""
+        lookup = self.anr_lookups.get(namespace)
+        if lookup is None:
+            with self._index_lock:
+                lookup = self.anr_lookups.setdefault(
+                    namespace, AnrLookup(self.config.get('ANR_CSV_PATH', 'attached_assets/ANR.csv'))
+                )
+        return lookup
+
+    def get_sync_journal(self, company: str) -> SyncJournal:
+        """Get the journal of what was synced to Pipedrive for a company."""
+        journal = self.sync_journals.get(company)
+        if journal is None:
+            with self._index_lock:
+                journal = self.sync_journals.setdefault(company, SyncJournal(
+                    self.storage, company, self.config['COMPANIES'][company].get('field_mappings', [])
+                ))
+        return journal
+
+    def lookup_anr(self, anr_nr: Any, company: Optional[str] = None,
+                   mandant: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """Get (ANREDE, ANREDETEXT) for a salutation number."""
+        namespace = self.resolve_namespace(company, mandant) or (company, mandant)
+        return self._anr_lookup(namespace).get(anr_nr)
+
+    def _reconcile_reports(self) -> None:
+        """Mark reports left unfinished by a stopped or restarted worker as failed."""
+        now = time.time()
+        self._reconciled_at = now
+        live = [report_id for report_id in list(self.report_status_store) if self._is_in_flight(report_id)]
+        count = self.storage.fail_stale_reports(
+            now - self.stale_after, 'Report was abandoned by a stopped worker.', exclude=live
+        )
+        if count:
+            logger.warning(f"Marked {count} abandoned reports as failed")
+
+    def get_all_reports(self, company: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get the status of the latest run of each report, optionally only those of one company."""
+        if time.time() - self._reconciled_at >= self.RECONCILE_INTERVAL:
+            self._reconcile_reports()
         return [
             {
-                'report_id': report_id,
+                'report_id': status['report_id'],
+                'company': status['company'],
+                'mandant': status['mandant'],
                 'report_key': status['report_key'],
                 'status': status['status'],
-                'message': status['message']
+                'message': status['message'],
+                'pages_per_sec': status.get('pages_per_sec')
             }
-            for report_id, status in self.report_status_store.items()
+            for status in self.storage.list_reports(company)
         ]
\ No newline at end of file
@@ -0,0 +1,188 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the advertised limit requests are paced at, to stay just below it
+HEADROOM = 0.9
+
+# Methods that are safe to repeat after a server error or a dropped connection
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def configure(self, rate: float, capacity: float) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.capacity = capacity
+            self.tokens = min(self.tokens, capacity)
+
+    def drain(self, tokens: float) -> None:
+        """Cap the available tokens, e.g. to what the server says is left."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for the next `seconds`."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0
+
+
+class RateLimitBudget:
+    """Request budget of one Pipedrive API key, shared by every thread using that key.
+
+    Requests are paced by a token bucket sized from the X-RateLimit-* response
+    headers; when the server reports the window as used up, or answers 429, all
+    threads wait until it resets.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.window = window
+        self.limit = limit
+        self.bucket = TokenBucket(limit * HEADROOM / window, max(limit * HEADROOM, 1))
+        self._stats = {'requests': 0, 'throttled': 0, 'retries': 0, 'wait_seconds': 0.0}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        waited = self.bucket.acquire()
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['wait_seconds'] += waited
+
+    def observe(self, response: requests.Response) -> None:
+        """Adjust the pace to the rate-limit headers of a response."""
+        headers = response.headers
+        limit = _int_header(headers, 'X-RateLimit-Limit')
+        if limit and limit != self.limit:
+            self.limit = limit
+            self.bucket.configure(limit * HEADROOM / self.window, max(limit * HEADROOM, 1))
+            logger.debug(f"Pipedrive rate limit is {limit} requests per {self.window}s")
+        remaining = _int_header(headers, 'X-RateLimit-Remaining')
+        if remaining is not None:
+            self.bucket.drain(remaining)
+            if remaining <= 0:
+                self.bucket.pause(_int_header(headers, 'X-RateLimit-Reset') or self.window)
+
+    def throttled(self, delay: float) -> None:
+        """Record a 429 and hold every thread back for `delay` seconds."""
+        self.bucket.pause(delay)
+        with self._lock:
+            self._stats['throttled'] += 1
+
+    def retried(self) -> None:
+        with self._lock:
+            self._stats['retries'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['wait_seconds'] = round(stats['wait_seconds'], 2)
+        stats['limit'] = self.limit
+        stats['window'] = self.window
+        return stats
+
+
+def _int_header(headers, name: str) -> Optional[int]:
+    try:
+        return int(float(headers[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+_budgets: Dict[str, RateLimitBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def get_budget(api_key: Optional[str], limit: int, window: float) -> RateLimitBudget:
+    """Get the shared budget of an API key, creating it on first use."""
+    with _budgets_lock:
+        budget = _budgets.get(api_key or '')
+        if budget is None:
+            budget = _budgets[api_key or ''] = RateLimitBudget(limit, window)
+        return budget
+
+
+class PipedriveSession(requests.Session):
+    """requests.Session that paces calls by a shared budget and retries throttled ones.
+
+    429 responses are retried for every method; 5xx responses and connection
+    errors only for idempotent methods, so a create is never sent twice.
+    """
+
+    def __init__(self, budget: RateLimitBudget, max_retries: int = 5, backoff: float = 1.0):
+        super().__init__()
+        self.budget = budget
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        retry_after = _int_header(response.headers, 'Retry-After') if response is not None else None
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff)
+        # Full jitter, so threads throttled together do not retry together
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def request(self, method, url, *args, **kwargs):
+        retry_errors = method.upper() in IDEMPOTENT_METHODS
+        for attempt in range(self.max_retries + 1):
+            self.budget.acquire()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not retry_errors or attempt == self.max_retries:
+                    raise
+                delay = self._delay(attempt)
+                logger.warning(f"Pipedrive {method} failed (attempt {attempt + 1}), retrying in {delay:.2f}s: {e}")
+                self.budget.retried()
+                time.sleep(delay)
+                continue
+
+            self.budget.observe(response)
+            status = response.status_code
+            if attempt == self.max_retries or not (status == 429 or (status >= 500 and retry_errors)):
+                return response
+
+            delay = self._delay(attempt, response)
+            if status == 429:
+                self.budget.throttled(delay)
+            logger.warning(f"Pipedrive {method} returned {status} (attempt {attempt + 1}), retrying in {delay:.2f}s")
+            self.budget.retried()
+            time.sleep(delay)
@@ -1,12 +1,83 @@
 import os
 import json
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+from config import Config
+from pipedrive_client import PipedriveSession, get_budget
+from pipedrive_index import PipedriveIndex
+from won_dates import WonDatesBackfill
 
 import logging
 logger = logging.getLogger(__name__)
 
+
+class FieldMetadataCache:
+    """Pipedrive field definitions per (company, entity type), cached with a TTL.
+
+    Shared by all PipedriveHelper instances so the schema is fetched once per TTL
+    instead of on every create call. Lookup maps are built once per load.
+    """
+
+    def __init__(self, ttl: float = 3600):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0}
+
+    def get(self, company_key: str, entity_type: str,
+            loader: Callable[[], Optional[List[Dict[str, Any]]]]) -> Dict[str, Any]:
+        """Get the cached entry, calling `loader` once if it is missing or expired."""
+        key = (company_key, entity_type)
+        entry = self._entries.get(key)
+        if entry and time.monotonic() - entry['loaded_at'] < self.ttl:
+            self._stats['hits'] += 1
+            return entry
+
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry['loaded_at'] < self.ttl:
+                self._stats['hits'] += 1
+                return entry
+            fields = loader()
+            if fields is None:  # don't cache failures
+                return self._build_entry([])
+            entry = self._build_entry(fields)
+            self._entries[key] = entry
+            self._stats['loads'] += 1
+            return entry
+
+    def invalidate(self, company_key: Optional[str] = None) -> int:
+        """Drop cached fields of one company (or all). Returns the number of dropped entries."""
+        with self._lock:
+            keys = [key for key in self._entries if company_key is None or key[0] == company_key]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self._stats, 'entries': len(self._entries)}
+
+    @staticmethod
+    def _build_entry(fields: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            'fields': fields,
+            'by_id': {str(field['id']): field for field in fields},
+            'by_key': {field['key']: field for field in fields if field.get('key')},
+            'loaded_at': time.monotonic()
+        }
+
+
+field_cache = FieldMetadataCache(Config.PIPEDRIVE_FIELD_CACHE_TTL)
+
+
 class PipedriveHelper:
     def __init__(self, company_key='uniska'):
         self.company_key = company_key
@@ -19,13 +90,63 @@ class PipedriveHelper:
         self.mapping_file = f'mappings/{company_key}_field_mappings.json'
         os.makedirs('mappings', exist_ok=True)
         self._load_field_mappings()
-        self.default_pipeline_id = self._get_default_pipeline_id()
+        self._calls = threading.local()  # API calls made by the current thread
+        self._call_stats = {'api_calls': 0, 'synced_records': 0, 'sync_api_calls': 0, 'updates': 0, 'skipped_updates': 0}
+        self._stats_lock = threading.Lock()
+        self.session = self._create_session()
+        self.session.hooks['response'].append(self._count_call)
+        self._default_pipeline_id = None
+        self._pipeline_lock = threading.Lock()
+        self.index = PipedriveIndex(
+            self, Config.PIPEDRIVE_INDEX_REFRESH_INTERVAL, Config.PIPEDRIVE_INDEX_RELOAD_INTERVAL
+        )
+        self.won_dates = WonDatesBackfill(self)
+
+    def _create_session(self) -> requests.Session:
+        """Create a keep-alive, rate-limited session with a connection pool sized for concurrent syncs."""
+        budget = get_budget(self.api_key, Config.PIPEDRIVE_RATE_LIMIT, Config.PIPEDRIVE_RATE_WINDOW)
+        session = PipedriveSession(budget, Config.PIPEDRIVE_MAX_RETRIES, Config.PIPEDRIVE_RETRY_BACKOFF)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.PIPEDRIVE_POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _count_call(self, response, *args, **kwargs):
+        self._calls.count = getattr(self._calls, 'count', 0) + 1
+        with self._stats_lock:
+            self._call_stats['api_calls'] += 1
+
+    def thread_call_count(self) -> int:
+        """Number of API calls the current thread has made so far."""
+        return getattr(self._calls, 'count', 0)
+
+    def record_sync(self, api_calls: int) -> None:
+        """Count a synced record and the API calls it took."""
+        with self._stats_lock:
+            self._call_stats['synced_records'] += 1
+            self._call_stats['sync_api_calls'] += api_calls
+
+    def get_call_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._call_stats)
+        records = stats['synced_records']
+        stats['api_calls_per_record'] = round(stats['sync_api_calls'] / records, 2) if records else None
+        return stats
+
+    @property
+    def default_pipeline_id(self):
+        """ID of the default pipeline, looked up once per helper."""
+        if self._default_pipeline_id is None:
+            with self._pipeline_lock:
+                if self._default_pipeline_id is None:
+                    self._default_pipeline_id = self._get_default_pipeline_id()
+        return self._default_pipeline_id
 
     def _get_default_pipeline_id(self):
         """Get the ID of the default pipeline."""
         endpoint = f"{self.base_url}/pipelines"
         params = {'api_token': self.api_key}
-        response = requests.get(endpoint, params=params)
+        response = self.session.get(endpoint, params=params)
         if response.ok:
             pipelines = response.json().get('data', [])
             if pipelines:
@@ -44,24 +165,56 @@ class PipedriveHelper:
 
     def _load_field_mappings(self):
         """Load field mappings from config."""
-        from config import Config
         self.field_mappings = Config.COMPANIES[self.company_key].get('field_mappings', [])
 
     def get_field_mappings(self):
         """Get current field mappings."""
         return self.field_mappings
 
+    @property
+    def project_field_key(self) -> str:
+        """Key of the deal custom field holding the Abacus project number."""
+        for mapping in self.field_mappings:
+            if mapping['entity'] == 'deal' and mapping['source'] == 'NPO_ProjNr':
+                return mapping['target']
+        return '5d300cf82930e07f6107c7255fcd0dd550af7774'
+
+    def iter_collection(self, collection: str, limit: int = 500) -> Iterator[Dict[str, Any]]:
+        """Iterate over all items of a list endpoint such as /organizations, page by page."""
+        for items, _ in self.iter_collection_pages(collection, limit=limit):
+            yield from items
+
+    def iter_collection_pages(self, collection: str, params: Optional[Dict[str, Any]] = None, start: int = 0,
+                              limit: int = 500) -> Iterator[Tuple[List[Dict[str, Any]], Optional[int]]]:
+        """Iterate over the pages of a list endpoint as (items, start of the next page or None)."""
+        endpoint = f"{self.base_url}/{collection}"
+        while True:
+            page_params = {**(params or {}), 'api_token': self.api_key, 'start': start, 'limit': limit}
+            response = self.session.get(endpoint, params=page_params)
+            if not response.ok:
+                raise Exception(f"Failed to list {collection}: {response.status_code} {response.text}")
+            result = response.json()
+            items = result.get('data') or []
+            pagination = (result.get('additional_data') or {}).get('pagination') or {}
+            next_start = pagination.get('next_start', start + limit) if pagination.get('more_items_in_collection') else None
+            yield items, next_start
+            if next_start is None:
+                return
+            start = next_start
+
     def find_organization_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         """Find organization by name."""
         if not name:
             return None
+        if self.index.ensure_fresh():
+            return self.index.find_organization(name)
         endpoint = f"{self.base_url}/organizations/search"
         params = {
             'api_token': self.api_key,
             'term': name,
             'exact_match': True
         }
-        response = requests.get(endpoint, params=params)
+        response = self.session.get(endpoint, params=params)
         if response.ok:
             items = response.json().get('data', {}).get('items', [])
             return items[0]['item'] if items else None
@@ -71,22 +224,46 @@ class PipedriveHelper:
         """Find person by name and organization ID."""
         if not name:
             return None
+        if self.index.ensure_fresh():
+            return self.index.find_person(name, org_id)
         endpoint = f"{self.base_url}/persons/search"
         params = {
             'api_token': self.api_key,
             'term': name,
             'organization_id': org_id
         }
-        response = requests.get(endpoint, params=params)
+        response = self.session.get(endpoint, params=params)
         if response.ok:
             items = response.json().get('data', {}).get('items', [])
             return items[0]['item'] if items else None
         return None
 
-    def create_organization(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        endpoint = f"{self.base_url}/organizations"
-        params = {'api_token': self.api_key}
-
+    # Standard fields the payload builders may set besides the mapped ones
+    STANDARD_PAYLOAD_FIELDS = {
+        'organization': ('name', 'address'),
+        'person': ('name', 'email', 'phone', 'org_id', '2fea5d7de9997e5a2e32befbe45bf8a145373754'),
+        'deal': ('title', 'value', 'currency', 'close_time', 'org_id', '5d300cf82930e07f6107c7255fcd0dd550af7774',
+                 '031ae26196cff3bf754a3fa9ff701f13c73113bf', '2fea5d7de9997e5a2e32befbe45bf8a145373754')
+    }
+    # Deal fields only set on create: on existing deals the status and times belong to Pipedrive users
+    # and the won dates backfill, and the salutation is that of whichever contact created the deal
+    DEAL_CREATE_ONLY_FIELDS = ('status', 'won_time', 'lost_time', 'add_time', 'pipeline_id',
+                               '031ae26196cff3bf754a3fa9ff701f13c73113bf', '2fea5d7de9997e5a2e32befbe45bf8a145373754')
+    # Record columns the payload builders read besides the mapped sources (deals also read
+    # Status and the ANR columns, but only for create-only fields)
+    PAYLOAD_SOURCE_COLUMNS = {
+        'organization': ('ADR_NAME', 'ADR_STREET', 'ADR_HOUSE_NUMBER', 'PLZ', 'ORT', 'LAND'),
+        'person': ('AKP_VORNAME', 'AKP_NAME', 'AKP_MAIL', 'AKP_TEL'),
+        'deal': ('NPO_ProjName', 'NPO_KSumme', 'NPO_KDatum', 'NPO_ADatum', 'NPO_ASumme')
+    }
+
+    def payload_fields(self, entity_type: str) -> List[str]:
+        """Fields the organization, person or deal payload of a record can contain."""
+        targets = [mapping['target'] for mapping in self.field_mappings if mapping['entity'] == entity_type]
+        return targets + [field for field in self.STANDARD_PAYLOAD_FIELDS[entity_type] if field not in targets]
+
+    def build_organization_payload(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a combined record to organization fields."""
         if not data.get('ADR_NAME'):
             raise ValueError("Organization name (ADR_NAME) is required")
 
@@ -126,37 +303,43 @@ class PipedriveHelper:
             else:
                 org_data['address'] = ' '.join(address_components)
 
+        return org_data
+
+    def create_organization(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        endpoint = f"{self.base_url}/organizations"
+        params = {'api_token': self.api_key}
+
+        org_data = self.build_organization_payload(data)
+
         logger.debug(f"Creating organization with data: {org_data}")
         try:
-            response = requests.post(endpoint, params=params, json=org_data)
+            response = self.session.post(endpoint, params=params, json=org_data)
             result = response.json()
             logger.debug(f"Response from Pipedrive: {result}")
             if not response.ok or not result.get('success'):
                 error_msg = result.get('error', 'Unknown error')
                 logger.error(f"Pipedrive API error: {error_msg}")
                 raise Exception(f"Pipedrive API error: {error_msg}")
+            self.index.fingerprints.remember('organization', result['data']['id'], org_data)
+            self.index.upsert('organization', result['data'])
             return result
         except requests.exceptions.RequestException as e:
             logger.error(f"Error creating organization: {str(e)}")
             raise Exception(f"Failed to create organization: {str(e)}")
 
-    def create_person(self, data: Dict[str, Any], org_id: int) -> Dict[str, Any]:
-        endpoint = f"{self.base_url}/persons"
-        params = {'api_token': self.api_key}
-
+    def build_person_payload(self, data: Dict[str, Any], org_id: int) -> Dict[str, Any]:
+        """Map a combined record to the fields of its contact person."""
         person_data = {'org_id': org_id}
 
         # Add mapped custom fields from field mappings
-        person_fields = self.get_person_fields()
-        field_types = {str(field['id']): {'type': field['field_type'], 'options': field.get('options', [])} 
-                      for field in person_fields}
+        field_types = self.get_field_lookup('person')['by_id']
 
         for mapping in self.field_mappings:
             if mapping['entity'] == 'person' and mapping['source'] in data:
                 field_value = data[mapping['source']]
                 field_info = field_types.get(mapping['target'])
 
-                if field_info and field_info['type'] == 'enum':
+                if field_info and field_info['field_type'] == 'enum':
                     if mapping['source'] in ['ANR_ANREDE']:
                         # Map salutations directly as custom field
                         person_data[mapping['target']] = field_value
@@ -174,12 +357,32 @@ class PipedriveHelper:
         if data.get('AKP_TEL') and 'phone' not in person_data:
             person_data['phone'] = [{'value': data['AKP_TEL'], 'primary': True}]
 
+        return person_data
+
+    def create_person(self, data: Dict[str, Any], org_id: int) -> Dict[str, Any]:
+        endpoint = f"{self.base_url}/persons"
+        params = {'api_token': self.api_key}
+
+        person_data = self.build_person_payload(data, org_id)
+
         logger.debug(f"Creating person with data: {person_data}")
-        response = requests.post(endpoint, params=params, json=person_data)
-        return response.json()
+        response = self.session.post(endpoint, params=params, json=person_data)
+        result = response.json()
+        if result.get('success'):
+            self.index.fingerprints.remember('person', result['data']['id'], person_data)
+            self.index.upsert('person', result['data'])
+        return result
 
     def get_fields(self, entity_type: str) -> List[Dict[str, Any]]:
-        """Get fields for a specific entity type."""
+        """Get fields for a specific entity type (cached per company)."""
+        return self.get_field_lookup(entity_type)['fields']
+
+    def get_field_lookup(self, entity_type: str) -> Dict[str, Any]:
+        """Get cached fields of an entity type plus `by_id` and `by_key` lookup maps."""
+        return field_cache.get(self.company_key, entity_type, lambda: self._fetch_fields(entity_type))
+
+    def _fetch_fields(self, entity_type: str) -> Optional[List[Dict[str, Any]]]:
+        """Fetch field definitions from Pipedrive. Returns None on failure."""
         endpoint = f"{self.base_url}/{entity_type}Fields"
         params = {
             'api_token': self.api_key,
@@ -187,11 +390,11 @@ class PipedriveHelper:
             'limit': 100
         }
 
-        response = requests.get(endpoint, params=params)
+        response = self.session.get(endpoint, params=params)
         if response.ok:
             data = response.json()
             fields = []
-            for field in data.get('data', []):
+            for field in data.get('data', []) or []:
                 field_data = {
                     'key': field.get('key'),
                     'name': field.get('name'),
@@ -204,7 +407,7 @@ class PipedriveHelper:
                 fields.append(field_data)
             return fields
         logger.error(f"Failed to get {entity_type} fields: {response.text}")
-        return []
+        return None
 
     def get_organization_fields(self) -> List[Dict[str, Any]]:
         return self.get_fields('organization')
@@ -215,55 +418,117 @@ class PipedriveHelper:
     def get_deal_fields(self) -> List[Dict[str, Any]]:
         return self.get_fields('deal')
 
-    def get_recent_changes(self, since_timestamp: str, items: List[str] = None) -> Dict[str, Any]:
+    def get_recent_changes(self, since_timestamp: str, items: List[str] = None,
+                           start: int = 0, limit: int = 500) -> Dict[str, Any]:
         """Get recent changes in Pipedrive."""
         endpoint = f"{self.base_url}/recents"
         params = {
             'api_token': self.api_key,
             'since_timestamp': since_timestamp,
-            'items': ','.join(items) if items else None
+            'items': ','.join(items) if items else None,
+            'start': start,
+            'limit': limit
         }
-        response = requests.get(endpoint, params=params)
+        response = self.session.get(endpoint, params=params)
         return response.json()
 
+    def iter_recent_changes(self, since_timestamp: str, items: List[str] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over all changes since a UTC timestamp (YYYY-MM-DD HH:MM:SS), page by page."""
+        start = 0
+        while True:
+            result = self.get_recent_changes(since_timestamp, items, start)
+            if not result.get('success'):
+                raise Exception(f"Failed to get recent changes: {result.get('error', 'Unknown error')}")
+            yield from result.get('data') or []
+            pagination = (result.get('additional_data') or {}).get('pagination') or {}
+            if not pagination.get('more_items_in_collection'):
+                return
+            start = pagination.get('next_start', start + len(result.get('data') or []))
+
     def update_organization(self, org_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
         """Update an existing organization."""
         endpoint = f"{self.base_url}/organizations/{org_id}"
         params = {'api_token': self.api_key}
-        response = requests.put(endpoint, params=params, json=data)
-        return response.json()
+        response = self.session.put(endpoint, params=params, json=data)
+        result = response.json()
+        if result.get('success'):
+            self.index.upsert('organization', result['data'])
+        return result
 
     def update_person(self, person_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
         """Update an existing person."""
         endpoint = f"{self.base_url}/persons/{person_id}"
         params = {'api_token': self.api_key}
-        response = requests.put(endpoint, params=params, json=data)
-        return response.json()
+        response = self.session.put(endpoint, params=params, json=data)
+        result = response.json()
+        if result.get('success'):
+            self.index.upsert('person', result['data'])
+        return result
+
+    def sync_organization_fields(self, org_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update an existing organization from a record, sending only changed fields.
+
+        Returns None if nothing changed and no request was made.
+        """
+        return self._sync_fields('organization', org_id, self.build_organization_payload(data))
+
+    def sync_person_fields(self, person_id: int, data: Dict[str, Any], org_id: int) -> Optional[Dict[str, Any]]:
+        """Update an existing person from a record, sending only changed fields.
+
+        Returns None if nothing changed and no request was made.
+        """
+        return self._sync_fields('person', person_id, self.build_person_payload(data, org_id))
+
+    def _sync_fields(self, entity_type: str, item_id: int, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        changes = self.index.fingerprints.changed(entity_type, item_id, payload)
+        if changes == {}:
+            logger.debug(f"{entity_type.capitalize()} {item_id} is unchanged, skipping update")
+            with self._stats_lock:
+                self._call_stats['skipped_updates'] += 1
+            return None
+
+        changes = payload if changes is None else changes
+        logger.debug(f"Updating {entity_type} {item_id} fields: {list(changes)}")
+        update = {
+            'organization': self.update_organization,
+            'person': self.update_person,
+            'deal': self.update_deal
+        }[entity_type]
+        result = update(item_id, changes)
+        if result.get('success'):
+            self.index.fingerprints.remember(entity_type, item_id, changes)
+        with self._stats_lock:
+            self._call_stats['updates'] += 1
+        return result
 
     def update_deal(self, deal_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
         """Update an existing deal."""
         endpoint = f"{self.base_url}/deals/{deal_id}"
         params = {'api_token': self.api_key}
-        response = requests.put(endpoint, params=params, json=data)
-        return response.json()
+        response = self.session.put(endpoint, params=params, json=data)
+        result = response.json()
+        if result.get('success'):
+            self.index.upsert('deal', result['data'])
+        return result
 
-    def create_deal(self, data: Dict[str, Any], org_id: int) -> Dict[str, Any]:
-        from datetime import datetime, timedelta
-        endpoint = f"{self.base_url}/deals"
-        params = {'api_token': self.api_key}
+    def sync_deal_fields(self, deal_id: int, data: Dict[str, Any], org_id: int) -> Optional[Dict[str, Any]]:
+        """Update an existing deal from a record, sending only changed fields.
 
-        # Check if deal is older than 24 months
-        try:
-            deal_date = datetime.strptime(data.get('NPO_KDatum', ''), '%Y-%m-%d %H:%M:%S')
-        except (ValueError, TypeError):
-            deal_date = datetime.now()  # Default to current date if invalid
-        two_years_ago = datetime.now() - timedelta(days=730)
+        Returns None if nothing changed and no request was made.
+        """
+        return self._sync_fields('deal', deal_id, self.build_deal_update_payload(data, org_id))
 
-        deal_data = {'org_id': org_id, 'pipeline_id': self.default_pipeline_id}
+    def find_deal_by_project(self, proj_nr: Any) -> Optional[Dict[str, Any]]:
+        """Find the deal of a project number."""
+        existing_deals = self.search_deals_by_custom_field(self.project_field_key, proj_nr)
+        return existing_deals[0]['item'] if existing_deals else None
+
+    def build_deal_payload(self, data: Dict[str, Any], org_id: int) -> Dict[str, Any]:
+        """Map a combined record to the fields of its deal, including the final value and status."""
+        deal_data = {'org_id': org_id}
 
         # Add mapped custom fields from field mappings
-        deal_fields = self.get_deal_fields()
-        field_ids = {str(field['id']): field['key'] for field in deal_fields}
+        field_ids = self.get_field_lookup('deal')['by_id']
 
         for mapping in self.field_mappings:
             if mapping['entity'] == 'deal' and mapping['source'] in data:
@@ -273,7 +538,7 @@ class PipedriveHelper:
 
                 # Validate field ID exists
                 if mapping['target'] in field_ids:
-                    logger.debug(f"Mapping field {mapping['source']} to {field_ids[mapping['target']]} ({mapping['target']})")
+                    logger.debug(f"Mapping field {mapping['source']} to {field_ids[mapping['target']]['key']} ({mapping['target']})")
                     deal_data[mapping['target']] = field_value
                 else:
                     logger.warning(f"Invalid field ID in mapping: {mapping['target']}")
@@ -281,17 +546,12 @@ class PipedriveHelper:
         # Set standard fields if not already mapped
         if 'title' not in deal_data:
             deal_data['title'] = data.get('NPO_ProjName', '')
-        if 'value' not in deal_data:
-            deal_data['value'] = data.get('NPO_KSumme', 0)
         if 'currency' not in deal_data:
             deal_data['currency'] = 'CHF'
-        if 'add_time' not in deal_data:
-            deal_data['add_time'] = self._format_timestamp(data.get('NPO_KDatum'))
         if 'close_time' not in deal_data:
             deal_data['close_time'] = self._format_timestamp(data.get('NPO_ADatum'))
 
         # Set project number and other custom fields
-        deal_fields = self.get_deal_fields()
         for mapping in self.field_mappings:
             if mapping['entity'] == 'deal' and mapping['source'] in data:
                 field_value = data[mapping['source']]
@@ -309,145 +569,144 @@ class PipedriveHelper:
         if anr_anredetext:
             deal_data['2fea5d7de9997e5a2e32befbe45bf8a145373754'] = anr_anredetext
 
+        # Final value, status and won/lost time
+        deal_data['value'] = data.get('NPO_ASumme', 0) if data.get('NPO_ADatum') else data.get('NPO_KSumme', 0)
+        deal_data.update(self._deal_status_data(data))
+        return deal_data
+
+    def build_deal_update_payload(self, data: Dict[str, Any], org_id: int) -> Dict[str, Any]:
+        """Fields of a record's deal to apply to an existing deal: no create-only fields and no empty values."""
+        return {
+            field: value for field, value in self.build_deal_payload(data, org_id).items()
+            if field not in self.DEAL_CREATE_ONLY_FIELDS and value not in (None, '')
+        }
+
+    def create_deal(self, data: Dict[str, Any], org_id: int, person_id: Optional[int] = None) -> Dict[str, Any]:
+        """Create the deal of a record unless its project number already has one.
+
+        `person_id` is the already resolved contact person; without it the person
+        is looked up (or created) here.
+        """
+        endpoint = f"{self.base_url}/deals"
+        params = {'api_token': self.api_key}
+
+        deal_data = self.build_deal_payload(data, org_id)
+        deal_data.setdefault('pipeline_id', self.default_pipeline_id)
+        deal_data.setdefault('add_time', self._format_timestamp(data.get('NPO_KDatum')))
 
-        # Find or create primary contact first
-        primary_contact = None
+        # Check if deal already exists to prevent duplicates
+        proj_nr = data.get('NPO_ProjNr')
+        if proj_nr:
+            if self.find_deal_by_project(proj_nr):
+                logger.info(f"Deal with project number {proj_nr} already exists")
+                return {'success': False, 'error': 'Deal already exists'}
+
+        # Find or create primary contact
         person_name = f"{data.get('AKP_VORNAME', '')} {data.get('AKP_NAME', '')}".strip()
-        if person_name:
+        if person_id:
+            deal_data['person_id'] = person_id
+        elif person_name:
             existing_person = self.find_person_by_name(person_name, org_id)
             if existing_person:
                 logger.info(f"Found existing primary contact: {existing_person['name']}")
-                primary_contact = existing_person
                 deal_data['person_id'] = existing_person['id']
             else:
                 logger.info(f"Creating new primary contact: {person_name}")
                 person_result = self.create_person(data, org_id)
                 if person_result.get('success'):
-                    primary_contact = person_result['data']
                     deal_data['person_id'] = person_result['data']['id']
                     logger.info(f"Created and linked primary contact with ID: {person_result['data']['id']}")
                 else:
                     logger.warning(f"Failed to create primary contact: {person_result}")
 
-        # Check if deal already exists to prevent duplicates
-        proj_nr = data.get('NPO_ProjNr')
-        if proj_nr:
-            existing_deals = self.search_deals_by_custom_field('5d300cf82930e07f6107c7255fcd0dd550af7774', proj_nr)
-            if existing_deals:
-                logger.info(f"Deal with project number {proj_nr} already exists")
-                return {'success': False, 'error': 'Deal already exists'}
-
-        # Set initial deal value
-        if data.get('NPO_ADatum'):
-            deal_data.update({
-                'value': data.get('NPO_ASumme', 0)
-            })
-        else:
-            deal_data.update({
-                'status': 'open',
-                'value': data.get('NPO_KSumme', 0)
-            })
-
-        # Step 1: Create initial deal
         logger.debug(f"Creating deal with data: {deal_data}")
-        response = requests.post(endpoint, params=params, json=deal_data)
+        response = self.session.post(endpoint, params=params, json=deal_data)
         result = response.json()
-        logger.debug(f"Initial deal creation response: {result}")
+        logger.debug(f"Deal creation response: {result}")
 
         if result.get('success'):
             deal_id = result['data']['id']
-            update_endpoint = f"{self.base_url}/deals/{deal_id}"
-
-            # Step 2: Handle status and dates based on conditions
-            status = data.get('Status')
-            asumme = data.get('NPO_ASumme')
-            adatum = data.get('NPO_ADatum')
-            kdatum = data.get('NPO_KDatum')
-            status4_date = data.get('NPO_Status4')
-
-            # First set the status with explicit time handling
-            if asumme:
-                status_data = {
-                    'status': 'won',
-                    'won_time': self._format_timestamp(adatum),
-                    'lost_time': None  # Clear lost time for won deals
-                }
-            elif str(status) == '4':  # Convert status to string for comparison
-                # Use status4_date as primary, fall back to kdatum if not available
-                lost_date = status4_date if status4_date else kdatum
-                status_data = {
-                    'status': 'lost',
-                    'lost_time': self._format_timestamp(lost_date),
-                    'won_time': None  # Clear won time for lost deals
-                }
-            else:
-                status_data = {
-                    'status': 'open',
-                    'won_time': None,
-                    'lost_time': None  # Clear both times for open deals
-                }
-
-            # Update deal with status and time in one request
-            logger.debug(f"Setting deal {deal_id} status data: {status_data}")
-            status_response = requests.put(update_endpoint, params=params, json=status_data)
-            if not status_response.ok:
-                logger.error(f"Failed to update deal status: {status_response.text}")
-                logger.error(f"Status response: {status_response.text}")
-            status_response = requests.put(update_endpoint, params=params, json=status_data)
-
-            # Update time fields based on status
-            if status_response.ok:
-                time_data = {}
-                if status_data['status'] == 'won' and adatum:
-                    time_data = {'won_time': adatum}
-                    logger.debug(f"Setting deal {deal_id} won_time to {adatum}")
-                elif status_data['status'] == 'lost' and status == '4' and status4_date:
-                    time_data = {'lost_time': status4_date}
-                    logger.debug(f"Setting deal {deal_id} lost_time to {status4_date}")
-
-                if time_data:
-                    response = requests.put(update_endpoint, params=params, json=time_data)
-                    result = response.json()
-                    logger.debug(f"Deal time update response: {result}")
+            self.index.fingerprints.remember('deal', deal_id, deal_data)
+            self.index.upsert('deal', result['data'])
+
+            # Final value, status and won/lost time are sent with the create request;
+            # only fields the API did not apply need a follow-up update
+            pending = self._pending_deal_fields(self._deal_status_data(data), result['data'])
+            if pending:
+                logger.debug(f"Setting deal {deal_id} fields not applied on create: {pending}")
+                update_response = self.session.put(f"{self.base_url}/deals/{deal_id}", params=params, json=pending)
+                if update_response.ok:
+                    result = update_response.json()
+                else:
+                    logger.error(f"Failed to update deal status: {update_response.text}")
 
         return result
 
-    def update_won_dates(self):
-        """Update won dates for all deals with ADatum."""
-        endpoint = f"{self.base_url}/deals"
-        params = {'api_token': self.api_key, 'status': 'won'}
+    def _deal_status_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Work out the final status and won/lost time of a record's deal."""
+        status = data.get('Status')
+        adatum = data.get('NPO_ADatum')
+        status4_date = data.get('NPO_Status4')
+
+        if data.get('NPO_ASumme'):
+            return {
+                'status': 'won',
+                'won_time': adatum or None,
+                'lost_time': None  # Clear lost time for won deals
+            }
+        if str(status) == '4':  # Convert status to string for comparison
+            # Use status4_date as primary, fall back to KDatum if not available
+            if status == '4' and status4_date:
+                lost_time = status4_date
+            else:
+                lost_time = self._format_timestamp(status4_date or data.get('NPO_KDatum'))
+            return {
+                'status': 'lost',
+                'lost_time': lost_time,
+                'won_time': None  # Clear won time for lost deals
+            }
+        return {
+            'status': 'open',
+            'won_time': None,
+            'lost_time': None  # Clear both times for open deals
+        }
+
+    @staticmethod
+    def _pending_deal_fields(expected: Dict[str, Any], deal: Dict[str, Any]) -> Dict[str, Any]:
+        """Expected fields the created deal does not match; dates are compared by prefix."""
+        pending = {}
+        for field, value in expected.items():
+            actual = deal.get(field)
+            if value is None:
+                if actual:
+                    pending[field] = value
+            elif not str(actual or '').startswith(str(value)):
+                pending[field] = value
+        return pending
+
+    def update_won_dates(self) -> Dict[str, Any]:
+        """Update won dates for all deals with ADatum, resuming an interrupted run."""
+        return self.won_dates.run()
+
+    def won_time_correction(self, deal: Dict[str, Any]) -> Optional[str]:
+        """Get the won_time a won deal should have, or None if it is already correct."""
+        adatum = None
+        # Look for ADatum in custom fields
+        for field in self.field_mappings:
+            if field['entity'] == 'deal' and field['source'] == 'NPO_ADatum':
+                adatum = deal.get(field['target'])
+                break
+
+        formatted_date = self._format_timestamp(adatum) if adatum else None
+        if formatted_date and not str(deal.get('won_time') or '').startswith(formatted_date):
+            return formatted_date
+        return None
 
-        response = requests.get(endpoint, params=params)
-        if response.ok:
-            deals = response.json().get('data', [])
-            for deal in deals:
-                deal_id = deal['id']
-                # Get deal details to check custom fields
-                detail_response = requests.get(f"{endpoint}/{deal_id}", params={'api_token': self.api_key})
-                if detail_response.ok:
-                    deal_data = detail_response.json().get('data', {})
-                    adatum = None
-
-                    # Look for ADatum in custom fields
-                    for field in self.field_mappings:
-                        if field['entity'] == 'deal' and field['source'] == 'NPO_ADatum':
-                            adatum = deal_data.get(field['target'])
-                            break
-
-                    if adatum:
-                        formatted_date = self._format_timestamp(adatum)
-                        if formatted_date:
-                            update_data = {
-                                'won_time': formatted_date
-                            }
-                            update_response = requests.put(
-                                f"{endpoint}/{deal_id}",
-                                params={'api_token': self.api_key},
-                                json=update_data
-                            )
-                            logger.debug(f"Updated won dates for deal {deal_id}: {update_response.json()}")
     def search_deals_by_custom_field(self, field_key: str, value: str) -> List[Dict[str, Any]]:
         """Search deals by custom field value."""
+        if field_key == self.project_field_key and self.index.ensure_fresh():
+            deal = self.index.find_deal(value)
+            return [{'item': {'id': deal['id'], 'title': deal['name']}}] if deal else []
         endpoint = f"{self.base_url}/deals/search"
         params = {
             'api_token': self.api_key,
@@ -455,7 +714,7 @@ class PipedriveHelper:
             'exact_match': True,
             'fields': field_key
         }
-        response = requests.get(endpoint, params=params)
+        response = self.session.get(endpoint, params=params)
         if response.ok:
             return response.json().get('data', {}).get('items', [])
         return []
@@ -467,7 +726,24 @@ class PipedriveHelper:
             'api_token': self.api_key,
             'org_id': org_id
         }
-        response = requests.get(endpoint, params=params)
+        response = self.session.get(endpoint, params=params)
         if response.ok:
             return response.json().get('data', [])
         return []
+
+
+_helpers: Dict[str, PipedriveHelper] = {}
+_helpers_lock = threading.Lock()
+
+
+def get_pipedrive_helper(company_key: str = 'uniska') -> PipedriveHelper:
+    """Get the long-lived PipedriveHelper of a company, creating it on first use."""
+    if company_key not in Config.COMPANIES:
+        raise ValueError(f"Unknown company: {company_key}")
+    helper = _helpers.get(company_key)
+    if helper is None:
+        with _helpers_lock:
+            helper = _helpers.get(company_key)
+            if helper is None:
+                helper = _helpers[company_key] = PipedriveHelper(company_key)
+    return helper
@@ -0,0 +1,253 @@
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_name(name: Any) -> str:
+    """Normalize a name for lookups: trimmed, single-spaced and case-folded."""
+    return re.sub(r'\s+', ' ', str(name or '')).strip().casefold()
+
+
+def _ref_id(value: Any) -> Optional[int]:
+    """Get the ID of a reference field, which the API returns as an ID or as an object."""
+    if isinstance(value, dict):
+        return value.get('value', value.get('id'))
+    return value
+
+
+_TIMESTAMP = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$')
+
+
+def _field_fingerprint(value: Any) -> int:
+    """Hash a field value so pushed values and the API's representation compare equal.
+
+    Email/phone lists reduce to their primary value, reference objects to their ID,
+    whole numbers to integers and timestamps to their date.
+    """
+    if isinstance(value, list):
+        value = next((v for v in value if isinstance(v, dict) and v.get('primary')), value[0] if value else None)
+    if isinstance(value, dict):
+        value = value.get('value', value.get('id'))
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = '' if value is None else str(value).strip()
+    if _TIMESTAMP.match(value):
+        value = value[:10]
+    return hash(value)
+
+
+class FingerprintCache:
+    """Fingerprints of the field values last pushed to or fetched from Pipedrive.
+
+    Lets updates send only the fields whose values changed, or nothing at all.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, int], Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def remember(self, item_type: str, item_id: int, values: Dict[str, Any],
+                 fields: Optional[Iterable[str]] = None, overwrite: bool = True) -> None:
+        """Record field values; with `overwrite=False` only fields not known yet are recorded."""
+        fields = values.keys() if fields is None else [field for field in fields if field in values]
+        with self._lock:
+            entry = self._entries.setdefault((item_type, item_id), {})
+            for field in fields:
+                if overwrite or field not in entry:
+                    entry[field] = _field_fingerprint(values[field])
+
+    def changed(self, item_type: str, item_id: int, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fields of `payload` that differ from what is known, or None if nothing is known."""
+        entry = self._entries.get((item_type, item_id))
+        if entry is None:
+            return None
+        return {
+            field: value for field, value in payload.items()
+            if entry.get(field) != _field_fingerprint(value)
+        }
+
+    def forget(self, item_type: str, item_id: int) -> None:
+        with self._lock:
+            self._entries.pop((item_type, item_id), None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PipedriveIndex:
+    """Local identity index of a company's Pipedrive organizations, persons and deals.
+
+    Bulk-loaded from the paginated list endpoints and kept fresh through /recents,
+    so existence checks during a sync are in-memory lookups instead of search calls.
+    """
+
+    def __init__(self, pipedrive, refresh_interval: float = 60, reload_interval: float = 21600):
+        self.pipedrive = pipedrive
+        self.refresh_interval = refresh_interval
+        self.reload_interval = reload_interval
+        # Normalized name (or project number) -> {'id': ..., 'name': ...}
+        self.orgs: Dict[str, Dict[str, Any]] = {}
+        self.persons: Dict[Tuple[str, Optional[int]], Dict[str, Any]] = {}
+        self.deals: Dict[str, Dict[str, Any]] = {}
+        self.fingerprints = FingerprintCache()
+        self.loaded = False
+        self._keys: Dict[Tuple[str, int], Any] = {}  # (item type, id) -> key it is indexed under
+        self._loaded_at = 0.0
+        self._refreshed_at = 0.0
+        self._since: Optional[str] = None
+        self._lock = threading.Lock()  # serializes loads and refreshes
+        self._maps_lock = threading.Lock()  # guards changes to the maps above
+        self._changes_during_load: Optional[List[Tuple[str, str, Any]]] = None
+
+    @staticmethod
+    def _timestamp() -> str:
+        # Small overlap so changes made while loading are not missed
+        return (datetime.now(timezone.utc) - timedelta(seconds=5)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def ensure_fresh(self) -> bool:
+        """Load or refresh the index if it is due. Returns False if it is unusable."""
+        now = time.monotonic()
+        if self.loaded and now - self._refreshed_at < self.refresh_interval:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            if self.loaded and now - self._refreshed_at < self.refresh_interval:
+                return True
+            try:
+                if not self.loaded or now - self._loaded_at >= self.reload_interval:
+                    self._load()
+                else:
+                    self._refresh()
+            except Exception as e:
+                logger.error(f"Failed to update Pipedrive index for {self.pipedrive.company_key}: {e}")
+                if not self.loaded:
+                    return False
+            return True
+
+    def invalidate(self) -> None:
+        """Force a full reload on next use."""
+        with self._lock:
+            self.loaded = False
+
+    def _load(self) -> None:
+        since = self._timestamp()
+        # Built aside and swapped in at once, so lookups meanwhile still see the previous index
+        maps = {'organization': {}, 'person': {}, 'deal': {}}
+        keys = {}
+        counts = {}
+        with self._maps_lock:
+            self._changes_during_load = []
+        try:
+            for item_type, collection in (('organization', 'organizations'), ('person', 'persons'), ('deal', 'deals')):
+                counts[collection] = 0
+                for item in self.pipedrive.iter_collection(collection):
+                    self._upsert(maps, keys, item_type, item)
+                    counts[collection] += 1
+        except Exception:
+            with self._maps_lock:
+                self._changes_during_load = None
+            raise
+        with self._maps_lock:
+            # Items created or updated by syncs meanwhile may be missing from the pages read before
+            for action, item_type, value in self._changes_during_load:
+                if action == 'upsert':
+                    self._upsert(maps, keys, item_type, value)
+                else:
+                    self._remove(maps, keys, item_type, value)
+            self._changes_during_load = None
+            self.orgs, self.persons, self.deals = maps['organization'], maps['person'], maps['deal']
+            self._keys = keys
+        self.loaded = True
+        self._since = since
+        self._loaded_at = self._refreshed_at = time.monotonic()
+        logger.info(f"Loaded Pipedrive index for {self.pipedrive.company_key}: {counts}")
+
+    def _refresh(self) -> None:
+        since = self._timestamp()
+        changes = 0
+        for change in self.pipedrive.iter_recent_changes(self._since, ['organization', 'person', 'deal']):
+            item_type, data = change.get('item'), change.get('data')
+            if item_type not in ('organization', 'person', 'deal'):
+                continue
+            if not data or data.get('active_flag') is False or data.get('deleted'):
+                self.remove(item_type, change.get('id'))
+                self.fingerprints.forget(item_type, change.get('id'))
+            else:
+                self.upsert(item_type, data)
+            changes += 1
+        self._since = since
+        self._refreshed_at = time.monotonic()
+        if changes:
+            logger.debug(f"Applied {changes} recent Pipedrive changes for {self.pipedrive.company_key}")
+
+    def _maps(self) -> Dict[str, Dict[Any, Dict[str, Any]]]:
+        return {'organization': self.orgs, 'person': self.persons, 'deal': self.deals}
+
+    def upsert(self, item_type: str, item: Dict[str, Any]) -> None:
+        """Add or update an organization, person or deal as returned by the API."""
+        with self._maps_lock:
+            self._upsert(self._maps(), self._keys, item_type, item)
+            if self._changes_during_load is not None:
+                self._changes_during_load.append(('upsert', item_type, item))
+
+    def remove(self, item_type: str, item_id: Any) -> None:
+        with self._maps_lock:
+            self._remove(self._maps(), self._keys, item_type, item_id)
+            if self._changes_during_load is not None:
+                self._changes_during_load.append(('remove', item_type, item_id))
+
+    def _upsert(self, maps: Dict[str, Dict[Any, Dict[str, Any]]], keys: Dict[Tuple[str, int], Any],
+                item_type: str, item: Dict[str, Any]) -> None:
+        item_id = item.get('id')
+        key_field = 'name' if item_type in ('organization', 'person') else self.pipedrive.project_field_key
+        if item_id is None or key_field not in item:  # partial item, keep what is indexed
+            return
+        if item_type == 'organization':
+            key = normalize_name(item.get('name'))
+            valid = bool(key)
+        elif item_type == 'person':
+            key = (normalize_name(item.get('name')), _ref_id(item.get('org_id')))
+            valid = bool(key[0])
+        elif item_type == 'deal':
+            key = str(item.get(key_field) or '').strip()
+            valid = bool(key)
+        else:
+            return
+        mapping = maps[item_type]
+        self._remove(maps, keys, item_type, item_id)
+        # Fetched values seed the fingerprints; values we pushed ourselves take precedence
+        self.fingerprints.remember(item_type, item_id, item, self.pipedrive.payload_fields(item_type), overwrite=False)
+        if valid and key not in mapping:  # like the search endpoints, the first match wins
+            mapping[key] = {'id': item_id, 'name': item.get('name') or item.get('title')}
+            keys[(item_type, item_id)] = key
+
+    @staticmethod
+    def _remove(maps: Dict[str, Dict[Any, Dict[str, Any]]], keys: Dict[Tuple[str, int], Any],
+                item_type: str, item_id: Any) -> None:
+        key = keys.pop((item_type, item_id), None)
+        if key is not None:
+            del maps[item_type][key]
+
+    def find_organization(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.orgs.get(normalize_name(name))
+
+    def find_person(self, name: str, org_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        return self.persons.get((normalize_name(name), org_id))
+
+    def find_deal(self, project_number: Any) -> Optional[Dict[str, Any]]:
+        return self.deals.get(str(project_number).strip())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'loaded': self.loaded,
+            'organizations': len(self.orgs),
+            'persons': len(self.persons),
+            'deals': len(self.deals),
+            'fingerprints': len(self.fingerprints)
+        }
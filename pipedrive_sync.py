@@ -0,0 +1,219 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pipedrive_helper import PipedriveHelper
+
+logger = logging.getLogger(__name__)
+
+
+class SyncError(Exception):
+    """A record could not be synced; `status_code` is the HTTP status to report."""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BatchContext:
+    """Organizations, persons and deals resolved so far in one batch, shared by all workers.
+
+    Records that share an organization, person or project resolve it once;
+    concurrent workers wait for the first one instead of creating duplicates.
+    """
+
+    def __init__(self):
+        self.org_ids: Dict[str, int] = {}
+        self.person_ids: Dict[Tuple[str, int], Optional[int]] = {}
+        self.deal_ids: Dict[str, Optional[int]] = {}
+        self._locks: Dict[Any, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def lock_for(self, key: Any) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+
+def _updated(result: Optional[Dict[str, Any]], entity_type: str, item_id: int) -> bool:
+    """Whether a field sync left the item with the record's values (None means nothing changed)."""
+    if result is None or result.get('success'):
+        return True
+    logger.warning(f"Failed to update {entity_type} {item_id}: {result.get('error', result)}")
+    return False
+
+
+def _resolve_organization(pipedrive: PipedriveHelper, data: Dict[str, Any]) -> Tuple[int, bool]:
+    """Find and update, or create, the organization of a record.
+
+    Returns its ID and whether it now has the record's values.
+    """
+    org_name = data.get('ADR_NAME')
+    existing_org = pipedrive.find_organization_by_name(org_name)
+    if existing_org:
+        logger.info(f"Found existing organization: {existing_org['name']}")
+        org_id = existing_org['id']
+        return org_id, _updated(pipedrive.sync_organization_fields(org_id, data), 'organization', org_id)
+
+    logger.info(f"Creating new organization: {org_name}")
+    org_result = pipedrive.create_organization(data)
+    if not org_result.get('success'):
+        logger.error(f"Failed to create organization: {org_result}")
+        raise SyncError(org_result.get('error', 'Failed to create organization'))
+    org_id = org_result['data']['id']
+    logger.info(f"Created organization with ID: {org_id}")
+    return org_id, True
+
+
+def _resolve_person(pipedrive: PipedriveHelper, data: Dict[str, Any], person_name: str,
+                    org_id: int) -> Tuple[int, bool]:
+    """Find and update, or create, the contact person of a record.
+
+    Returns its ID and whether it now has the record's values.
+    """
+    logger.info(f"Processing person: {person_name}")
+    existing_person = pipedrive.find_person_by_name(person_name, org_id)
+    if existing_person:
+        logger.info(f"Found existing person: {existing_person['name']}")
+        person_id = existing_person['id']
+        return person_id, _updated(pipedrive.sync_person_fields(person_id, data, org_id), 'person', person_id)
+
+    logger.info(f"Creating new person: {person_name}")
+    person_result = pipedrive.create_person(data, org_id)
+    if not person_result.get('success'):
+        logger.error(f"Failed to create person: {person_result}")
+        raise SyncError(person_result.get('error', 'Failed to create person'))
+    logger.info(f"Created person with ID: {person_result['data']['id']}")
+    return person_result['data']['id'], True
+
+
+def _resolve_deal(pipedrive: PipedriveHelper, data: Dict[str, Any], org_id: int,
+                  person_id: Optional[int]) -> Tuple[Optional[int], str]:
+    """Find and update, or create, the deal of a record.
+
+    Returns its ID (None if another sync is creating it) and the result message.
+    """
+    existing_deal = pipedrive.find_deal_by_project(data['NPO_ProjNr']) if data.get('NPO_ProjNr') else None
+    if existing_deal:
+        logger.info(f"Found existing deal: {existing_deal['title']}")
+        return existing_deal['id'], _update_deal(pipedrive, existing_deal['id'], data, org_id)
+
+    logger.info("Creating deal...")
+    deal_result = pipedrive.create_deal(data, org_id, person_id)
+    if not deal_result.get('success'):
+        error_msg = deal_result.get('error', '')
+        if error_msg == 'Deal already exists':  # created concurrently elsewhere
+            return None, 'Deal already exists, skipping'
+        logger.error(f"Failed to create deal: {deal_result}")
+        raise SyncError(error_msg)
+    logger.info(f"Created deal with ID: {deal_result['data']['id']}")
+    return deal_result['data']['id'], 'Record synced successfully'
+
+
+def _update_deal(pipedrive: PipedriveHelper, deal_id: int, data: Dict[str, Any], org_id: int) -> str:
+    """Send the changed fields of an existing deal. Returns the result message."""
+    result = pipedrive.sync_deal_fields(deal_id, data, org_id)
+    if result is None:
+        return 'Deal already exists, skipping'
+    if not result.get('success'):
+        logger.error(f"Failed to update deal {deal_id}: {result}")
+        raise SyncError(result.get('error', 'Failed to update deal'))
+    return 'Deal already exists, updated changed fields'
+
+
+def sync_record(pipedrive: PipedriveHelper, data: Dict[str, Any],
+                context: Optional[BatchContext] = None) -> Dict[str, Any]:
+    """Sync one combined record to Pipedrive: organization, then person, then deal.
+
+    Returns the success payload, whose `synced_entities` lists the entities that now
+    have the record's values; raises SyncError if the record could not be synced.
+    """
+    org_name = data.get('ADR_NAME')
+    if not org_name:
+        raise SyncError('Organization name (ADR_NAME) is required', 400)
+    calls_before = pipedrive.thread_call_count()
+    synced_entities = []
+
+    # Create or update organization
+    if context is None:
+        org_id, org_synced = _resolve_organization(pipedrive, data)
+    else:
+        with context.lock_for(('org', org_name)):
+            org_id = context.org_ids.get(org_name)
+            if org_id is None:
+                org_id, org_synced = _resolve_organization(pipedrive, data)
+                context.org_ids[org_name] = org_id
+            else:
+                # Rows sharing an organization may still differ in its fields
+                org_synced = _updated(pipedrive.sync_organization_fields(org_id, data), 'organization', org_id)
+    if org_synced:
+        synced_entities.append('organization')
+
+    # Create or update person with complete data
+    person_id = None
+    person_name = f"{data.get('AKP_VORNAME', '')} {data.get('AKP_NAME', '')}".strip()
+    if person_name:
+        if context is None:
+            person_id, person_synced = _resolve_person(pipedrive, data, person_name, org_id)
+        else:
+            person_key = (person_name, org_id)
+            with context.lock_for(('person',) + person_key):
+                person_id = context.person_ids.get(person_key)
+                if person_id is None:
+                    person_id, person_synced = _resolve_person(pipedrive, data, person_name, org_id)
+                    context.person_ids[person_key] = person_id
+                else:
+                    person_synced = _updated(pipedrive.sync_person_fields(person_id, data, org_id), 'person', person_id)
+        if person_synced:
+            synced_entities.append('person')
+
+    # Create the deal with all related data, or update the changed fields of an existing one
+    proj_nr = str(data.get('NPO_ProjNr') or '').strip()
+    if context is None or not proj_nr:
+        deal_id, message = _resolve_deal(pipedrive, data, org_id, person_id)
+    else:
+        # Rows of one project differ only in their contact; the first one creates the deal
+        with context.lock_for(('deal', proj_nr)):
+            deal_id = context.deal_ids.get(proj_nr)
+            if deal_id is None:
+                deal_id, message = _resolve_deal(pipedrive, data, org_id, person_id)
+                context.deal_ids[proj_nr] = deal_id
+            else:
+                message = _update_deal(pipedrive, deal_id, data, org_id)
+    if deal_id is not None:
+        synced_entities.append('deal')
+    pipedrive.record_sync(pipedrive.thread_call_count() - calls_before)
+
+    return {'success': True, 'message': message, 'synced_entities': synced_entities}
+
+
+def sync_batch(pipedrive: PipedriveHelper, records: List[Dict[str, Any]], max_workers: int = 4,
+               on_synced: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None
+               ) -> Iterator[Dict[str, Any]]:
+    """Sync many records with bounded concurrency, yielding per-record results as they finish.
+
+    `on_synced(record, result)` is called by the worker as soon as a record is synced,
+    so it runs for every pushed record even if the caller stops consuming results.
+    """
+    context = BatchContext()
+
+    def run(index: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        result = {'index': index, 'ProjNr': data.get('NPO_ProjNr') or data.get('ProjNr')}
+        try:
+            result.update(sync_record(pipedrive, data, context))
+            result.setdefault('success', True)
+        except Exception as e:
+            logger.error(f"Error syncing record {index} to Pipedrive: {e}")
+            result.update({'success': False, 'error': str(e)})
+            return result
+        if on_synced is not None:
+            try:
+                on_synced(data, result)
+            except Exception as e:  # the record is in Pipedrive either way
+                logger.error(f"Error recording synced record {index}: {e}")
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pipedrive-sync') as executor:
+        futures = [executor.submit(run, index, data) for index, data in enumerate(records)]
+        for future in as_completed(futures):
+            yield future.result()
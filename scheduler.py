@@ -0,0 +1,161 @@
+import atexit
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class JobScheduler:
+    """Polls many long-running jobs from one scheduler thread and a fixed worker pool.
+
+    `poll_job(job_id)` is called whenever a job is due and returns True once the job
+    is done. Poll intervals start at `min_interval` and grow by `backoff_factor` up to
+    `max_interval`, so short jobs are picked up quickly while long ones are polled
+    less often. The number of threads does not depend on the number of jobs.
+    """
+
+    def __init__(self, poll_job: Callable[[str], bool], max_workers: int = 4,
+                 min_interval: float = 1.0, max_interval: float = 30.0,
+                 backoff_factor: float = 1.5, timeout: float = 3600.0,
+                 on_timeout: Optional[Callable[[str], None]] = None,
+                 name: str = 'job-scheduler'):
+        self.poll_job = poll_job
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.on_timeout = on_timeout
+        self.name = name
+
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: List[Tuple[float, int, str]] = []  # heap of (due_at, seq, job_id)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._completed = deque(maxlen=100)
+        self._total_polls = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        atexit.register(self.shutdown)
+
+    def submit(self, job_id: str) -> None:
+        """Start polling a job."""
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Scheduler has been shut down")
+            now = time.monotonic()
+            self._jobs[job_id] = {
+                'submitted_at': now,
+                'interval': self.min_interval,
+                'polls': 0
+            }
+            heapq.heappush(self._queue, (now + self.min_interval, next(self._seq), job_id))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop polling a job. Returns False if the job is not being polled."""
+        with self._cond:
+            if job_id not in self._jobs:
+                return False
+            self._finish(job_id, 'cancelled')
+            return True
+
+    def is_scheduled(self, job_id: str) -> bool:
+        with self._cond:
+            return job_id in self._jobs
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and per-job latency."""
+        with self._cond:
+            now = time.monotonic()
+            return {
+                'queue_depth': len(self._jobs),
+                'total_polls': self._total_polls,
+                'jobs': {
+                    job_id: {
+                        'age': round(now - job['submitted_at'], 2),
+                        'polls': job['polls'],
+                        'interval': round(job['interval'], 2)
+                    }
+                    for job_id, job in self._jobs.items()
+                },
+                'completed': list(self._completed)
+            }
+
+    def shutdown(self) -> None:
+        """Stop the scheduler thread and drop all pending polls."""
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._jobs.clear()
+            self._queue.clear()
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, job_id: str, outcome: str) -> None:
+        """Remove a job and record its latency. Caller must hold the lock."""
+        job = self._jobs.pop(job_id)
+        self._completed.append({
+            'job_id': job_id,
+            'outcome': outcome,
+            'latency': round(time.monotonic() - job['submitted_at'], 2),
+            'polls': job['polls']
+        })
+
+    def _run(self) -> None:
+        while True:
+            timed_out = None
+            with self._cond:
+                while not self._stopped:
+                    now = time.monotonic()
+                    if self._queue and self._queue[0][0] <= now:
+                        break
+                    self._cond.wait(self._queue[0][0] - now if self._queue else None)
+                if self._stopped:
+                    return
+
+                _, _, job_id = heapq.heappop(self._queue)
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue  # cancelled while queued
+                if time.monotonic() - job['submitted_at'] > self.timeout:
+                    self._finish(job_id, 'timeout')
+                    timed_out = job_id
+
+            if timed_out:
+                logger.warning(f"Job {timed_out} timed out after {self.timeout}s")
+                if self.on_timeout:
+                    self.on_timeout(timed_out)
+                continue
+
+            self._executor.submit(self._poll, job_id)
+
+    def _poll(self, job_id: str) -> None:
+        try:
+            done = self.poll_job(job_id)
+        except Exception as e:
+            logger.error(f"Error polling job {job_id}: {e}")
+            done = True
+
+        with self._cond:
+            self._total_polls += 1
+            job = self._jobs.get(job_id)
+            if job is None:
+                return  # cancelled while polling
+            job['polls'] += 1
+            if done:
+                self._finish(job_id, 'done')
+                return
+            job['interval'] = min(job['interval'] * self.backoff_factor, self.max_interval)
+            heapq.heappush(self._queue, (time.monotonic() + job['interval'], next(self._seq), job_id))
+            self._cond.notify()
@@ -0,0 +1,250 @@
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column, Float, Index, Integer, MetaData, String, Table, Text, create_engine, event, func, literal, select
+)
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+reports = Table(
+    'reports', metadata,
+    Column('report_id', String(36), primary_key=True),
+    Column('company', String(20)),
+    Column('mandant', String(10)),
+    Column('report_key', String(20), nullable=False),
+    Column('params', Text),  # JSON of the report parameters; with company, mandant and key the cache key
+    Column('api_report_id', String(64)),
+    Column('status', String(20), nullable=False),
+    Column('message', Text),
+    Column('total_pages', Integer),
+    Column('fetched_pages', Integer),
+    Column('pages_per_sec', Float),
+    Column('rows', Integer),
+    Column('data_path', Text),  # JSON-lines file the report's rows were spilled to
+    Column('created_at', Float, nullable=False),
+    Column('updated_at', Float),  # last status change; reports running in a live worker keep it recent
+    Column('finished_at', Float),  # set once the data has been stored
+    Index('ix_reports_namespace_finished', 'company', 'mandant', 'report_key', 'finished_at'),
+    Index('ix_reports_created', 'created_at')
+)
+
+sync_journal = Table(
+    'sync_journal', metadata,
+    Column('company_key', String(20), primary_key=True),
+    Column('entity', String(20), primary_key=True),  # deal (keyed by project number), organization or person
+    Column('key', String(255), primary_key=True),
+    Column('fingerprint', String(40), nullable=False),  # of the mapped payload last synced
+    Column('synced_at', Float, nullable=False)
+)
+
+# Columns of `reports` that make up a report status
+STATUS_FIELDS = tuple(column.name for column in reports.columns if column.name != 'report_id')
+
+# Report statuses that no longer change
+FINAL_STATUSES = ('FinishedSuccess', 'FinishedError', 'Cancelled')
+
+
+def _unfinished():
+    """Condition matching reports still running or storing their data."""
+    return reports.c.status.not_in(FINAL_STATUSES) | (
+        (reports.c.status == 'FinishedSuccess') & reports.c.finished_at.is_(None)
+    )
+
+
+class Storage:
+    """Durable state shared by all workers: report status and data locations, the sync journal.
+
+    Backed by SQLite by default; any SQLAlchemy URL works.
+    """
+
+    def __init__(self, url: str):
+        if url.startswith('sqlite:///'):
+            directory = os.path.dirname(url[len('sqlite:///'):])
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.engine = create_engine(url)
+        if self.engine.dialect.name == 'sqlite':
+            event.listen(self.engine, 'connect', self._configure_sqlite)
+        try:
+            metadata.create_all(self.engine)
+        except OperationalError:  # another worker created the tables first
+            metadata.create_all(self.engine)
+
+    @staticmethod
+    def _configure_sqlite(connection, _record) -> None:
+        # WAL lets readers in other workers proceed while one worker writes
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.close()
+
+    def create_report(self, report_id: str, **fields: Any) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(reports.insert().values(report_id=report_id, created_at=time.time(), **fields))
+
+    def create_report_unless_running(self, report_id: str, updated_after: float, **fields: Any) -> Optional[str]:
+        """Create a report unless a run of the same report and parameters is in progress.
+
+        A run counts as in progress while it is unfinished and its status changed after
+        `updated_after`. Returns the ID of that run, or None if the report was created.
+        The check and the insert are one statement, so concurrent workers cannot both
+        create a run.
+        """
+        running = select(reports.c.report_id).where(
+            reports.c.company == fields.get('company'),
+            reports.c.mandant == fields.get('mandant'),
+            reports.c.report_key == fields.get('report_key'),
+            reports.c.params == fields.get('params'),
+            _unfinished(),
+            func.coalesce(reports.c.updated_at, reports.c.created_at) >= updated_after
+        )
+        values = {'report_id': report_id, 'created_at': time.time(), **fields}
+        row = select(*(literal(value, reports.c[name].type).label(name) for name, value in values.items()))
+        insert = reports.insert().from_select(list(values), row.where(~running.exists()))
+        with self.engine.begin() as conn:
+            if conn.execute(insert).rowcount:
+                return None
+            return conn.execute(running.order_by(reports.c.created_at.desc()).limit(1)).scalar()
+
+    def update_report(self, report_id: str, **fields: Any) -> None:
+        fields = {key: value for key, value in fields.items() if key in STATUS_FIELDS}
+        if fields:
+            with self.engine.begin() as conn:
+                conn.execute(
+                    reports.update().where(reports.c.report_id == report_id).values(updated_at=time.time(), **fields)
+                )
+
+    def get_report(self, report_id: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(select(reports).where(reports.c.report_id == report_id)).mappings().first()
+        return dict(row) if row else None
+
+    def list_reports(self, company: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get the most recently started run per (company, mandant, report key), oldest first."""
+        namespace = (reports.c.company, reports.c.mandant, reports.c.report_key)
+        latest = select(*namespace, func.max(reports.c.created_at).label('created_at')).group_by(*namespace)
+        if company:
+            latest = latest.where(reports.c.company == company)
+        latest = latest.subquery()
+        query = select(reports).join(
+            latest,
+            (reports.c.company == latest.c.company) & (reports.c.mandant == latest.c.mandant)
+            & (reports.c.report_key == latest.c.report_key) & (reports.c.created_at == latest.c.created_at)
+        ).order_by(reports.c.created_at)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).mappings().all()
+        return [dict(row) for row in rows]
+
+    def fail_stale_reports(self, updated_before: float, message: str, exclude: Iterable[str] = ()) -> int:
+        """Mark unfinished reports without a status change since `updated_before` as failed.
+
+        Returns the number of reports marked.
+        """
+        query = (
+            reports.update()
+            .where(_unfinished(), func.coalesce(reports.c.updated_at, reports.c.created_at) < updated_before)
+            .values(status='FinishedError', message=message, updated_at=time.time())
+        )
+        exclude = list(exclude)
+        if exclude:
+            query = query.where(reports.c.report_id.not_in(exclude))
+        with self.engine.begin() as conn:
+            return conn.execute(query).rowcount
+
+    def delete_superseded_reports(self, report_id: str) -> List[str]:
+        """Delete the finished runs of the same report and parameters started before a report.
+
+        Returns the data paths of the deleted runs so their files can be removed.
+        """
+        with self.engine.begin() as conn:
+            current = conn.execute(select(reports).where(reports.c.report_id == report_id)).mappings().first()
+            if not current:
+                return []
+            finished = reports.c.finished_at.is_not(None) | reports.c.status.in_(('FinishedError', 'Cancelled'))
+            superseded = (
+                (reports.c.company == current['company']) & (reports.c.mandant == current['mandant'])
+                & (reports.c.report_key == current['report_key']) & (reports.c.params == current['params'])
+                & (reports.c.created_at < current['created_at']) & finished
+            )
+            paths = conn.execute(select(reports.c.data_path).where(superseded)).scalars().all()
+            conn.execute(reports.delete().where(superseded))
+        return [path for path in paths if path]
+
+    def latest_finished_reports(self, report_keys: Iterable[str]) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+        """Get the most recently finished report with stored data per (company, mandant, report key)."""
+        report_keys = list(report_keys)
+        namespace = (reports.c.company, reports.c.mandant, reports.c.report_key)
+        latest = (
+            select(*namespace, func.max(reports.c.finished_at).label('finished_at'))
+            .where(reports.c.report_key.in_(report_keys), reports.c.finished_at.is_not(None))
+            .group_by(*namespace)
+            .subquery()
+        )
+        query = select(reports).join(
+            latest,
+            (reports.c.company == latest.c.company) & (reports.c.mandant == latest.c.mandant)
+            & (reports.c.report_key == latest.c.report_key) & (reports.c.finished_at == latest.c.finished_at)
+        )
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).mappings().all()
+        return {(row['company'], row['mandant'], row['report_key']): dict(row) for row in rows}
+
+    def find_cached_report(self, company: str, mandant: str, report_key: str, params: str,
+                           max_age: float) -> Optional[Dict[str, Any]]:
+        """Get the newest successful report with stored data for the same parameters, if not older than `max_age`."""
+        query = (
+            select(reports)
+            .where(
+                reports.c.company == company,
+                reports.c.mandant == mandant,
+                reports.c.report_key == report_key,
+                reports.c.params == params,
+                reports.c.status == 'FinishedSuccess',
+                reports.c.finished_at >= time.time() - max_age
+            )
+            .order_by(reports.c.finished_at.desc())
+            .limit(1)
+        )
+        with self.engine.connect() as conn:
+            row = conn.execute(query).mappings().first()
+        return dict(row) if row else None
+
+    def record_synced(self, company_key: str, entries: Iterable[Tuple[str, str, str]]) -> None:
+        """Store the (entity, key, fingerprint) entries of payloads synced to Pipedrive."""
+        entries = {(entity, key): fingerprint for entity, key, fingerprint in entries}
+        if not entries:
+            return
+        now = time.time()
+        with self.engine.begin() as conn:
+            for (entity, key), fingerprint in entries.items():
+                conn.execute(sync_journal.delete().where(
+                    sync_journal.c.company_key == company_key, sync_journal.c.entity == entity, sync_journal.c.key == key
+                ))
+            conn.execute(sync_journal.insert(), [
+                {'company_key': company_key, 'entity': entity, 'key': key, 'fingerprint': fingerprint, 'synced_at': now}
+                for (entity, key), fingerprint in entries.items()
+            ])
+
+    def get_sync_journal(self, company_key: str) -> Dict[Tuple[str, str], str]:
+        """Get the fingerprint of every synced payload of a company by (entity, key)."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(sync_journal.c.entity, sync_journal.c.key, sync_journal.c.fingerprint)
+                .where(sync_journal.c.company_key == company_key)
+            ).all()
+        return {(entity, key): fingerprint for entity, key, fingerprint in rows}
+
+    def sync_journal_version(self, company_key: str) -> Tuple[int, Optional[float]]:
+        """Get (entries, last sync time) of a company's journal; changes whenever the journal does."""
+        with self.engine.connect() as conn:
+            count, last = conn.execute(
+                select(func.count(), func.max(sync_journal.c.synced_at)).where(sync_journal.c.company_key == company_key)
+            ).one()
+        return count, last
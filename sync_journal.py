@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from combine import MISSING
+from pipedrive_helper import PipedriveHelper
+from pipedrive_index import normalize_name
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Columns identifying the deal, organization and person of a combined row
+KEY_COLUMNS = ('NPO_ProjNr', 'ADR_NAME', 'AKP_VORNAME', 'AKP_NAME')
+
+
+def _normalize(value: Any) -> str:
+    """Render a value the same way whether it comes from a report or from the dashboard."""
+    if value is None or value is MISSING:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _fingerprint(values: Iterable[Tuple[str, Any]]) -> str:
+    """Stable hash of (field, value) pairs, comparable across processes and restarts."""
+    payload = json.dumps(sorted((field, _normalize(value)) for field, value in values))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class SyncJournal:
+    """What was last synced to Pipedrive for one company's projects, organizations and persons.
+
+    Every synced combined row stores a fingerprint of the columns its deal, organization
+    and person payloads are built from. A row is 'new' while its project was never synced, 'changed'
+    when any of its payloads differs from the journal, and 'synced' otherwise.
+    """
+
+    def __init__(self, storage: Storage, company_key: str, field_mappings: List[Dict[str, str]],
+                 check_interval: float = 5.0):
+        self.storage = storage
+        self.company_key = company_key
+        self.check_interval = check_interval
+        self.sources: Dict[str, List[Tuple[str, str]]] = {'deal': [], 'organization': [], 'person': []}
+        for mapping in field_mappings:
+            if mapping['entity'] in self.sources:
+                self.sources[mapping['entity']].append((mapping['target'], mapping['source']))
+        # Unmapped columns the payload builders read, e.g. NPO_ASumme for the deal value
+        for entity, fields in self.sources.items():
+            mapped = {source for _, source in fields}
+            fields.extend((column, column) for column in PipedriveHelper.PAYLOAD_SOURCE_COLUMNS[entity]
+                          if column not in mapped)
+        # Columns a row's status depends on
+        self.columns = tuple(dict.fromkeys(
+            KEY_COLUMNS + tuple(source for fields in self.sources.values() for _, source in fields)
+        ))
+        self._entries: Dict[Tuple[str, str], str] = {}
+        self._version: Optional[Tuple[int, Optional[float]]] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def entries(self, get: Callable[[str], Any]) -> List[Tuple[str, str, str]]:
+        """Get the (entity, key, fingerprint) entries of a row, given a column getter."""
+        proj_nr = _normalize(get('NPO_ProjNr'))
+        org_key = normalize_name(_normalize(get('ADR_NAME')))
+        person_name = normalize_name(f"{_normalize(get('AKP_VORNAME'))} {_normalize(get('AKP_NAME'))}")
+        person_key = f"{org_key}|{person_name}" if person_name else None
+
+        def payload(entity: str) -> List[Tuple[str, Any]]:
+            return [(target, get(source)) for target, source in self.sources[entity]]
+
+        entries = []
+        if proj_nr:
+            # Not the person: rows of a project differ only in their contact, the deal is shared
+            entries.append(('deal', proj_nr, _fingerprint(payload('deal') + [('org', org_key)])))
+        if org_key:
+            entries.append(('organization', org_key, _fingerprint(payload('organization'))))
+        if person_key:
+            entries.append(('person', person_key, _fingerprint(payload('person'))))
+        return entries
+
+    def row_entries(self, row: Mapping[str, Any]) -> List[Tuple[str, str, str]]:
+        return self.entries(row.get)
+
+    def status(self, get: Callable[[str], Any]) -> str:
+        """Get 'new', 'changed' or 'synced' for a row, given a column getter."""
+        known = self._entries
+        entries = self.entries(get)
+        if not entries or ('deal', entries[0][1]) not in known:
+            return 'new'
+        if any(known.get((entity, key)) != fingerprint for entity, key, fingerprint in entries):
+            return 'changed'
+        return 'synced'
+
+    def row_status(self, layout) -> Callable[[Any], str]:
+        """Get a function computing the status of a combined view's row references."""
+        getters = {column: layout.getter(column) for column in self.columns}
+        return lambda ref: self.status(lambda column: getters[column](ref))
+
+    def changed(self, rows: Iterable[Mapping[str, Any]]) -> Iterator[Mapping[str, Any]]:
+        """Yield the rows that are new or differ from what was last synced."""
+        self.get_version()
+        for row in rows:
+            if self.status(row.get) != 'synced':
+                yield row
+
+    def record(self, rows: Iterable[Mapping[str, Any]], entities: Optional[Iterable[str]] = None) -> None:
+        """Record rows as synced with their current payloads, limited to `entities` if given."""
+        entities = None if entities is None else set(entities)
+        entries = [entry for row in rows for entry in self.row_entries(row)
+                   if entities is None or entry[0] in entities]
+        self.storage.record_synced(self.company_key, entries)
+        with self._lock:
+            self._entries.update(((entity, key), fingerprint) for entity, key, fingerprint in entries)
+            # Re-read the journal on the next check; other workers may have written too
+            self._version = None
+            self._last_check = 0.0
+
+    def get_version(self) -> Tuple[int, Optional[float]]:
+        """Get the journal version, reloading it first if it changed (checked every `check_interval` seconds)."""
+        now = time.monotonic()
+        if self._version is not None and now - self._last_check < self.check_interval:
+            return self._version
+        with self._lock:
+            if self._version is None or now - self._last_check >= self.check_interval:
+                self._last_check = now
+                version = self.storage.sync_journal_version(self.company_key)
+                if version != self._version:
+                    self._entries = self.storage.get_sync_journal(self.company_key)
+                    self._version = version
+                    logger.debug(f"Loaded {len(self._entries)} sync journal entries for {self.company_key}")
+            return self._version
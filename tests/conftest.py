@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Keep the app's database and report files out of the working tree
+os.environ.setdefault('REPORT_DATA_DIR', tempfile.mkdtemp(prefix='report_data_'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
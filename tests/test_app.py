@@ -0,0 +1,115 @@
+import itertools
+import json
+
+import pytest
+import requests
+
+import app as app_module
+import pipedrive_helper
+from combine import CombinedView, ReportIndex
+
+NPO = [
+    {'ProjNr': 'P1', 'Person1': '0', 'KdINR': '1', 'ProjName': 'Office', 'KSumme': 1000.0},
+    {'ProjNr': 'P2', 'Person1': '0', 'KdINR': '2', 'ProjName': 'Lobby', 'KSumme': 500.0},
+]
+ADR = [
+    {'INR': '1', 'NAME': 'Acme AG', 'TEL': '111'},
+    {'INR': '2', 'NAME': 'Globex AG', 'TEL': '222'},
+]
+AKP = [
+    {'ADR_INR': '1', 'VORNAME': 'Jane', 'NAME': 'Doe', 'MAIL': 'jane@acme.test'},
+    {'ADR_INR': '1', 'VORNAME': 'John', 'NAME': 'Doe', 'MAIL': 'john@acme.test'},
+    {'ADR_INR': '2', 'VORNAME': 'Ann', 'NAME': 'Smith', 'MAIL': 'ann@globex.test'},
+]
+
+
+class FakePipedriveAPI:
+    """Answers Pipedrive API requests from memory and records them."""
+
+    def __init__(self):
+        self.calls = []
+        self.ids = itertools.count(100)
+
+    def request(self, session, method, url, params=None, json=None, **kwargs):
+        path = url.split('/api/v1')[-1]
+        self.calls.append((method, path))
+        if path == '/pipelines':
+            return self._response([{'id': 1}])
+        if method == 'GET':  # fields, list and /recents endpoints: nothing there yet
+            return self._response([])
+        item_id = next(self.ids) if method == 'POST' else int(path.split('/')[2])
+        return self._response({**(json or {}), 'id': item_id})
+
+    @staticmethod
+    def _response(data):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'success': True, 'data': data}).encode()
+        return response
+
+
+def make_view(adr=ADR):
+    indexes = {}
+    for report_key, records in (('npo', NPO), ('adr', adr), ('akp', AKP)):
+        indexes[report_key] = ReportIndex(report_key)
+        indexes[report_key].add_page(records)
+    return CombinedView(indexes['npo'], indexes['adr'], indexes['akp'], None, ('test',))
+
+
+@pytest.fixture
+def api(monkeypatch):
+    fake = FakePipedriveAPI()
+    monkeypatch.setenv('UNISKA_PIPEDRIVE_API_KEY', 'test-key')
+    monkeypatch.setattr(requests.Session, 'request', lambda session, *args, **kwargs: fake.request(session, *args, **kwargs))
+    monkeypatch.setattr(pipedrive_helper, '_helpers', {})
+    report_manager = app_module.report_manager
+    report_manager.sync_journals.pop('uniska', None)
+    with report_manager.storage.engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM sync_journal WHERE company_key = 'uniska'")
+    return fake
+
+
+@pytest.fixture
+def view(monkeypatch):
+    views = [make_view()]
+    monkeypatch.setattr(app_module.report_manager, 'get_combined_view', lambda company=None, mandant=None: views[0])
+    return views
+
+
+def sync_changes(client):
+    response = client.post('/sync-to-pipedrive/changes', json={'company_key': 'uniska'})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    return lines[:-1], lines[-1]
+
+
+def test_sync_changes_syncs_new_rows_once(api, view):
+    client = app_module.app.test_client()
+
+    results, summary = sync_changes(client)
+    assert summary == {'done': True, 'synced': 3, 'failed': 0, 'unchanged': 0}
+    assert all(result['success'] for result in results)
+    assert sorted(call for call in api.calls if call[0] == 'POST') == (
+        [('POST', '/deals')] * 2 + [('POST', '/organizations')] * 2 + [('POST', '/persons')] * 3
+    )
+
+    api.calls.clear()
+    results, summary = sync_changes(client)
+    assert summary == {'done': True, 'synced': 0, 'failed': 0, 'unchanged': 3}
+    assert results == []
+    assert api.calls == []
+
+
+def test_sync_changes_pushes_only_changed_fields(api, view):
+    client = app_module.app.test_client()
+    sync_changes(client)
+
+    view[0] = make_view(adr=[ADR[0], dict(ADR[1], TEL='999')])
+    api.calls.clear()
+    results, summary = sync_changes(client)
+
+    assert summary == {'done': True, 'synced': 1, 'failed': 0, 'unchanged': 2}
+    writes = [call for call in api.calls if call[0] != 'GET']
+    assert len(writes) == 1
+    assert writes[0][0] == 'PUT' and writes[0][1].startswith('/organizations/')
+    assert sync_changes(client)[1]['unchanged'] == 3
@@ -0,0 +1,109 @@
+from combine import CombinedView, ReportIndex
+
+
+def make_index(report_key, records):
+    index = ReportIndex(report_key)
+    index.add_page(records)
+    return index
+
+
+NPO = [
+    {'ProjNr': 'P3', 'Person1': '0', 'KdINR': '1', 'ProjName': 'Gamma'},
+    {'ProjNr': 'P1', 'Person1': '0', 'KdINR': '2', 'ProjName': 'alpha'},
+    {'ProjNr': 'P2', 'Person1': '3', 'KdINR': '9', 'ProjName': 'Beta'},
+    {'ProjNr': 'P4', 'Person1': '0', 'KdINR': '4', 'ProjName': 'No address'},
+]
+ADR = [
+    {'INR': '1', 'NAME': 'Acme', 'TEL': '111'},
+    {'INR': '2', 'NAME': 'Globex', 'TEL': ''},
+    {'INR': '3', 'NAME': 'Initech', 'TEL': '333'},
+]
+AKP = [
+    {'ADR_INR': '1', 'NAME': 'Doe', 'VORNAME': 'Jane', 'ANR_NR': '1'},
+    {'ADR_INR': '1', 'NAME': 'Roe', 'VORNAME': 'Rick', 'ANR_NR': '2'},
+    {'ADR_INR': '3', 'NAME': 'Smith', 'VORNAME': 'Ann', 'ANR_NR': '9'},
+]
+SALUTATIONS = {'1': ('Frau', 'Sehr geehrte Frau'), '2': ('Herr', 'Sehr geehrter Herr')}
+
+
+def make_view(akp=AKP, adr=ADR):
+    return CombinedView(
+        make_index('npo', NPO), make_index('adr', adr), make_index('akp', akp), SALUTATIONS.get, ('v1',)
+    )
+
+
+def projects(rows):
+    return [(row['NPO_ProjNr'], row.get('AKP_NAME')) for row in rows]
+
+
+def test_joins_rows_per_contact():
+    rows = list(make_view().rows)
+
+    assert projects(rows) == [('P3', 'Doe'), ('P3', 'Roe'), ('P1', None), ('P2', 'Smith')]
+    assert rows[0]['ADR_NAME'] == 'Acme'
+    assert rows[0]['ANR_ANREDE'] == 'Frau'
+    assert 'ANR_ANREDE' not in rows[3]  # unknown salutation number
+    assert {row['Status'] for row in rows} == {'new'}
+
+
+def test_query_sorts_filters_searches_and_pages():
+    view = make_view()
+
+    page, total = view.query(sort='NPO_ProjName')
+    assert total == 4
+    assert [row['NPO_ProjName'] for row in page] == ['alpha', 'Beta', 'Gamma', 'Gamma']
+
+    page, total = view.query(sort='NPO_ProjNr', descending=True, offset=1, limit=2)
+    assert (projects(page), total) == ([('P3', 'Doe'), ('P2', 'Smith')], 4)
+
+    page, total = view.query(filters={'ADR_NAME': 'Acme'}, exclude={'AKP_NAME': 'Doe'})
+    assert (projects(page), total) == ([('P3', 'Roe')], 1)
+
+    page, total = view.query(search='p2')
+    assert (projects(page), total) == ([('P2', 'Smith')], 1)
+
+    page, total = view.query(filters={'ADR_NAME': 'Nobody'})
+    assert (page, total) == ([], 0)
+
+
+def test_patch_rebuilds_only_changed_groups():
+    view = make_view()
+    view.query(sort='AKP_NAME')  # builds an index the patch has to drop
+    akp = AKP[:1] + [{'ADR_INR': '1', 'NAME': 'Moe', 'VORNAME': 'Max', 'ANR_NR': '2'}] + AKP[2:]
+
+    assert view.patch('akp', make_index('akp', akp), ('v2',)) == 1
+
+    assert view.version == ('v2',)
+    assert list(view.rows) == list(make_view(akp=akp).rows)
+    assert [row.get('AKP_NAME') for row in view.query(sort='AKP_NAME')[0]] == [None, 'Doe', 'Moe', 'Smith']
+
+
+def test_patch_with_new_columns_rebuilds_the_view():
+    view = make_view()
+    adr = [dict(record, ORT='Zurich') for record in ADR]
+
+    assert view.patch('adr', make_index('adr', adr), ('v2',)) == -1
+
+    assert list(view.rows) == list(make_view(adr=adr).rows)
+    assert view.rows[0]['ADR_ORT'] == 'Zurich'
+
+
+def test_status_source_survives_patch_and_changes_etag():
+    view = make_view()
+    etag = view.etag
+    synced = {'P3'}
+
+    def status_source(layout):
+        get = layout.getter('NPO_ProjNr')
+        return lambda ref: 'synced' if get(ref) in synced else 'new'
+
+    view.set_status(status_source, 1)
+    assert view.etag != etag
+    assert view.query(filters={'Status': 'synced'})[1] == 2
+
+    view.patch('akp', make_index('akp', AKP[1:]), ('v2',))
+    assert [row['Status'] for row in view.rows] == ['synced', 'new', 'new']
+
+    synced.add('P1')
+    view.set_status(status_source, 2)
+    assert view.query(exclude={'Status': 'synced'})[1] == 1
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import pipedrive_client
+from pipedrive_client import PipedriveSession, RateLimitBudget, TokenBucket
+
+
+class FakeClock:
+    """Stands in for the time module; sleeping advances the clock instantly.
+
+    Like a real sleep, even the shortest one lets a little time pass.
+    """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(pipedrive_client, 'time', clock)
+    monkeypatch.setattr(pipedrive_client.random, 'uniform', lambda low, high: high)
+    return clock
+
+
+def response(status_code=200, headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result._content = b'{"success": true}'
+    return result
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Answers requests with the queued responses (or raises queued exceptions), recording them."""
+    calls, queued = [], []
+
+    def request(session, method, url, *args, **kwargs):
+        calls.append(method)
+        result = queued.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    return calls, queued
+
+
+def test_bucket_allows_a_burst_then_paces(clock):
+    bucket = TokenBucket(rate=10, capacity=3)
+
+    waits = [bucket.acquire() for _ in range(5)]
+
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3:] == pytest.approx([0.1, 0.1], abs=1e-5)
+    assert clock.now == pytest.approx(100.2, abs=1e-5)
+
+
+def test_bucket_paces_concurrent_threads():
+    bucket = TokenBucket(rate=100, capacity=5)
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(4)]
+
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 5 tokens up front, the other 15 at 100 per second
+    assert time.monotonic() - started >= 0.14
+
+
+def test_budget_follows_rate_limit_headers(clock):
+    budget = RateLimitBudget(limit=100, window=2)
+    budget.observe(response(headers={'X-RateLimit-Limit': '20', 'X-RateLimit-Remaining': '0',
+                                     'X-RateLimit-Reset': '2'}))
+
+    budget.acquire()
+
+    assert clock.now == pytest.approx(102)  # waited for the window to reset
+    assert budget.bucket.rate == pytest.approx(20 * pipedrive_client.HEADROOM / 2)
+
+
+def test_throttled_requests_are_retried_after_retry_after(clock, server):
+    calls, queued = server
+    queued.extend([response(429, {'Retry-After': '3'}), response(200)])
+    budget = RateLimitBudget(limit=100, window=2)
+    session = PipedriveSession(budget, max_retries=3, backoff=1)
+
+    result = session.post('https://example.test/api/v1/deals', json={})
+
+    assert result.status_code == 200
+    assert calls == ['POST', 'POST']
+    assert clock.now >= 100 + 3
+    assert budget.get_stats()['throttled'] == 1 and budget.get_stats()['retries'] == 1
+
+
+def test_server_errors_are_only_retried_for_idempotent_methods(clock, server):
+    calls, queued = server
+    session = PipedriveSession(RateLimitBudget(limit=100, window=2), max_retries=3)
+
+    queued.extend([response(502), response(200)])
+    assert session.get('https://example.test/api/v1/deals').status_code == 200
+
+    queued.append(response(502))
+    assert session.post('https://example.test/api/v1/deals', json={}).status_code == 502
+
+    queued.append(requests.exceptions.ConnectionError('reset'))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.post('https://example.test/api/v1/deals', json={})
+
+    assert calls == ['GET', 'GET', 'POST', 'POST']
+
+
+def test_retries_give_up_after_max_retries(clock, server):
+    calls, queued = server
+    queued.extend([response(429)] * 3)
+    session = PipedriveSession(RateLimitBudget(limit=100, window=2), max_retries=2)
+
+    assert session.get('https://example.test/api/v1/deals').status_code == 429
+    assert len(calls) == 3
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+import requests
+
+from pipedrive_helper import PipedriveHelper
+
+PROJECT_FIELD = '5d300cf82930e07f6107c7255fcd0dd550af7774'
+
+WON_DEAL = {
+    'id': 7, 'title': 'Office', 'value': 1000, 'currency': 'CHF', 'status': 'won',
+    'won_time': '2024-03-01 10:00:00', 'close_time': '2024-03-01 10:00:00',
+    'org_id': {'value': 3, 'name': 'Acme AG'}, PROJECT_FIELD: 'P1'
+}
+RECORD = {
+    'NPO_ProjNr': 'P1', 'NPO_ProjName': 'Office', 'NPO_KSumme': 900.0, 'NPO_KDatum': '2023-01-10 00:00:00',
+    'NPO_ADatum': '2024-03-01 00:00:00', 'NPO_ASumme': 1000.0, 'Status': 'changed'
+}
+
+
+class FakePipedriveAPI:
+    """Serves list endpoints from `collections` and echoes writes, recording them."""
+
+    def __init__(self, collections):
+        self.collections = collections
+        self.writes = []
+
+    def request(self, session, method, url, params=None, json=None, **kwargs):
+        path = url.split('/api/v1')[-1]
+        if method != 'GET':
+            self.writes.append((method, path, json))
+            return self._response({**(json or {}), 'id': int(path.split('/')[2])})
+        return self._response(self.collections.get(path.strip('/'), []))
+
+    @staticmethod
+    def _response(data):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'success': True, 'data': data}).encode()
+        return response
+
+
+@pytest.fixture
+def api(monkeypatch):
+    fake = FakePipedriveAPI({'deals': [WON_DEAL]})
+    monkeypatch.setenv('UNISKA_PIPEDRIVE_API_KEY', 'test-key')
+    monkeypatch.setattr(requests.Session, 'request', lambda session, *args, **kwargs: fake.request(session, *args, **kwargs))
+    return fake
+
+
+def test_unchanged_deal_loaded_from_pipedrive_is_not_updated(api):
+    helper = PipedriveHelper('uniska')
+    assert helper.index.ensure_fresh()
+
+    assert helper.sync_deal_fields(7, RECORD, 3) is None
+    assert api.writes == []
+
+
+def test_deal_update_sends_only_changed_fields(api):
+    helper = PipedriveHelper('uniska')
+    assert helper.index.ensure_fresh()
+
+    result = helper.sync_deal_fields(7, dict(RECORD, NPO_ASumme=1250.0), 3)
+
+    assert result['success']
+    assert api.writes == [('PUT', '/deals/7', {'value': 1250.0})]
+
+
+def test_deal_update_never_touches_status_or_empty_fields(api):
+    helper = PipedriveHelper('uniska')  # index not loaded: nothing is known about the deal
+
+    helper.sync_deal_fields(7, dict(RECORD, NPO_ProjName='', NPO_ASumme=None, NPO_Status4Date='2024-01-01'), 3)
+
+    [(method, path, payload)] = api.writes
+    assert (method, path) == ('PUT', '/deals/7')
+    assert payload == {'org_id': 3, 'currency': 'CHF', 'close_time': '2024-03-01 00:00:00', PROJECT_FIELD: 'P1'}
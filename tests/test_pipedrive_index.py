@@ -0,0 +1,58 @@
+import threading
+
+from pipedrive_index import PipedriveIndex
+
+
+class FakePipedrive:
+    company_key = 'uniska'
+    project_field_key = 'proj_nr'
+
+    def __init__(self, collections):
+        self.collections = collections
+        self.reading = threading.Event()
+        self.resume = threading.Event()
+        self.resume.set()
+
+    def payload_fields(self, item_type):
+        return ['name']
+
+    def iter_collection(self, collection):
+        for item in self.collections[collection]:
+            self.reading.set()
+            self.resume.wait()
+            yield item
+
+    def iter_recent_changes(self, since, items):
+        return iter([])
+
+
+def test_reload_swaps_in_new_maps_and_keeps_concurrent_upserts():
+    pipedrive = FakePipedrive({
+        'organizations': [{'id': 1, 'name': 'Acme'}],
+        'persons': [],
+        'deals': [{'id': 7, 'proj_nr': 'P1', 'title': 'Project 1'}]
+    })
+    index = PipedriveIndex(pipedrive)
+    assert index.ensure_fresh()
+
+    pipedrive.collections['organizations'] = [{'id': 1, 'name': 'Acme'}, {'id': 2, 'name': 'Globex'}]
+    pipedrive.reading.clear()
+    pipedrive.resume.clear()
+    index._loaded_at = index._refreshed_at = float('-inf')  # due for a full reload
+    reload = threading.Thread(target=index.ensure_fresh, daemon=True)
+    reload.start()
+    pipedrive.reading.wait(5)
+    try:
+        # Mid-reload, lookups still see the previous index and syncs can add to it
+        assert index.find_organization('acme') == {'id': 1, 'name': 'Acme'}
+        assert index.find_deal('P1') == {'id': 7, 'name': 'Project 1'}
+        index.upsert('organization', {'id': 3, 'name': 'Initech'})
+        index.remove('deal', 7)
+    finally:
+        pipedrive.resume.set()
+        reload.join(5)
+
+    assert index.find_organization('globex') == {'id': 2, 'name': 'Globex'}
+    assert index.find_organization('initech') == {'id': 3, 'name': 'Initech'}
+    assert index.find_deal('P1') is None
+    assert index.get_stats()['organizations'] == 3
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from pipedrive_sync import SyncError, sync_batch, sync_record
+
+
+class FakePipedrive:
+    """Records created entities; slow enough that concurrent workers overlap."""
+
+    def __init__(self):
+        self.orgs = {}
+        self.persons = {}
+        self.deals = []
+        self.updates = []
+        self.update_results = {}  # entity type -> result of its field syncs
+        self._lock = threading.Lock()
+
+    def thread_call_count(self):
+        return 0
+
+    def record_sync(self, api_calls):
+        pass
+
+    def find_organization_by_name(self, name):
+        return self.orgs.get(name)
+
+    def create_organization(self, data):
+        with self._lock:
+            org = self.orgs[data['ADR_NAME']] = {'id': len(self.orgs) + 1, 'name': data['ADR_NAME']}
+        return {'success': True, 'data': org}
+
+    def _sync_fields(self, entity_type, item_id):
+        result = self.update_results.get(entity_type)
+        if result is not None:
+            self.updates.append((entity_type, item_id))
+        return result
+
+    def sync_organization_fields(self, org_id, data):
+        return self._sync_fields('organization', org_id)
+
+    def find_person_by_name(self, name, org_id):
+        return self.persons.get((name, org_id))
+
+    def create_person(self, data, org_id):
+        name = f"{data['AKP_VORNAME']} {data['AKP_NAME']}"
+        with self._lock:
+            person = self.persons[(name, org_id)] = {'id': len(self.persons) + 1, 'name': name}
+        return {'success': True, 'data': person}
+
+    def sync_person_fields(self, person_id, data, org_id):
+        return self._sync_fields('person', person_id)
+
+    def find_deal_by_project(self, proj_nr):
+        return next(({'id': deal['id'], 'title': proj_nr} for deal in self.deals if deal['proj_nr'] == proj_nr), None)
+
+    def sync_deal_fields(self, deal_id, data, org_id):
+        return self._sync_fields('deal', deal_id)
+
+    def create_deal(self, data, org_id, person_id=None):
+        # Like the real duplicate check, this only sees deals that finished creating
+        if any(deal['proj_nr'] == data['NPO_ProjNr'] for deal in self.deals):
+            return {'success': False, 'error': 'Deal already exists'}
+        time.sleep(0.05)
+        with self._lock:
+            deal = {'id': len(self.deals) + 1, 'proj_nr': data['NPO_ProjNr'], 'person_id': person_id}
+            self.deals.append(deal)
+        return {'success': True, 'data': deal}
+
+
+def make_rows(proj_nr, contacts):
+    return [
+        {'NPO_ProjNr': proj_nr, 'ADR_NAME': f'Org {proj_nr}', 'AKP_VORNAME': 'Contact', 'AKP_NAME': str(i)}
+        for i in range(contacts)
+    ]
+
+
+def test_batch_creates_one_deal_per_project():
+    pipedrive = FakePipedrive()
+    records = make_rows('P1', 4) + make_rows('P2', 3)
+
+    results = list(sync_batch(pipedrive, records, max_workers=4))
+
+    assert all(result['success'] for result in results)
+    assert sorted(deal['proj_nr'] for deal in pipedrive.deals) == ['P1', 'P2']
+    assert len(pipedrive.persons) == 7
+    skipped = [result for result in results if result['message'] == 'Deal already exists, skipping']
+    assert len(skipped) == 5
+
+
+def test_existing_deal_gets_changed_fields():
+    pipedrive = FakePipedrive()
+    record = make_rows('P1', 1)[0]
+    assert sync_record(pipedrive, record)['message'] == 'Record synced successfully'
+
+    pipedrive.update_results['deal'] = {'success': True, 'data': {'id': 1}}
+    result = sync_record(pipedrive, record)
+
+    assert len(pipedrive.deals) == 1
+    assert pipedrive.updates == [('deal', 1)]
+    assert result['message'] == 'Deal already exists, updated changed fields'
+    assert result['synced_entities'] == ['organization', 'person', 'deal']
+
+
+def test_failed_updates_are_not_reported_as_synced():
+    pipedrive = FakePipedrive()
+    record = make_rows('P1', 1)[0]
+    sync_record(pipedrive, record)
+
+    pipedrive.update_results['organization'] = {'success': False, 'error': 'Bad request'}
+    assert sync_record(pipedrive, record)['synced_entities'] == ['person', 'deal']
+
+    pipedrive.update_results['deal'] = {'success': False, 'error': 'Bad request'}
+    with pytest.raises(SyncError):
+        sync_record(pipedrive, record)
+
+
+def test_synced_records_are_reported_even_if_results_are_abandoned():
+    pipedrive = FakePipedrive()
+    records = make_rows('P1', 1) + make_rows('P2', 1) + make_rows('P3', 1)
+    recorded = []
+
+    results = sync_batch(pipedrive, records, max_workers=2,
+                         on_synced=lambda record, result: recorded.append(record['NPO_ProjNr']))
+    next(results)
+    results.close()  # like a client disconnecting mid-stream
+
+    assert sorted(recorded) == ['P1', 'P2', 'P3']
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from utils import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('utils.time', lambda: now[0])
+    return now
+
+
+def allowed(limiter, count, user='alice', endpoint='/sync'):
+    return sum(limiter.can_make_request(user, endpoint) for _ in range(count))
+
+
+@pytest.mark.parametrize('db', [False, True], ids=['memory', 'shared'])
+def test_burst_then_refill(clock, tmp_path, db):
+    limiter = RateLimiter(6, db_path=str(tmp_path / 'limits.db') if db else None)
+
+    assert allowed(limiter, 10) == 6
+    assert allowed(limiter, 1, endpoint='/other') == 1
+    assert allowed(limiter, 1, user='bob') == 1
+
+    clock[0] += 10  # one request's worth of budget
+    assert allowed(limiter, 10) == 1
+    clock[0] += 60
+    assert allowed(limiter, 10) == 6
+
+
+def test_idle_keys_are_evicted(clock):
+    limiter = RateLimiter(6, sweep_interval=30)
+    for user in range(100):
+        limiter.can_make_request(f"user-{user}", '/sync')
+    assert len(limiter.requests) == 100
+
+    clock[0] += 60
+    limiter.can_make_request('alice', '/sync')
+
+    assert list(limiter.requests) == ['alice:/sync']
+
+
+def test_workers_sharing_a_database_share_the_limit(clock, tmp_path):
+    workers = [RateLimiter(6, db_path=str(tmp_path / 'limits.db')) for _ in range(3)]
+
+    assert sum(allowed(worker, 3) for worker in workers) == 6
+
+
+@pytest.mark.parametrize('db', [False, True], ids=['memory', 'shared'])
+def test_concurrent_checks_never_exceed_the_limit(tmp_path, db):
+    limiter = RateLimiter(20, db_path=str(tmp_path / 'limits.db') if db else None)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def check():
+        barrier.wait()
+        results.append(allowed(limiter, 10))
+
+    threads = [threading.Thread(target=check) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(results) == 20
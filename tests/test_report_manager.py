@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from config import Config
+from helpers import ReportManager
+from storage import Storage
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def manager(tmp_path):
+    config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    config.update(REPORT_DATA_DIR=str(tmp_path), ABACUS_REQUEST_TIMEOUT=5.0)
+    manager = ReportManager(config, Storage(f"sqlite:///{tmp_path}/app.db"))
+    manager.token_provider.get_token = lambda force_refresh=False: 'token'
+    yield manager
+    manager.scheduler.shutdown()
+    manager.download_executor.shutdown()
+
+
+def add_report(manager, report_id):
+    manager.report_status_store[report_id] = {
+        'company': 'uniska', 'mandant': '19', 'report_key': 'npo', 'params': '{}',
+        'api_report_id': f"job-{report_id}", 'status': 'Running', 'message': '', 'total_pages': 1
+    }
+    manager.storage.create_report(report_id, **manager.report_status_store[report_id])
+
+
+def test_abacus_requests_have_a_timeout(manager):
+    sent = []
+    manager.session.request = lambda method, url, **kwargs: sent.append(kwargs) or FakeResponse({})
+
+    manager._api_request('GET', '/api/abareport/v1/jobs/1')
+
+    assert sent[0]['timeout'] == 5.0
+
+
+def test_downloads_do_not_hold_up_polling(manager):
+    manager.session.request = lambda method, url, **kwargs: FakeResponse({'state': 'FinishedSuccess', 'message': ''})
+    downloading = threading.Semaphore(0)
+    release = threading.Event()
+
+    def store_report_data(report_id, *args):
+        downloading.release()
+        release.wait(5)
+        if report_id == 'broken':
+            raise IOError('disk full')
+        manager._set_status(report_id, finished_at=1.0)
+
+    manager._store_report_data = store_report_data
+    add_report(manager, 'slow')
+    add_report(manager, 'broken')
+
+    # Both polls return while the first download is still running
+    assert manager._poll_report('slow') is True
+    assert manager._poll_report('broken') is True
+    assert downloading.acquire(timeout=5) and downloading.acquire(timeout=5)
+    assert manager._is_in_flight('slow')
+
+    release.set()
+    manager.download_executor.shutdown(wait=True)
+    assert not manager._is_in_flight('slow')
+    assert manager.report_status_store['slow']['status'] == 'FinishedSuccess'
+    assert manager.report_status_store['broken']['status'] == 'FinishedError'
+    assert manager.report_status_store['broken']['message'] == 'disk full'
+
+
+def test_report_running_in_another_worker_is_not_started_again(manager):
+    other_worker = ReportManager(manager.config, manager.storage)
+    other_worker.token_provider.get_token = lambda force_refresh=False: 'token'
+    other_worker._start_polling = lambda report_id: None
+    other_worker.session.request = lambda method, url, **kwargs: FakeResponse({'id': 'job-1'})
+    report_id = other_worker.start_report('uniska', '19', 'npo', 'none', force=True)
+
+    submitted = []
+    manager.session.request = lambda method, url, **kwargs: submitted.append(url) or FakeResponse({'id': 'job-2'})
+
+    assert manager.start_report('uniska', '19', 'npo', 'none', force=True) == report_id
+    assert submitted == []
+    other_worker.scheduler.shutdown()
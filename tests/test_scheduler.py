@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import JobScheduler
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out waiting'
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def make(poll_job, **kwargs):
+        kwargs.setdefault('min_interval', 0.01)
+        kwargs.setdefault('max_interval', 0.04)
+        kwargs.setdefault('backoff_factor', 2)
+        schedulers.append(JobScheduler(poll_job, **kwargs))
+        return schedulers[-1]
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.shutdown()
+
+
+def test_poll_interval_backs_off_up_to_the_maximum(make_scheduler):
+    intervals = []
+
+    def poll(job_id):
+        intervals.append(scheduler.get_stats()['jobs'][job_id]['interval'])
+        return len(intervals) == 5
+
+    scheduler = make_scheduler(poll)
+    scheduler.submit('job')
+    wait_for(lambda: not scheduler.is_scheduled('job'))
+
+    assert intervals == [0.01, 0.02, 0.04, 0.04, 0.04]
+    assert scheduler.get_stats()['completed'][0]['outcome'] == 'done'
+
+
+def test_failing_poll_finishes_the_job(make_scheduler):
+    def poll(job_id):
+        raise RuntimeError('boom')
+
+    scheduler = make_scheduler(poll)
+    scheduler.submit('job')
+    wait_for(lambda: not scheduler.is_scheduled('job'))
+
+    assert scheduler.get_stats()['completed'][0]['polls'] == 1
+
+
+def test_cancel_stops_polling_even_mid_poll(make_scheduler):
+    polling = threading.Event()
+    release = threading.Event()
+    polls = []
+
+    def poll(job_id):
+        polls.append(job_id)
+        polling.set()
+        release.wait(5)
+        return False
+
+    scheduler = make_scheduler(poll)
+    scheduler.submit('job')
+    assert polling.wait(5)
+
+    assert scheduler.cancel('job')
+    release.set()
+    time.sleep(0.1)
+
+    assert polls == ['job']
+    assert not scheduler.cancel('job')
+    assert scheduler.get_stats()['completed'][0]['outcome'] == 'cancelled'
+
+
+def test_jobs_time_out(make_scheduler):
+    timed_out = []
+    scheduler = make_scheduler(lambda job_id: False, timeout=0.05, on_timeout=timed_out.append)
+    scheduler.submit('job')
+
+    wait_for(lambda: timed_out)
+
+    assert timed_out == ['job']
+    assert not scheduler.is_scheduled('job')
+    assert scheduler.get_stats()['completed'][0]['outcome'] == 'timeout'
+
+
+def test_many_jobs_share_a_fixed_pool(make_scheduler):
+    threads = set()
+
+    def poll(job_id):
+        threads.add(threading.current_thread().name)
+        return True
+
+    scheduler = make_scheduler(poll, max_workers=2)
+    for job in range(50):
+        scheduler.submit(f"job-{job}")
+    wait_for(lambda: scheduler.get_stats()['queue_depth'] == 0)
+
+    assert scheduler.get_stats()['total_polls'] == 50
+    assert len(threads) <= 2
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(f"sqlite:///{tmp_path}/app.db")
+
+
+def create(storage, report_id, created_at, status='FinishedSuccess', finished=True, params='{}', **fields):
+    fields.setdefault('company', 'uniska')
+    fields.setdefault('mandant', '19')
+    fields.setdefault('report_key', 'npo')
+    storage.create_report(report_id, status=status, params=params, **fields)
+    with storage.engine.begin() as conn:
+        conn.exec_driver_sql(
+            'UPDATE reports SET created_at = ?, updated_at = ?, finished_at = ? WHERE report_id = ?',
+            (created_at, created_at, created_at + 1 if finished else None, report_id)
+        )
+
+
+def test_list_reports_returns_latest_run_per_report(storage):
+    create(storage, 'old', 100)
+    create(storage, 'new', 200)
+    create(storage, 'adr', 150, report_key='adr')
+    create(storage, 'other', 300, company='kaufmann')
+
+    assert [report['report_id'] for report in storage.list_reports()] == ['adr', 'new', 'other']
+    assert [report['report_id'] for report in storage.list_reports('uniska')] == ['adr', 'new']
+
+
+def test_fail_stale_reports_skips_recent_and_excluded(storage):
+    now = time.time()
+    create(storage, 'abandoned', now - 1000, status='Running', finished=False)
+    create(storage, 'storing', now - 1000, finished=False)
+    create(storage, 'live', now - 1000, status='Running', finished=False)
+    create(storage, 'recent', now, status='Running', finished=False)
+    create(storage, 'done', now - 1000)
+
+    assert storage.fail_stale_reports(now - 300, 'abandoned', exclude=['live']) == 2
+
+    statuses = {report_id: storage.get_report(report_id)['status']
+                for report_id in ('abandoned', 'storing', 'live', 'recent', 'done')}
+    assert statuses == {'abandoned': 'FinishedError', 'storing': 'FinishedError', 'live': 'Running',
+                        'recent': 'Running', 'done': 'FinishedSuccess'}
+
+
+def test_delete_superseded_reports(storage):
+    create(storage, 'first', 100, data_path='first.jsonl')
+    create(storage, 'failed', 150, status='FinishedError', finished=False)
+    create(storage, 'other_year', 160, params='{"year": 1}', data_path='other.jsonl')
+    create(storage, 'running', 170, status='Running', finished=False)
+    create(storage, 'latest', 200, data_path='latest.jsonl')
+
+    assert storage.delete_superseded_reports('latest') == ['first.jsonl']
+
+    remaining = {report_id for report_id in ('first', 'failed', 'other_year', 'running', 'latest')
+                 if storage.get_report(report_id)}
+    assert remaining == {'other_year', 'running', 'latest'}
+
+
+def test_create_report_unless_running(storage):
+    now = time.time()
+    run = {'company': 'uniska', 'mandant': '19', 'report_key': 'npo', 'params': '{}', 'status': 'Running'}
+    assert storage.create_report_unless_running('first', now - 300, **run) is None
+
+    assert storage.create_report_unless_running('second', now - 300, **run) == 'first'
+    assert storage.get_report('second') is None
+    assert storage.create_report_unless_running('other', now - 300, **dict(run, params='{"year": 1}')) is None
+    # A run without a recent status change belongs to a stopped worker
+    assert storage.create_report_unless_running('third', now + 1, **run) is None
+    assert storage.get_report('third')['status'] == 'Running'
+
+
+def test_concurrent_workers_create_one_run(tmp_path):
+    run = {'company': 'uniska', 'mandant': '19', 'report_key': 'npo', 'params': '{}', 'status': 'Running'}
+    workers = [Storage(f"sqlite:///{tmp_path}/app.db") for _ in range(8)]
+    barrier = threading.Barrier(len(workers))
+    results = []
+
+    def start(index, worker):
+        barrier.wait()
+        results.append(worker.create_report_unless_running(f"run-{index}", time.time() - 300, **run))
+
+    threads = [threading.Thread(target=start, args=item) for item in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    created = [f"run-{index}" for index in range(len(workers)) if workers[0].get_report(f"run-{index}")]
+    assert len(created) == 1
+    assert sorted(results, key=str) == sorted([None] + created * (len(workers) - 1), key=str)
+
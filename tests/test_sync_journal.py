@@ -0,0 +1,113 @@
+import pytest
+
+from combine import CombinedView, ReportIndex
+from storage import Storage
+from sync_journal import SyncJournal
+
+FIELD_MAPPINGS = [
+    {'source': 'NPO_ProjName', 'target': 'title', 'entity': 'deal'},
+    {'source': 'NPO_KSumme', 'target': 'value', 'entity': 'deal'},
+    {'source': 'ADR_TEL', 'target': 'phone', 'entity': 'organization'},
+    {'source': 'AKP_MAIL', 'target': 'email', 'entity': 'person'},
+]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(f"sqlite:///{tmp_path}/app.db")
+
+
+def make_journal(storage):
+    return SyncJournal(storage, 'uniska', FIELD_MAPPINGS, check_interval=0)
+
+
+def row(contact='Jane', **values):
+    return {
+        'NPO_ProjNr': 'P1', 'NPO_ProjName': 'Office', 'NPO_KSumme': 1000.0,
+        'ADR_NAME': 'Acme AG', 'ADR_TEL': '111',
+        'AKP_VORNAME': contact, 'AKP_NAME': 'Doe', 'AKP_MAIL': f'{contact.lower()}@acme.test',
+        **values
+    }
+
+
+def status(journal, record):
+    journal.get_version()
+    return journal.status(record.get)
+
+
+def test_status_is_new_then_synced_then_changed(storage):
+    journal = make_journal(storage)
+    assert status(journal, row()) == 'new'
+
+    journal.record([row()])
+    assert status(journal, row()) == 'synced'
+    assert status(journal, row(AKP_MAIL='jane@new.test')) == 'changed'
+    assert status(journal, row(ADR_TEL='222')) == 'changed'
+    assert status(journal, row(NPO_ProjName='New office')) == 'changed'
+    assert status(journal, row(NPO_ProjNr='P2')) == 'new'
+
+
+def test_unmapped_payload_columns_are_tracked(storage):
+    journal = make_journal(storage)
+    journal.record([row(NPO_ADatum='2024-03-01 00:00:00', NPO_ASumme=100.0, ADR_STREET='Main St')])
+
+    assert status(journal, row(NPO_ADatum='2024-03-01 00:00:00', NPO_ASumme=250.0, ADR_STREET='Main St')) == 'changed'
+    assert status(journal, row(NPO_ADatum='2024-03-01 00:00:00', NPO_ASumme=100.0, ADR_STREET='Side St')) == 'changed'
+    assert status(journal, row(NPO_ADatum='2024-03-01 00:00:00', NPO_ASumme=100.0, ADR_STREET='Main St')) == 'synced'
+
+
+def test_values_compare_as_the_dashboard_sends_them(storage):
+    journal = make_journal(storage)
+    journal.record([row()])
+
+    assert status(journal, row(NPO_KSumme='1000', ADR_TEL=' 111 ')) == 'synced'
+
+
+def test_deal_fingerprint_is_shared_by_a_projects_contact_rows(storage):
+    journal = make_journal(storage)
+    jane, john = row('Jane'), row('John')
+
+    deal_entries = [entry for entry in journal.row_entries(jane) + journal.row_entries(john) if entry[0] == 'deal']
+    assert len(set(deal_entries)) == 1
+
+    journal.record([jane])
+    # The deal is synced; only John himself is missing
+    assert status(journal, john) == 'changed'
+    journal.record([john])
+    assert status(journal, jane) == status(journal, john) == 'synced'
+
+
+def test_record_only_the_given_entities(storage):
+    journal = make_journal(storage)
+    journal.record([row()], entities=['deal', 'person'])
+
+    assert status(journal, row()) == 'changed'
+    assert set(storage.get_sync_journal('uniska')) == {('deal', 'P1'), ('person', 'acme ag|jane doe')}
+
+
+def test_picks_up_entries_recorded_by_another_worker(storage):
+    journal = make_journal(storage)
+    version = journal.get_version()
+
+    make_journal(storage).record([row()])
+
+    assert journal.get_version() != version
+    assert status(journal, row()) == 'synced'
+    assert list(journal.changed([row(), row('John')])) == [row('John')]
+
+
+def test_row_status_of_a_combined_view(storage):
+    npo, adr, akp = ReportIndex('npo'), ReportIndex('adr'), ReportIndex('akp')
+    npo.add_page([{'ProjNr': 'P1', 'Person1': '0', 'KdINR': '1', 'ProjName': 'Office', 'KSumme': 1000.0}])
+    adr.add_page([{'INR': '1', 'NAME': 'Acme AG', 'TEL': '111'}])
+    akp.add_page([
+        {'ADR_INR': '1', 'VORNAME': 'Jane', 'NAME': 'Doe', 'MAIL': 'jane@acme.test'},
+        {'ADR_INR': '1', 'VORNAME': 'John', 'NAME': 'Doe', 'MAIL': 'john@acme.test'},
+    ])
+    view = CombinedView(npo, adr, akp, None, ('v1',))
+    journal = make_journal(storage)
+    journal.record([row('Jane')])
+
+    view.set_status(journal.row_status, journal.get_version())
+
+    assert [record['Status'] for record in view.rows] == ['synced', 'changed']
@@ -0,0 +1,68 @@
+import itertools
+import sys
+import threading
+
+from helpers import TokenProvider
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self):
+        self.counter = itertools.count(1)
+
+    def post(self, url, **kwargs):
+        return FakeResponse({'access_token': f"token-{next(self.counter)}", 'expires_in': 3600})
+
+
+def make_provider():
+    config = {'CLIENT_ID': 'id', 'CLIENT_SECRET': 'secret', 'TOKEN_URL': 'https://example.test/token'}
+    return TokenProvider(config, FakeSession())
+
+
+def test_invalidate_only_drops_the_rejected_token():
+    provider = make_provider()
+    rejected = provider.get_token()
+    fresh = provider.get_token(force_refresh=True)
+
+    provider.invalidate(rejected)
+    provider.invalidate(None)
+
+    assert provider.get_token() == fresh
+    assert provider.get_stats()['invalidations'] == 0
+
+    provider.invalidate(fresh)
+    assert provider.get_token() not in (rejected, fresh)
+
+
+def test_get_token_never_returns_none_while_invalidated():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often so the check-then-read race shows up
+    provider = make_provider()
+    tokens = []
+    stop = threading.Event()
+
+    def invalidate():
+        while not stop.is_set():
+            provider.invalidate(provider.get_token())
+
+    invalidator = threading.Thread(target=invalidate)
+    invalidator.start()
+    try:
+        for _ in range(20000):
+            tokens.append(provider.get_token())
+    finally:
+        stop.set()
+        invalidator.join()
+        sys.setswitchinterval(interval)
+
+    assert None not in tokens
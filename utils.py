@@ -1,25 +1,131 @@
+import csv
+import sqlite3
 import threading
+import zlib
+from html import escape
 from time import time
-from typing import Dict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 class RateLimiter:
-    def __init__(self, requests_per_minute: int = 60):
+    """Per user and endpoint rate limit using GCRA (generic cell rate algorithm).
+
+    Allows `requests_per_minute` requests in any 60 second window. Each key only
+    stores its theoretical arrival time, so a check is O(1) in time and memory.
+    Keys that have gone idle are evicted. With `db_path`, state is kept in a
+    SQLite file so several worker processes enforce one shared limit.
+    """
+
+    def __init__(self, requests_per_minute: int = 60, db_path: Optional[str] = None,
+                 sweep_interval: float = 60.0):
         self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, list] = {}
+        self.interval = 60.0 / requests_per_minute  # one request "costs" this many seconds
+        self.tolerance = 60.0 - self.interval  # how far ahead of now a key may run
+        self.sweep_interval = sweep_interval
+        self.db_path = db_path
+        self.requests: Dict[str, float] = {}  # key -> theoretical arrival time
+        self._lock = threading.Lock()
+        self._next_sweep = time() + sweep_interval
+        self._local = threading.local()
+        if db_path:
+            self._connect().execute(
+                'CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)'
+            )
 
     def can_make_request(self, user_id: str, endpoint: str) -> bool:
         """Check if a request can be made based on rate limits."""
         key = f"{user_id}:{endpoint}"
         now = time()
+        if self.db_path:
+            return self._check_shared(key, now)
+
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            tat = max(self.requests.get(key, now), now)
+            if tat - now > self.tolerance:
+                return False
+            self.requests[key] = tat + self.interval
+            return True
+
+    def _sweep(self, now: float) -> None:
+        """Drop keys whose budget has fully recovered; they behave like new keys."""
+        for key in [key for key, tat in self.requests.items() if tat <= now]:
+            del self.requests[key]
+        self._next_sweep = now + self.sweep_interval
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _check_shared(self, key: str, now: float) -> bool:
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if now >= self._next_sweep:
+                conn.execute('DELETE FROM rate_limits WHERE tat <= ?', (now,))
+                self._next_sweep = now + self.sweep_interval
+            row = conn.execute('SELECT tat FROM rate_limits WHERE key = ?', (key,)).fetchone()
+            tat = max(row[0], now) if row else now
+            allowed = tat - now <= self.tolerance
+            if allowed:
+                conn.execute('INSERT OR REPLACE INTO rate_limits (key, tat) VALUES (?, ?)', (key, tat + self.interval))
+            conn.execute('COMMIT')
+            return allowed
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+class _Echo:
+    """File-like object whose write() hands the written text back to the caller."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv_chunks(rows: Iterable[Dict[str, Any]], columns: List[str], bom: bool = False,
+                    rows_per_chunk: int = 500) -> Iterator[bytes]:
+    """Encode dict rows as UTF-8 CSV, yielding a chunk every `rows_per_chunk` rows."""
+    writer = csv.writer(_Echo())
+    buffer = ['\ufeff' if bom else '', writer.writerow(columns)]
+    for row in rows:
+        buffer.append(writer.writerow([row.get(col, '') for col in columns]))
+        if len(buffer) >= rows_per_chunk:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
 
-        # Initialize or clean old requests
-        if key not in self.requests:
-            self.requests[key] = []
-        self.requests[key] = [t for t in self.requests[key] if t > now - 60]
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a stream of byte chunks on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
 
-        # Check rate limit
-        if len(self.requests[key]) >= self.requests_per_minute:
-            return False
 
-        self.requests[key].append(now)
-        return True
\ No newline at end of file
+def iter_html_table(rows: Iterable[Dict[str, Any]], headers: Iterable[str],
+                    rows_per_chunk: int = 500) -> Iterator[str]:
+    """Render rows as an escaped HTML table, yielding a chunk every `rows_per_chunk` rows."""
+    headers = list(headers)
+    # Cell padding comes from one style block instead of an inline style per cell
+    buffer = [
+        '<style>.combined-data th, .combined-data td { padding: 8px; } .combined-data th { text-align: left; }</style>'
+        '<table class="combined-data" border="1" style="border-collapse: collapse; width: 100%;"><tr><th>',
+        '</th><th>'.join(escape(header) for header in headers),
+        '</th></tr>'
+    ]
+    for count, row in enumerate(rows, start=1):
+        buffer.append('<tr><td>' + '</td><td>'.join([escape(str(row.get(header, ''))) for header in headers]) + '</td></tr>')
+        if count % rows_per_chunk == 0:
+            yield ''.join(buffer)
+            buffer = []
+    buffer.append('</table>')
+    yield ''.join(buffer)
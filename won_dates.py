@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class WonDatesBackfill:
+    """Backfill of won_time from ADatum for every won deal of a company.
+
+    Pages through /deals?status=won (the list response already carries the custom
+    fields), works out corrections locally and PUTs only the deals that need one,
+    with bounded concurrency. After every page the next start offset is saved, so
+    an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, pipedrive, checkpoint_dir: str = Config.WON_DATES_CHECKPOINT_DIR,
+                 max_workers: int = Config.PIPEDRIVE_SYNC_CONCURRENCY, page_size: int = 500):
+        self.pipedrive = pipedrive
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.checkpoint_path = os.path.join(checkpoint_dir, f"{pipedrive.company_key}_won_dates.json")
+        self.progress: Dict[str, Any] = self._new_progress()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _new_progress() -> Dict[str, Any]:
+        return {
+            'status': 'Idle',
+            'next_start': 0,
+            'pages': 0,
+            'checked': 0,
+            'updated': 0,
+            'failed': 0,
+            'started_at': None,
+            'finished_at': None,
+            'error': None
+        }
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable won dates checkpoint {self.checkpoint_path}: {e}")
+            return None
+
+    def _save_checkpoint(self) -> None:
+        os.makedirs(os.path.dirname(self.checkpoint_path) or '.', exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.progress, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, restart: bool = False) -> bool:
+        """Run the backfill in a background thread. Returns False if one is already running."""
+        with self._lock:
+            if self.is_running():
+                return False
+            self._thread = threading.Thread(
+                target=self.run, kwargs={'restart': restart}, name=f"won-dates-{self.pipedrive.company_key}", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def get_progress(self) -> Dict[str, Any]:
+        if self.progress['status'] == 'Idle':
+            checkpoint = self._load_checkpoint()
+            if checkpoint:
+                return {**checkpoint, 'status': 'Idle' if checkpoint.get('status') == 'Running' else checkpoint['status']}
+        return dict(self.progress)
+
+    def run(self, restart: bool = False) -> Dict[str, Any]:
+        """Run (or resume) the backfill to completion and return the final progress."""
+        checkpoint = None if restart else self._load_checkpoint()
+        if checkpoint and checkpoint.get('status') != 'Completed':
+            self.progress = {**self._new_progress(), **checkpoint}
+            logger.info(f"Resuming won dates backfill for {self.pipedrive.company_key} at {checkpoint['next_start']}")
+        else:
+            self.progress = self._new_progress()
+        self.progress.update({
+            'status': 'Running',
+            'started_at': self.progress['started_at'] or datetime.now().isoformat(),
+            'finished_at': None,
+            'error': None
+        })
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='won-dates') as executor:
+                pages = self.pipedrive.iter_collection_pages(
+                    'deals', {'status': 'won', 'sort': 'id ASC'}, self.progress['next_start'] or 0, self.page_size
+                )
+                for deals, next_start in pages:
+                    corrections = {}
+                    for deal in deals:
+                        won_time = self.pipedrive.won_time_correction(deal)
+                        if won_time:
+                            corrections[deal['id']] = won_time
+                    updated = sum(executor.map(self._update, corrections, corrections.values()))
+                    self.progress['pages'] += 1
+                    self.progress['checked'] += len(deals)
+                    self.progress['updated'] += updated
+                    self.progress['failed'] += len(corrections) - updated
+                    self.progress['next_start'] = next_start
+                    self._save_checkpoint()
+            self.progress['status'] = 'Completed'
+        except Exception as e:
+            logger.error(f"Won dates backfill for {self.pipedrive.company_key} failed: {e}")
+            self.progress.update({'status': 'Failed', 'error': str(e)})
+
+        self.progress['finished_at'] = datetime.now().isoformat()
+        self._save_checkpoint()
+        logger.info(f"Won dates backfill for {self.pipedrive.company_key}: {self.progress}")
+        return dict(self.progress)
+
+    def _update(self, deal_id: int, won_time: str) -> bool:
+        try:
+            result = self.pipedrive.update_deal(deal_id, {'won_time': won_time})
+        except Exception as e:
+            logger.error(f"Failed to update won_time of deal {deal_id}: {e}")
+            return False
+        if not result.get('success'):
+            logger.error(f"Failed to update won_time of deal {deal_id}: {result}")
+            return False
+        logger.debug(f"Updated won dates for deal {deal_id}: {won_time}")
+        return True